@@ -9,9 +9,16 @@ Programování I NPRG030
 """
 
 
+from time import perf_counter
+IMPORT_START = perf_counter()  # Imports are the first phase of startup
+
+from os import environ
 from sys import argv, exit
-from level import Level
+from chunked import ChunkedLevel
+from compiled import load_level, load_compiled
 from game import Game
+from pvs import PvsLoader
+from profiling import StartupProfiler
 
 
 SIZE = (800, 600)
@@ -19,23 +26,57 @@ RAYS = 600  # Should be a multiple of 4 and a divisor of (window width * (360 /
             # Examples for SIZE=(800, 600), FOV=60: 4800, 2400, 1200, 600
 FOV = 60
 FPS = 50
+ADAPTIVE_RESOLUTION = False  # Cast fewer rays per frame when frames take too long and more
+                             # when there is spare time. RAYS is then the highest resolution.
+BACKEND = "numpy"  # Raycasting engine, see backends.py. Can be overridden with
+                   # the RAYCASTING_BACKEND environment variable.
+PROFILE_EXPORT = None  # Path to save per-stage frame times to at exit ('.csv' or JSON).
+                       # Can be overridden with the RAYCASTING_PROFILE environment variable.
+CHUNKED_EXTENSION = ".lvlc"  # Level files with this extension are chunk files (see chunked.py)
+COMPILED_EXTENSION = ".lvlb"  # Level files with this extension are compiled levels (see compiled.py)
+FAST_START = False  # Initialize only the needed pygame subsystems and skip searching system
+                    # fonts. Can be turned on with the RAYCASTING_FAST_START environment variable.
+TEXTURED_WALLS = False  # Draw walls with a brick texture instead of a flat color
+CAST_FLOOR = False  # Draw tiled floor and ceiling instead of flat colors
+USE_PVS = False  # Skip sprites that can't be seen and stop rays early using the potentially
+                 # visible set of the level (see pvs.py). It is built on the first load (in
+                 # the background, or beforehand with python3 pvs.py level.lvl) and cached.
+PROFILE_STARTUP = False  # Print how long each phase of startup took. Can be turned on with
+                         # the RAYCASTING_PROFILE_STARTUP environment variable.
 
 
 def main():
     print()  # Newline after the pygame hello message
 
+    startupProfiler = StartupProfiler(IMPORT_START)
+    startupProfiler.mark("imports")
+
     # Parse arguments to get the path to a level file
     if len(argv) < 2:
         print("Missing argument: Path to a labyrinth file")
         exit(1)
     levelFile = argv[1]
 
-    # Create level object from level file
+    # Create level object from level file (chunk files made by chunked.py are
+    # loaded lazily, text level files are compiled and cached by compiled.py)
     try:
-        level = Level(levelFile)
+        if levelFile.endswith(CHUNKED_EXTENSION):
+            level = ChunkedLevel(levelFile)
+        elif levelFile.endswith(COMPILED_EXTENSION):
+            level = load_compiled(levelFile)
+        else:
+            level = load_level(levelFile)
     except Exception as e:
         print("Error while reading the level file: %s" % (e))
         exit(1)
+    startupProfiler.mark("level")
+
+    # Potentially visible set, loaded in the background (chunk files are meant
+    # for mazes too big for it)
+    pvsLoader = None
+    if USE_PVS and not levelFile.endswith(CHUNKED_EXTENSION):
+        pvsLoader = PvsLoader(levelFile, level)
+        startupProfiler.mark("pvs")
 
     # Create game
     game = Game(
@@ -43,9 +84,20 @@ def main():
         windowSize=SIZE,
         totalRays=RAYS,
         fovDegrees=FOV,
-        targetFps=FPS
+        targetFps=FPS,
+        backend=BACKEND,
+        adaptiveResolution=ADAPTIVE_RESOLUTION,
+        profileExport=environ.get("RAYCASTING_PROFILE", PROFILE_EXPORT),
+        fastStart=FAST_START or bool(environ.get("RAYCASTING_FAST_START")),
+        startupProfiler=startupProfiler,
+        texturedWalls=TEXTURED_WALLS,
+        castFloor=CAST_FLOOR,
+        pvsLoader=pvsLoader
     )
 
+    if PROFILE_STARTUP or environ.get("RAYCASTING_PROFILE_STARTUP"):
+        print("\n".join(startupProfiler.get_summary_lines()))
+
     # Run game
     game.run()
 
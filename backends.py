@@ -0,0 +1,353 @@
+"""
+Contains the raycasting backends (engines) the game can choose from. All of them
+implement the backend interface of the Raycasting class (cast_fov(),
+cast_fov_axes(), cast_selected_rays(), cast_views(), cast_ray() and
+distance_to_wall()), the Raycasting class itself is the reference backend.
+
+The backend is chosen in __main__.py and can be overridden by setting the
+RAYCASTING_BACKEND environment variable, e.g. RAYCASTING_BACKEND=reference.
+"""
+
+import os
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from level import Level
+from chunked import ChunkedLevel
+from raycasting import Raycasting
+
+
+MAX_VIEW_BATCH = 1 << 16  # Rays of many cameras (see cast_views()) are cast on the worker
+                          # pool in batches of at most this many rays
+MIN_PARALLEL_RAYS = 512   # Fewer rays are cast without the worker pool (sending a cast to
+                          # the pool costs about 0.7 ms, a ray about 2 us with NumPy)
+
+
+class NumpyRaycasting(Raycasting):
+    """
+    Casts the whole fov at once with NumPy (see cast_rays_batch()) and single rays
+    with the DDA grid traversal (see cast_ray_dda()).
+    """
+
+    def cast_fov(self, startRay, endRay, fromPos, messUpRays=None, step=1):
+        return self.cast_rays_batch(startRay, endRay, fromPos, messUpRays, step)
+
+    def cast_fov_axes(self, startRay, endRay, fromPos, step=1):
+        rays = self.ray_range(startRay, endRay, step)
+        return self.cast_ray_indices_axes(rays, fromPos.x, fromPos.y)
+
+    def cast_selected_rays(self, rays, fromPos):
+        return self.cast_ray_indices(rays, fromPos.x, fromPos.y)
+
+    def cast_views(self, positions, middleRays, fovRays, step=1):
+        return self.cast_view_rays(*self.view_rays(positions, middleRays, fovRays, step))
+
+    def cast_ray(self, ray, fromPos):
+        return self.cast_ray_dda(ray, fromPos)[:3]
+
+    def distance_to_wall(self, ray, fromPos):
+        return self.cast_ray_dda(ray, fromPos)[0]
+
+
+class DDARaycasting(Raycasting):
+    """
+    Casts every ray on its own with the DDA grid traversal (see cast_ray_dda()).
+    Faster than NumpyRaycasting for narrow fovs, where batching doesn't pay off.
+    """
+
+    def cast_fov(self, startRay, endRay, fromPos, messUpRays=None, step=1):
+        if messUpRays is not None and any(messUpRays):
+            # DDA doesn't keep vertical and horizontal hits apart, which is what
+            # the win screen animation needs
+            return super().cast_fov(startRay, endRay, fromPos, messUpRays, step)
+
+        return self.cast_selected_rays(self.ray_range(startRay, endRay, step), fromPos)
+
+    def cast_fov_axes(self, startRay, endRay, fromPos, step=1):
+        # See cast_fov()
+        rays = self.ray_range(startRay, endRay, step)
+        return self.cast_ray_indices_axes(rays, fromPos.x, fromPos.y)
+
+    def cast_views(self, positions, middleRays, fovRays, step=1):
+        # The fovs of all cameras together are wide, so batching pays off
+        return self.cast_view_rays(*self.view_rays(positions, middleRays, fovRays, step))
+
+    def cast_ray(self, ray, fromPos):
+        return self.cast_ray_dda(ray, fromPos)[:3]
+
+    def distance_to_wall(self, ray, fromPos):
+        return self.cast_ray_dda(ray, fromPos)[0]
+
+
+class ParallelRaycasting(NumpyRaycasting):
+    """
+    Splits the rays into chunks and casts them with NumpyRaycasting on a pool of
+    worker processes, so that all cpu cores are used.
+
+    The level grid, the ray tables and the input and output buffers live in
+    shared memory, so every frame only the chunk boundaries and the player
+    position have to be sent to the workers. Rays of many cameras (see
+    cast_views()) are cast with the position of every ray in a shared buffer.
+
+    The pool is started by the first cast of at least minParallelRays rays, casts
+    of fewer rays (like a single field of view) don't pay for the pool at all.
+    """
+
+    def __init__(self, totalRays, blockSize, level, renderDistance=10, workers=None,
+                 minParallelRays=MIN_PARALLEL_RAYS):
+        """
+        Parameters
+        ----------
+        totalRays : int
+        blockSize : int
+        level : Level
+        renderDistance : int
+        workers : int (number of worker processes, all cpu cores by default)
+        minParallelRays : int (fewer rays are cast in this process, with a single
+                          worker all of them are)
+        """
+        super().__init__(totalRays, blockSize, level, renderDistance)
+
+        self.workers = workers or os.cpu_count() or 1
+        self.minParallelRays = minParallelRays
+        self.sharedMemory = []  # SharedMemory objects
+        self.sharedArrays = {}  # Name -> (shared memory name, shape, dtype)
+        self.pool = None
+
+        # Level and ray tables
+        self._share("grid", level.get_grid())
+        self._share("distanceField", level.get_distance_field())
+        self._share("rayVectors", self.rayVectorArray)
+        self._share("rayVerticalHypotenuses", self.rayVerticalHypotenuseArray)
+        self._share("rayHorizontalHypotenuses", self.rayHorizontalHypotenuseArray)
+
+        # Inputs (rays, how to mess them up and positions of rays of many
+        # cameras) and outputs (one row per ray: distance, intersection x,
+        # intersection y, flag distance)
+        capacity = max(totalRays, MAX_VIEW_BATCH)
+        self.sharedRays = self._share("rays", np.zeros(capacity, dtype=np.int64))
+        self.sharedMessUpCodes = self._share("messUpCodes", np.zeros(capacity, dtype=np.int8))
+        self.sharedOrigins = self._share("origins", np.zeros((capacity, 2)))
+        self.sharedResults = self._share("results", np.zeros((capacity, 4)))
+
+    def _get_pool(self):
+        """
+        Returns the pool of workers which have all of the shared memory attached,
+        starts it on the first call.
+        """
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(
+                self.workers,
+                initializer=_init_worker,
+                initargs=(self.sharedArrays, self.totalRays, self.blockSize,
+                          self.renderDistance,
+                          (self.level.get_start_block().x, self.level.get_start_block().y),
+                          (self.level.get_flag_block().x, self.level.get_flag_block().y))
+            )
+        return self.pool
+
+    def cast_fov(self, startRay, endRay, fromPos, messUpRays=None, step=1):
+        rays = self.ray_range(startRay, endRay, step)
+        messUpCodes = None
+        if messUpRays is not None:
+            messUpCodes = np.asarray(messUpRays)[rays]
+        return self._cast_parallel(rays, fromPos, messUpCodes)
+
+    def cast_fov_axes(self, startRay, endRay, fromPos, step=1):
+        rays = self.ray_range(startRay, endRay, step)
+        vertical = self._cast_parallel(rays, fromPos, np.full(rays.shape, 2))
+        horizontal = self._cast_parallel(rays, fromPos, np.full(rays.shape, 1))
+        return vertical, horizontal
+
+    def cast_selected_rays(self, rays, fromPos):
+        return self._cast_parallel(np.asarray(rays), fromPos)
+
+    def cast_view_rays(self, positions, rays):
+        shape = rays.shape
+        rays = rays.reshape(-1)
+        origins = np.repeat(positions, shape[1], axis=0)
+
+        distances = np.empty(rays.size)
+        intersections = np.empty((rays.size, 2))
+        flagDistances = np.empty(rays.size)
+        for start in range(0, rays.size, MAX_VIEW_BATCH):
+            batch = slice(start, start + MAX_VIEW_BATCH)
+            distances[batch], intersections[batch], flagDistances[batch] = \
+                self._cast_parallel(rays[batch], None, origins=origins[batch])
+        return (distances.reshape(shape), intersections.reshape(shape + (2,)),
+                flagDistances.reshape(shape))
+
+    def close(self):
+        if not self.pool is None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        self.sharedRays = None
+        self.sharedMessUpCodes = None
+        self.sharedOrigins = None
+        self.sharedResults = None
+        for shm in self.sharedMemory:
+            shm.close()
+            shm.unlink()
+        self.sharedMemory = []
+
+    def _share(self, name, array):
+        """
+        Copy the array into a new block of shared memory under the given name.
+        Returns the NumPy array backed by the shared memory.
+        """
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        sharedArray = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+        sharedArray[...] = array
+        self.sharedMemory.append(shm)
+        self.sharedArrays[name] = (shm.name, array.shape, array.dtype.str)
+        return sharedArray
+
+    def _cast_parallel(self, rays, fromPos, messUpCodes=None, origins=None):
+        """
+        Cast the rays on the worker pool from fromPos or, if origins (an array
+        of shape (rays, 2)) are given, every ray from its own position. Returns
+        the same tupple of arrays as cast_ray_indices().
+        """
+        count = rays.size
+        if origins is None:
+            fromX = fromPos.x
+            fromY = fromPos.y
+        else:
+            fromX = None  # Workers read positions from the shared buffer
+            fromY = None
+        if count < self.minParallelRays or self.workers == 1 or not self.sharedMemory:
+            if origins is None:
+                return self.cast_ray_indices(rays, fromX, fromY, messUpCodes)
+            return self.cast_ray_indices(rays, origins[:, 0], origins[:, 1], messUpCodes)
+
+        self.sharedRays[:count] = rays
+        if not messUpCodes is None:
+            self.sharedMessUpCodes[:count] = messUpCodes
+        if not origins is None:
+            self.sharedOrigins[:count] = origins
+
+        # Each worker casts a chunk of rays and writes the results into its own
+        # part of the output buffer
+        bounds = np.linspace(0, count, self.workers + 1).astype(int)
+        chunks = [(int(start), int(stop), fromX, fromY, not messUpCodes is None,
+                   self.detectFlag)
+                  for start, stop in zip(bounds[:-1], bounds[1:]) if start < stop]
+        for rays, cells in self._get_pool().starmap(_cast_chunk, chunks):
+            self.raysCast += rays
+            self.cellsTraversed += cells
+
+        results = self.sharedResults[:count]
+        return results[:, 0].copy(), results[:, 1:3].copy(), results[:, 3].copy()
+
+
+class _WorkerRaycasting(NumpyRaycasting):
+    """
+    NumpyRaycasting of a worker process of ParallelRaycasting. Uses the ray tables
+    from shared memory instead of computing its own.
+    """
+
+    def __init__(self, totalRays, blockSize, level, renderDistance, rayVectors,
+                 rayVerticalHypotenuses, rayHorizontalHypotenuses):
+        self.totalRays = totalRays
+        self.blockSize = blockSize
+        self.level = level
+        self.renderDistance = renderDistance
+        self.rayVectorArray = rayVectors
+        self.rayVerticalHypotenuseArray = rayVerticalHypotenuses
+        self.rayHorizontalHypotenuseArray = rayHorizontalHypotenuses
+        self.detectFlag = True
+        self.pvs = None
+        self.raysCast = 0
+        self.cellsTraversed = 0
+
+
+_worker = None  # State of the current worker process, see _init_worker()
+
+
+def _init_worker(arrays, totalRays, blockSize, renderDistance, startBlock, flagBlock):
+    """
+    Attach the shared memory of ParallelRaycasting in a worker process.
+    """
+    global _worker
+
+    sharedMemory = []
+    shared = {}
+    for name, (shmName, shape, dtype) in arrays.items():
+        shm = shared_memory.SharedMemory(name=shmName)
+        sharedMemory.append(shm)
+        shared[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+    level = Level.from_grid(shared["grid"], startBlock, flagBlock, shared["distanceField"])
+    raycasting = _WorkerRaycasting(
+        totalRays, blockSize, level, renderDistance,
+        shared["rayVectors"],
+        shared["rayVerticalHypotenuses"],
+        shared["rayHorizontalHypotenuses"]
+    )
+    _worker = (sharedMemory, shared, raycasting)
+
+
+def _cast_chunk(start, stop, fromX, fromY, messUp, detectFlag):
+    """
+    Cast rays start to stop (excluding) of the shared input buffer and write the
+    results into the shared output buffer. Rays are cast from fromX and fromY or,
+    if they are None, from the positions in the shared buffer of origins. Returns
+    how many rays were cast and how many blocks they traversed.
+    """
+    sharedMemory, shared, raycasting = _worker
+    raycasting.set_flag_detection(detectFlag)
+
+    if fromX is None:
+        fromX = shared["origins"][start:stop, 0]
+        fromY = shared["origins"][start:stop, 1]
+
+    messUpCodes = shared["messUpCodes"][start:stop] if messUp else None
+    distances, intersections, flagDistances = raycasting.cast_ray_indices(
+        shared["rays"][start:stop], fromX, fromY, messUpCodes
+    )
+
+    results = shared["results"]
+    results[start:stop, 0] = distances
+    results[start:stop, 1:3] = intersections
+    results[start:stop, 3] = flagDistances
+
+    return raycasting.pop_traversal_counts()
+
+
+BACKENDS = {
+    "reference": Raycasting,
+    "numpy": NumpyRaycasting,
+    "dda": DDARaycasting,
+    "parallel": ParallelRaycasting,
+}
+DEFAULT_BACKEND = "numpy"
+BACKEND_ENVIRONMENT_VARIABLE = "RAYCASTING_BACKEND"
+
+
+def create_raycasting(backend, totalRays, blockSize, level, renderDistance=10):
+    """
+    Returns a Raycasting object of the given backend. The RAYCASTING_BACKEND
+    environment variable takes precedence over the backend argument. Falls back
+    to the reference backend if the backend is unknown and to the numpy backend
+    if the parallel one gets a ChunkedLevel (workers share the whole grid).
+
+    Parameters
+    ----------
+    backend : string or None (default backend)
+    totalRays : int
+    blockSize : int
+    level : Level
+    renderDistance : int
+    """
+    backend = os.environ.get(BACKEND_ENVIRONMENT_VARIABLE) or backend or DEFAULT_BACKEND
+    if not backend in BACKENDS:
+        print("Unknown raycasting backend '%s', using the reference one. Available: %s" %
+              (backend, ", ".join(BACKENDS)))
+        backend = "reference"
+    elif backend == "parallel" and isinstance(level, ChunkedLevel):
+        print("The parallel raycasting backend can't cast in chunked levels, using the numpy one")
+        backend = "numpy"
+    return BACKENDS[backend](totalRays, blockSize, level, renderDistance)
@@ -0,0 +1,202 @@
+#! /usr/bin/env python3
+
+"""
+Reproducible benchmark of ray casting, collision checks and frame rendering.
+
+Walks fixed camera paths through the bundled levels with several RAYS/FOV
+settings and reports p50/p95/p99 times in milliseconds. Results can be saved as
+JSON and diffed between versions.
+
+Usage: python3 benchmark.py [--backend numpy,dda] [--frames 100] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+from time import perf_counter
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+from pygame import Vector2
+
+from level import Level
+from player import Player
+from collision import Collision
+from headless import HeadlessRenderer
+from renderer import BLOCK_SIZE
+
+
+LEVELS = ["1.lvl", "2.lvl", "3.lvl", "4.lvl", "5.lvl", "new.lvl", "test.lvl"]
+SETTINGS = [  # (RAYS, FOV)
+    (600, 60),
+    (1200, 60),
+    (2400, 60),
+    (4800, 60),
+    (800, 90),
+]
+SIZE = (800, 600)
+WARMUP_FRAMES = 5  # Not measured
+
+# Camera path, normalized for RAYS=600
+PATH_TURN = 4     # Rays turned per frame
+PATH_MOVE = 4.0   # Units moved per frame
+PATH_SEGMENT = 25  # Frames before switching between turning and walking
+
+VIEW_BATCH = 25  # Cameras cast at once by cast_views()
+
+
+def camera_path(level, raycasting, fovRays, frames):
+    """
+    Returns a list of camera poses (position, middle ray) of a fixed path through
+    the level: starting at the player start, it alternates between turning in
+    place and walking forward (with collision checks).
+
+    Parameters
+    ----------
+    level : Level
+    raycasting : Raycasting
+    fovRays : int
+    frames : int
+    """
+    startPos = level.get_start_block() * BLOCK_SIZE + Vector2(BLOCK_SIZE // 2, BLOCK_SIZE // 2)
+    player = Player(startPos, 0, raycasting, fovRays)
+    turn = PATH_TURN * raycasting.get_total_rays() // 600
+
+    poses = []
+    for frame in range(frames):
+        if (frame // PATH_SEGMENT) % 2 == 0:
+            player.turn(turn)
+        else:
+            player.move_forward(PATH_MOVE)
+        poses.append((Vector2(player.get_pos()), player.get_middle_ray()))
+    return poses
+
+
+def percentiles(times):
+    """
+    Returns summary of a list of times in seconds as a dictionary of milliseconds.
+    """
+    times = np.array(times) * 1000
+    return {
+        "count": int(times.size),
+        "mean": round(float(times.mean()), 4),
+        "p50": round(float(np.percentile(times, 50)), 4),
+        "p95": round(float(np.percentile(times, 95)), 4),
+        "p99": round(float(np.percentile(times, 99)), 4),
+    }
+
+
+def benchmark_level(levelFile, backend, totalRays, fovDegrees, frames):
+    """
+    Time casting the fov, collision checks and rendering whole frames along the
+    camera path of one level. Also time casting the fovs of VIEW_BATCH cameras
+    of the path at once (per camera). Returns a list of result dictionaries.
+    """
+    level = Level(levelFile)
+    headless = HeadlessRenderer(level, SIZE, totalRays, fovDegrees, backend)
+    raycasting = headless.get_raycasting()
+    fovRays = int(headless.get_renderer().get_fov_rays())
+    collision = Collision(level, BLOCK_SIZE)
+
+    try:
+        poses = camera_path(level, raycasting, fovRays, frames + WARMUP_FRAMES)
+        times = {"cast_fov": [], "collision": [], "frame": [], "cast_views": []}
+
+        for i, (pos, middleRay) in enumerate(poses):
+            player = Player(pos, middleRay, raycasting, fovRays)
+
+            start = perf_counter()
+            raycasting.cast_fov(player.get_left_ray(), player.get_right_ray(), pos)
+            castTime = perf_counter() - start
+
+            # Collision check of moving forward and to the right at once
+            start = perf_counter()
+            moveVector = raycasting.get_ray_vector(middleRay) + \
+                         raycasting.get_ray_vector(raycasting.perpendicular_right_ray(middleRay))
+            collision.move(pos, moveVector * PATH_MOVE)
+            collisionTime = perf_counter() - start
+
+            start = perf_counter()
+            headless.render(pos, middleRay)
+            frameTime = perf_counter() - start
+
+            if i >= WARMUP_FRAMES:
+                times["cast_fov"].append(castTime)
+                times["collision"].append(collisionTime)
+                times["frame"].append(frameTime)
+
+        # Many cameras at once
+        measured = poses[WARMUP_FRAMES:]
+        for first in range(0, len(measured), VIEW_BATCH):
+            batch = measured[first:first + VIEW_BATCH]
+            positions = [(pos.x, pos.y) for pos, middleRay in batch]
+            middleRays = [middleRay for pos, middleRay in batch]
+
+            start = perf_counter()
+            raycasting.cast_views(positions, middleRays, fovRays)
+            viewsTime = perf_counter() - start
+            times["cast_views"].extend([viewsTime / len(batch)] * len(batch))
+    finally:
+        headless.close()
+
+    results = []
+    for stage, stageTimes in times.items():
+        result = {
+            "level": os.path.basename(levelFile),
+            "backend": type(raycasting).__name__,
+            "rays": totalRays,
+            "fov": fovDegrees,
+            "stage": stage,
+        }
+        result.update(percentiles(stageTimes))
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backend", default="numpy",
+                        help="comma separated raycasting backends (see backends.py)")
+    parser.add_argument("--frames", type=int, default=100,
+                        help="measured frames per level and setting")
+    parser.add_argument("--levels", nargs="*", default=LEVELS)
+    parser.add_argument("--output", help="save results to this JSON file")
+    args = parser.parse_args()
+
+    levelDirectory = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for backend in args.backend.split(","):
+        for totalRays, fovDegrees in SETTINGS:
+            for levelFile in args.levels:
+                if not os.path.isabs(levelFile) and not os.path.exists(levelFile):
+                    levelFile = os.path.join(levelDirectory, levelFile)
+                for result in benchmark_level(levelFile, backend, totalRays, fovDegrees,
+                                              args.frames):
+                    results.append(result)
+                    print("%-9s %-16s rays=%-5d fov=%-3d %-10s p50=%8.3f p95=%8.3f p99=%8.3f ms" %
+                          (result["level"], result["backend"], result["rays"], result["fov"],
+                           result["stage"], result["p50"], result["p95"], result["p99"]))
+
+    if args.output:
+        report = {
+            "environment": {
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "pygame": pygame.version.ver,
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+            },
+            "frames": args.frames,
+            "size": SIZE,
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
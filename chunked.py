@@ -0,0 +1,403 @@
+#! /usr/bin/env python3
+
+"""
+Contains the chunked level, which keeps only the part of a (possibly huge) maze
+near the camera in memory, and the converter from level files to chunk files.
+
+A chunk file consists of a header, an index with the file offset of every chunk
+(0 for empty chunks, which aren't stored at all) and the chunks
+themselves: CHUNK_SIZE x CHUNK_SIZE uint8 blocks indexed [x, y] (see level.py).
+
+Usage: python3 chunked.py level.lvl level.lvlc
+"""
+
+import struct
+from collections import OrderedDict
+from sys import argv, exit
+
+import numpy as np
+from pygame import Vector2
+
+from level import EMPTY, WALL, FLAG, START, OUTSIDE, compute_distance_field
+
+
+#
+# Constants
+#
+
+CHUNK_SIZE = 64     # Chunks are this number of blocks wide and high
+MAX_CHUNKS = 1024   # How many chunks are kept in memory at most by default
+
+MAGIC = b"LVLC"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIiiii")  # Magic, version, chunk size, width, height,
+                                       # start block x and y, flag block x and y
+
+
+#
+# Classes
+#
+
+class ChunkedLevel:
+    """
+    Level loaded from a chunk file (see convert_level()). Has the same interface as
+    Level except for the methods returning the whole grid (get_grid(),
+    get_walls(), get_distance_field()), so it works with all raycasting backends
+    but the parallel one.
+
+    Chunks are read from the file when they are first needed and kept in an LRU
+    cache of at most maxChunks chunks. Empty chunks are never read, they are
+    known to be empty from the index.
+    """
+
+    def __init__(self, chunkFile, maxChunks=MAX_CHUNKS):
+        """
+        Parameters
+        ----------
+        chunkFile : string
+        maxChunks : int
+        """
+        self.file = open(chunkFile, "rb")
+        self.maxChunks = maxChunks
+        self.chunks = OrderedDict()  # (chunkX, chunkY) -> (blocks, emptyRadii)
+
+        magic, version, chunkSize, width, height, startX, startY, flagX, flagY = \
+            HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise Exception("%s is not a chunk file of version %d" % (chunkFile, VERSION))
+
+        self.chunkSize = chunkSize
+        self.width = width
+        self.height = height
+        self.size = Vector2(width, height)
+        self.startBlock = Vector2(startX, startY)
+        self.flagBlock = Vector2(flagX, flagY)
+
+        chunksX = -(-width // chunkSize)
+        chunksY = -(-height // chunkSize)
+        self.offsets = np.frombuffer(self.file.read(chunksX * chunksY * 8), dtype="<u8")
+        self.offsets = self.offsets.reshape(chunksX, chunksY)
+
+    def close(self):
+        """
+        Close the chunk file.
+        """
+        self.file.close()
+        self.chunks.clear()
+
+    def get_size(self):
+        """
+        Returns the size of the level in blocks as a pygame vector.
+        """
+        return self.size
+
+    def get_start_block(self):
+        """
+        Returns the block coordinates, where player starts as a pygame vector.
+        """
+        return self.startBlock
+
+    def get_flag_block(self):
+        """
+        Returns the block coordinates of flag as a pygame vector.
+        """
+        return self.flagBlock
+
+    def get_chunk_size(self):
+        """
+        Returns how many blocks wide and high chunks are.
+        """
+        return self.chunkSize
+
+    def get_loaded_chunks(self):
+        """
+        Returns how many chunks are in memory.
+        """
+        return len(self.chunks)
+
+    def get_block(self, x, y):
+        """
+        Returns value of the block (see the constants in level.py) at given block
+        coordinates. Coordinates outside of the level give OUTSIDE.
+
+        Parameters
+        ----------
+        x : int
+        y : int
+        """
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return OUTSIDE
+        chunk = self._get_chunk(x // self.chunkSize, y // self.chunkSize)
+        if chunk is None:
+            return EMPTY
+        return int(chunk[0][x % self.chunkSize, y % self.chunkSize])
+
+    def get_blocks(self, x, y):
+        """
+        Returns values of blocks (see the constants in level.py) at given block
+        coordinates. Vectorized, takes arrays (of floats or ints) of any shape.
+        Coordinates outside of the level give OUTSIDE.
+
+        Parameters
+        ----------
+        x : NumPy array
+        y : NumPy array
+        """
+        x = np.clip(x, -1, self.width).astype(np.intp)
+        y = np.clip(y, -1, self.height).astype(np.intp)
+        x, y = np.broadcast_arrays(x, y)
+        result = np.full(x.shape, OUTSIDE, dtype=np.uint8)
+
+        inside = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+        x = x[inside]
+        y = y[inside]
+        values = np.full(x.shape, EMPTY, dtype=np.uint8)
+
+        # Look blocks up chunk by chunk, skipping empty chunks
+        chunkX = x // self.chunkSize
+        chunkY = y // self.chunkSize
+        stored = self.offsets[chunkX, chunkY] != 0
+        chunkIds = chunkX * self.offsets.shape[1] + chunkY
+        for chunkId in np.unique(chunkIds[stored]):
+            selected = chunkIds == chunkId
+            blocks = self._get_chunk(*divmod(int(chunkId), self.offsets.shape[1]))[0]
+            values[selected] = blocks[x[selected] % self.chunkSize,
+                                      y[selected] % self.chunkSize]
+
+        result[inside] = values
+        return result
+
+    def is_wall_at(self, x, y):
+        """
+        Returns if wall is present at given block coordinates. Returns False if
+        coordinates outside of the level.
+
+        Parameters
+        ----------
+        x : int
+        y : int
+        """
+        return self.get_block(x, y) == WALL
+
+    def is_wall_at_vector(self, v):
+        """
+        Like is_wall_at(), but takes pygame vector as argument.
+        """
+        return self.is_wall_at(int(v.x), int(v.y))
+
+    def is_flag_at(self, x, y):
+        """
+        Returns if flag is present at given block coordinates. Returns False if
+        coordinates outside of the level.
+
+        Parameters
+        ----------
+        x : int
+        y : int
+        """
+        return self.get_block(x, y) == FLAG
+
+    def is_flag_at_vector(self, v):
+        """
+        Like is_flag_at(), but takes pygame vector as argument.
+        """
+        return self.is_flag_at(int(v.x), int(v.y))
+
+    def get_empty_radius(self, x, y):
+        """
+        Returns a distance from given block coordinates, so that all blocks less
+        than this distance away (in Chebyshev metric) are empty (see
+        Level.get_empty_radius()). Only the chunk of the block is looked at, so
+        the distance is at most the distance to the border of the chunk.
+
+        Parameters
+        ----------
+        x : int
+        y : int
+        """
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            # There is nothing outside of the level
+            outsideX = -x if x < 0 else max(0, x - self.width + 1)
+            outsideY = -y if y < 0 else max(0, y - self.height + 1)
+            return max(outsideX, outsideY)
+
+        localX = x % self.chunkSize
+        localY = y % self.chunkSize
+        toBorder = min(localX, self.chunkSize - 1 - localX,
+                       localY, self.chunkSize - 1 - localY) + 1
+
+        chunk = self._get_chunk(x // self.chunkSize, y // self.chunkSize)
+        if chunk is None:
+            return toBorder
+        return min(int(chunk[1][localX, localY]), toBorder)
+
+    def get_empty_radii(self, x, y):
+        """
+        Vectorized version of get_empty_radius(), takes arrays of ints of any
+        shape.
+
+        Parameters
+        ----------
+        x : NumPy array
+        y : NumPy array
+        """
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=np.intp), np.asarray(y, dtype=np.intp))
+        outsideX = np.maximum(np.maximum(-x, x - self.width + 1), 0)
+        outsideY = np.maximum(np.maximum(-y, y - self.height + 1), 0)
+        inside = (outsideX == 0) & (outsideY == 0)
+        radii = np.maximum(outsideX, outsideY)
+
+        x = x[inside]
+        y = y[inside]
+        localX = x % self.chunkSize
+        localY = y % self.chunkSize
+        values = np.minimum(np.minimum(localX, self.chunkSize - 1 - localX),
+                            np.minimum(localY, self.chunkSize - 1 - localY)) + 1
+
+        # Look the field up chunk by chunk, empty chunks have nothing to hit
+        chunkX = x // self.chunkSize
+        chunkY = y // self.chunkSize
+        stored = self.offsets[chunkX, chunkY] != 0
+        chunkIds = chunkX * self.offsets.shape[1] + chunkY
+        for chunkId in np.unique(chunkIds[stored]):
+            selected = chunkIds == chunkId
+            field = self._get_chunk(*divmod(int(chunkId), self.offsets.shape[1]))[1]
+            values[selected] = np.minimum(values[selected],
+                                          field[localX[selected], localY[selected]])
+
+        radii[inside] = values
+        return radii
+
+    #
+    # Internal methods of the class
+    #
+
+    def _get_chunk(self, chunkX, chunkY):
+        """
+        Returns a tupple (blocks, distance field) of the chunk or None if the
+        chunk is empty. Reads the chunk from the file if it isn't cached.
+        """
+        key = (chunkX, chunkY)
+        if key in self.chunks:
+            self.chunks.move_to_end(key)
+            return self.chunks[key]
+
+        offset = int(self.offsets[chunkX, chunkY])
+        if offset == 0:
+            return None
+
+        self.file.seek(offset)
+        data = self.file.read(self.chunkSize * self.chunkSize)
+        blocks = np.frombuffer(data, dtype=np.uint8).reshape(self.chunkSize, self.chunkSize)
+        if ((blocks & (WALL | FLAG)) != 0).any():
+            field = np.minimum(compute_distance_field(blocks), 255).astype(np.uint8)
+        else:
+            # Only the starting position, there is nothing to hit
+            field = np.full(blocks.shape, 255, dtype=np.uint8)
+
+        self.chunks[key] = (blocks, field)
+        if len(self.chunks) > self.maxChunks:
+            self.chunks.popitem(last=False)
+        return self.chunks[key]
+
+
+#
+# Converting
+#
+
+def convert_level(levelFile, chunkFile, chunkSize=CHUNK_SIZE):
+    """
+    Convert a level file into a chunk file. The level file is read one row of
+    chunks at a time, so levels much bigger than the memory can be converted.
+
+    Parameters
+    ----------
+    levelFile : string
+    chunkFile : string
+    chunkSize : int
+    """
+    with open(levelFile, "r") as source, open(chunkFile, "wb") as target:
+        width, height = map(int, source.readline().split())
+        chunksX = -(-width // chunkSize)
+        chunksY = -(-height // chunkSize)
+        offsets = np.zeros((chunksX, chunksY), dtype="<u8")
+
+        # Leave space for the header and the index, they are written at the end
+        target.write(bytes(HEADER.size + offsets.nbytes))
+
+        startBlock = None
+        flagBlock = None
+        band = np.zeros((chunksX * chunkSize, chunkSize), dtype=np.uint8)
+        chunkY = 0
+        y = -1
+        for y, line in enumerate(source):
+            line = line.split()
+
+            if y >= height:
+                if line:
+                    raise Exception("There are too many lines for the specified level height (%d specified)" %
+                                    (height))
+                continue
+            if len(line) > width:
+                raise Exception("Line %d has too many blocks for the specified level width (%d specified)" %
+                                (y + 1, width))
+
+            # Parse the line into the current band of chunks (a blank line is
+            # an empty row, as in Level)
+            column = band[:, y % chunkSize]
+            column[:] = EMPTY
+            if line:
+                chars = np.array([char.lower() for char in line])
+                column[:len(line)][chars == "w"] = WALL
+                for x in np.nonzero(chars == "p")[0]:
+                    if not startBlock is None:
+                        raise Exception("Player starting position is present more than one time.")
+                    startBlock = (int(x), y)
+                    column[x] = START
+                for x in np.nonzero(chars == "f")[0]:
+                    if not flagBlock is None:
+                        raise Exception("Flag position is present more than one time.")
+                    flagBlock = (int(x), y)
+                    column[x] = FLAG
+
+            if y % chunkSize == chunkSize - 1:
+                _write_band(target, band, chunkY, offsets)
+                band[:] = EMPTY
+                chunkY += 1
+
+        if chunkY < chunksY:
+            _write_band(target, band, chunkY, offsets)
+
+        if startBlock is None:
+            raise Exception("There is no player position.")
+        if flagBlock is None:
+            raise Exception("There is no flag position.")
+
+        target.seek(0)
+        target.write(HEADER.pack(MAGIC, VERSION, chunkSize, width, height,
+                                 startBlock[0], startBlock[1], flagBlock[0], flagBlock[1]))
+        target.write(offsets.tobytes())
+
+
+def _write_band(target, band, chunkY, offsets):
+    """
+    Append the non-empty chunks of a band (one row of chunks) to the chunk file
+    and record their offsets.
+    """
+    chunkSize = band.shape[1]
+    for chunkX in range(offsets.shape[0]):
+        chunk = band[chunkX * chunkSize:(chunkX + 1) * chunkSize]
+        if (chunk != EMPTY).any():
+            offsets[chunkX, chunkY] = target.tell()
+            target.write(np.ascontiguousarray(chunk).tobytes())
+
+
+def main():
+    if len(argv) < 3:
+        print("Usage: python3 chunked.py level.lvl level.lvlc")
+        exit(1)
+    convert_level(argv[1], argv[2])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Contains collision checks of the player against the walls of the level.
+"""
+
+from math import floor
+
+from pygame import Vector2
+
+
+#
+# Constants
+#
+
+PLAYER_RADIUS = 8  # Half of the width of the player's (square) hitbox in units
+EPSILON = 1e-6     # How far from a wall the hitbox stops
+
+
+#
+# Classes
+#
+
+class Collision:
+    """
+    Moves the player's hitbox (a square) through the wall grid of a level. Only
+    the blocks the hitbox passes over are checked. The movement is split into
+    the x and the y part, so a hitbox that hits a wall slides along it. Like
+    in the rest of the game only walls are solid, the player can leave the
+    level where it isn't closed by walls.
+    """
+
+    def __init__(self, level, blockSize, radius=PLAYER_RADIUS):
+        """
+        Parameters
+        ----------
+        level : Level
+        blockSize : int
+        radius : float (half of the width of the hitbox in units)
+        """
+        self.level = level
+        self.blockSize = blockSize
+        self.radius = radius
+
+    def get_radius(self):
+        """
+        Returns half of the width of the hitbox.
+        """
+        return self.radius
+
+    def move(self, pos, vector):
+        """
+        Returns where the hitbox centered at pos ends up when moved by vector,
+        as a new pygame vector.
+
+        Parameters
+        ----------
+        pos : pygame.Vector2
+        vector : pygame.Vector2
+        """
+        x = self._move_along_axis(pos.x, pos.y, vector.x, horizontal=True)
+        y = self._move_along_axis(pos.y, x, vector.y, horizontal=False)
+        return Vector2(x, y)
+
+    def is_blocked(self, pos):
+        """
+        Returns if the hitbox centered at pos overlaps a wall.
+
+        Parameters
+        ----------
+        pos : pygame.Vector2
+        """
+        firstX, lastX = self._block_span(pos.x)
+        firstY, lastY = self._block_span(pos.y)
+        for x in range(firstX, lastX + 1):
+            for y in range(firstY, lastY + 1):
+                if self.level.is_wall_at(x, y):
+                    return True
+        return False
+
+    #
+    # Internal methods of the class
+    #
+
+    def _move_along_axis(self, coord, otherCoord, delta, horizontal):
+        """
+        Move the hitbox along one axis. Returns the new coordinate on that axis.
+
+        Parameters
+        ----------
+        coord : float (coordinate of the center on the axis of movement)
+        otherCoord : float (coordinate of the center on the other axis)
+        delta : float
+        horizontal : bool (True for the x axis)
+        """
+        if delta == 0:
+            return coord
+
+        # Rows (or columns) of blocks the hitbox spans across the movement
+        first, last = self._block_span(otherCoord)
+
+        # Check every block the leading edge of the hitbox enters
+        if delta > 0:
+            edge = coord + self.radius
+            enteredBlocks = range(floor(edge / self.blockSize) + 1,
+                                  floor((edge + delta) / self.blockSize) + 1)
+        else:
+            edge = coord - self.radius
+            enteredBlocks = range(floor(edge / self.blockSize) - 1,
+                                  floor((edge + delta) / self.blockSize) - 1, -1)
+
+        for block in enteredBlocks:
+            for other in range(first, last + 1):
+                solid = self.level.is_wall_at(block, other) if horizontal else \
+                        self.level.is_wall_at(other, block)
+                if solid:
+                    # Stop just in front of the block
+                    if delta > 0:
+                        return block * self.blockSize - self.radius - EPSILON
+                    return (block + 1) * self.blockSize + self.radius + EPSILON
+
+        return coord + delta
+
+    def _block_span(self, coord):
+        """
+        Returns the first and the last block the hitbox centered at coord spans
+        along one axis.
+        """
+        first = floor((coord - self.radius) / self.blockSize)
+        last = floor((coord + self.radius) / self.blockSize)
+        return first, last
@@ -0,0 +1,148 @@
+#! /usr/bin/env python3
+
+"""
+Contains the compiled level format and the cache of compiled levels. Parsing a
+text level file takes time proportional to its size, a compiled level is
+memory-mapped and used without parsing or copying anything.
+
+A compiled level file consists of a header, the padded level grid (see Level)
+with one uint8 per block and the distance field (see
+Level.get_distance_field()) as int32, both indexed [x, y].
+
+Usage: python3 compiled.py level.lvl level.lvlb
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+from sys import argv, exit
+
+import numpy as np
+
+from level import Level
+
+
+#
+# Constants
+#
+
+CACHE_DIR = "__levelcache__"  # Compiled levels are cached in this directory
+                              # next to the level file
+
+MAGIC = b"LVLB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIiiii")  # Magic, version, reserved, width, height,
+                                       # start block x and y, flag block x and y
+HASH_BLOCK_SIZE = 1 << 20  # Level files are hashed in blocks of this many bytes
+
+
+#
+# Functions
+#
+
+def compile_level(level, compiledFile):
+    """
+    Save a loaded level as a compiled level file. The file is written under a
+    temporary name and renamed, so a partially written file is never loaded.
+
+    Parameters
+    ----------
+    level : Level
+    compiledFile : string
+    """
+    size = level.get_size()
+    startBlock = level.get_start_block()
+    flagBlock = level.get_flag_block()
+    grid = level.get_grid()
+
+    temporaryFile = "%s.%d.tmp" % (compiledFile, os.getpid())
+    with open(temporaryFile, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, int(size.x), int(size.y),
+                            int(startBlock.x), int(startBlock.y),
+                            int(flagBlock.x), int(flagBlock.y)))
+        f.write(np.ascontiguousarray(grid).tobytes())
+        f.write(bytes(-grid.size % 4))  # Align the distance field
+        f.write(np.ascontiguousarray(level.get_distance_field(), dtype="<i4").tobytes())
+    os.replace(temporaryFile, compiledFile)
+
+
+def load_compiled(compiledFile):
+    """
+    Returns a Level backed by a memory-mapped compiled level file. Nothing is
+    copied, the pages of the file are read by the OS when they are first used.
+
+    Parameters
+    ----------
+    compiledFile : string
+    """
+    with open(compiledFile, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, _, width, height, startX, startY, flagX, flagY = \
+        HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise Exception("%s is not a compiled level of version %d" % (compiledFile, VERSION))
+
+    gridShape = (width + 2, height + 2)
+    gridSize = gridShape[0] * gridShape[1]
+    fieldOffset = HEADER.size + gridSize + (-gridSize % 4)
+    if len(data) != fieldOffset + width * height * 4:
+        raise Exception("%s is truncated" % (compiledFile))
+
+    # The arrays keep the mapping open
+    grid = np.frombuffer(data, dtype=np.uint8, count=gridSize, offset=HEADER.size)
+    field = np.frombuffer(data, dtype="<i4", count=width * height, offset=fieldOffset)
+    return Level.from_grid(grid.reshape(gridShape), (startX, startY), (flagX, flagY),
+                           field.reshape(width, height))
+
+
+def load_level(levelFile, cacheDir=None):
+    """
+    Returns a Level loaded from a text level file. The level is compiled on the
+    first load and cached under the hash of the level file and the version of
+    the format, so later loads (of this file or of any file with the same
+    content) only hash the file and memory-map the compiled version, and
+    levels compiled by another version are compiled again.
+
+    Parameters
+    ----------
+    levelFile : string
+    cacheDir : string or None (CACHE_DIR next to the level file by default)
+    """
+    if cacheDir is None:
+        cacheDir = os.path.join(os.path.dirname(os.path.abspath(levelFile)), CACHE_DIR)
+    compiledFile = os.path.join(cacheDir, "%s-v%d.lvlb" % (hash_file(levelFile), VERSION))
+
+    if not os.path.exists(compiledFile):
+        level = Level(levelFile)
+        try:
+            os.makedirs(cacheDir, exist_ok=True)
+            compile_level(level, compiledFile)
+        except OSError:
+            return level  # Read-only location, just don't cache
+    return load_compiled(compiledFile)
+
+
+def hash_file(path):
+    """
+    Returns hex digest of the SHA-1 hash of the content of a file.
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        block = f.read(HASH_BLOCK_SIZE)
+        while block:
+            digest.update(block)
+            block = f.read(HASH_BLOCK_SIZE)
+    return digest.hexdigest()
+
+
+def main():
+    if len(argv) < 3:
+        print("Usage: python3 compiled.py level.lvl level.lvlb")
+        exit(1)
+    compile_level(Level(argv[1]), argv[2])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Contains screen effects. Effects are applied to the results of casting rays after
+casting, so the raycasting engines don't have to know about them. An inactive
+effect costs nothing, the game then casts rays the usual way.
+"""
+
+import numpy as np
+
+
+#
+# Classes
+#
+
+class CataclysmEffect:
+    """
+    The win screen animation. Once started, rays get randomly messed up (more and
+    more of them as time goes on): they see only walls on horizontal grid lines
+    (code 1), only walls on vertical grid lines (code 2) or nothing at all
+    (code 3). Rays that see nothing stay that way.
+    """
+
+    def __init__(self, totalRays, speed, seed=None):
+        """
+        Parameters
+        ----------
+        totalRays : int
+        speed : float (how much the strength of the effect grows every frame)
+        seed : int or None (seed of the random number generator)
+        """
+        self.speed = speed
+        self.seed = seed
+        self.rng = None  # Created by start(), NumPy loads its random module lazily
+        self.codes = np.zeros(totalRays, dtype=np.int8)  # How each ray is messed up
+        self.strength = 0.0  # Probability of messing up a ray each frame
+        self.running = False
+
+    def start(self):
+        """
+        Start the animation.
+        """
+        if self.rng is None:
+            self.rng = np.random.default_rng(self.seed)
+        self.running = True
+
+    def is_active(self):
+        """
+        Returns True if the animation is running (and apply() has to be used).
+        """
+        return self.running
+
+    def get_strength(self):
+        """
+        Returns the current strength of the effect (from 0.0 to 1.0).
+        """
+        return self.strength
+
+    def update(self, frames=1.0):
+        """
+        Advance the animation by the given number of frames. A fraction of a
+        frame messes up rays as often as whole frames do on average, so the
+        animation runs at the same speed with any length of the update.
+
+        Parameters
+        ----------
+        frames : float
+        """
+        if not self.running:
+            return
+
+        if self.strength > 0.0:
+            # Each of the three codes is tried in order, a later one wins
+            probability = 1.0 - (1.0 - self.strength) ** frames
+            messable = np.nonzero(self.codes < 3)[0]
+            hits = self.rng.random((3, messable.size)) < probability
+            codes = self.codes[messable]
+            codes[hits[0]] = 1
+            codes[hits[1]] = 2
+            codes[hits[2]] = 3
+            self.codes[messable] = codes
+
+        self.strength = min(self.strength + self.speed * frames, 1.0)
+
+    def apply(self, rays, vertical, horizontal):
+        """
+        Combine vertical and horizontal results of casting the rays (see
+        Raycasting.cast_fov_axes()) into the final tupple of arrays (distances,
+        intersections, flagDistances) with rays messed up.
+
+        Parameters
+        ----------
+        rays : array of ints (which rays were cast)
+        vertical : tupple of arrays
+        horizontal : tupple of arrays
+        """
+        # Rays messed up with code 2 (vertical results) see the flag only across
+        # horizontal grid lines and the other way round (see cast_rays())
+        distanceVert, interVert, flagDistanceHor = vertical
+        distanceHor, interHor, flagDistanceVert = horizontal
+        codes = self.codes[rays]
+
+        # Rays that aren't messed up see the nearest wall
+        useVert = np.isnan(distanceHor) | (distanceVert < distanceHor)
+        distances = np.where(useVert, distanceVert, distanceHor)
+        intersections = np.where(useVert[:, None], interVert, interHor)
+
+        # Flag shouldn't be seen if intersection with a wall is closer (flag
+        # distances are already hidden by the walls of the other direction)
+        flagDistances = np.fmin(
+            np.where(distances < flagDistanceVert, np.nan, flagDistanceVert),
+            np.where(distances < flagDistanceHor, np.nan, flagDistanceHor)
+        )
+
+        # Mess the rest up
+        choices = [codes == 1, codes == 2, codes == 3]
+        distances = np.select(choices, [distanceHor, distanceVert, np.nan], distances)
+        flagDistances = np.select(choices, [flagDistanceVert, flagDistanceHor, np.nan],
+                                  flagDistances)
+        intersections = np.select([choice[:, None] for choice in choices],
+                                  [interHor, interVert, np.nan], intersections)
+
+        return distances, intersections, flagDistances
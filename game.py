@@ -1,10 +1,21 @@
-from math import radians, tan, ceil
-from random import random
+from math import ceil
 
 import pygame
 
 from player import Player
 from raycasting import Raycasting
+from backends import create_raycasting
+from resolution import ResolutionScaler
+from raycache import RayCache
+from profiling import FrameProfiler
+from minimap import Minimap, MINIMAP_COLOR
+from hud import Hud
+from effects import CataclysmEffect
+from collision import Collision
+from sprites import Sprites
+from textures import WallTexture
+from renderer import (Renderer, BLOCK_SIZE, CEIL_COLOR, FLAG_COLOR, FLAG_SPRITE_WIDTH,
+                      FLAG_SPRITE_HEIGHT, RENDER_DISTANCE)
 
 
 #
@@ -17,23 +28,17 @@ NORMALIZED_TURN = 4    # Camera turn speed in number of rays for RAYS
 
 NORMALIZED_CATACLYSM = 2.0  # Speed of win animation
 
-BLOCK_SIZE = 64        # Walls will be blockSize x blockSize x blockSize units big
-PROJECTION_WIDTH = 12  # How big should the screen be inside the game world
+SIMULATION_RATE = 60      # Simulation steps per second, independent of the frame rate
+MAX_STEPS_PER_FRAME = 5   # When frames take longer than this many steps, the game
+                          # slows down instead of simulating ever more steps
 
-FLAG_HEIGHT_DIV = 5    # Flag will be this number times shorter than wall
-
-CEIL_COLOR = (32, 32, 128)
-WALL_COLOR = (128, 128, 128)
-FLOOR_COLOR = (48, 48, 48)
-FLAG_COLOR = (128, 128, 0)
-MINIMAP_COLOR = (255, 0, 0)
 TEXT_COLOR = (255, 255, 255)
 WIN_SCREEN_OPACITY = 172  # 255 is maximum
 
-MINIMAP_SIZE_DIV = 4     # Draw minimap this number times smaller than real units
-MINIMAP_PLAYER_SIZE = 4  # How many pixels wide should the player dot be
+PROFILER_FONT_SIZE = 18
 
-RENDER_DISTANCE = 10 * BLOCK_SIZE  # The distance after which walls become absolutely dark
+CEILING_TILE_COLOR = (40, 40, 140)
+CEILING_GROUT_COLOR = (28, 28, 100)
 
 
 #
@@ -46,61 +51,139 @@ class Game:
     constants on object creation.
     """
 
-    def __init__(self, level, windowSize, totalRays, fovDegrees, targetFps):
+    def __init__(self, level, windowSize, totalRays, fovDegrees, targetFps, backend=None,
+                 adaptiveResolution=False, profileExport=None, fastStart=False,
+                 startupProfiler=None, texturedWalls=False, castFloor=False, pvsLoader=None):
+        """
+        Parameters
+        ----------
+        level : Level
+        windowSize : tupple of two ints
+        totalRays : int
+        fovDegrees : int
+        targetFps : int
+        backend : string or None (see backends.py)
+        adaptiveResolution : bool
+        profileExport : string or None (where to save the frame trace at exit)
+        fastStart : bool (initialize only the pygame subsystems the game uses and
+                    use the font bundled with pygame instead of searching system
+                    fonts)
+        startupProfiler : StartupProfiler or None (marked after every phase of
+                          the initialization)
+        texturedWalls : bool (draw walls with a brick texture instead of a flat
+                        color)
+        castFloor : bool (draw tiled floor and ceiling instead of flat colors)
+        pvsLoader : PvsLoader or None (once the potentially visible set is
+                    loaded, rays stop behind the farthest block that can be seen
+                    from the block of the camera and sprites, including the flag,
+                    that can't be seen are skipped, see pvs.py)
+        """
         self.level = level
         self.windowSize = windowSize
         self.fovDegrees = fovDegrees
         self.targetFps = targetFps
+        self.profileExport = profileExport  # Where to save the frame trace at exit
 
-        self.moveSpeed = NORMALIZED_MOVE * (60 / targetFps)
-        self.turnSpeed = NORMALIZED_TURN * (60 / targetFps) * (totalRays / 600)
-        self.cataclysmSpeed = NORMALIZED_CATACLYSM * 0.00001 * (60 / targetFps)
+        # Speeds per second, a simulation step of length timeStep (in seconds)
+        # moves by speed * timeStep
+        self.timeStep = 1.0 / SIMULATION_RATE
+        self.moveSpeed = NORMALIZED_MOVE * 60
+        self.turnSpeed = NORMALIZED_TURN * 60 * (totalRays / 600)
+        self.cataclysmSpeed = NORMALIZED_CATACLYSM * 0.00001 * 60
 
         self.raycasting = None
         self.screen = None
         self.font = None
         self.minimap = None
+        self.hud = None
+        self.cataclysm = None
+        self.sprites = None
+
+        # State of the current game, see run()
+        self.playerHasMoved = False
+        self.timerOn = False
+        self.timer = 0.0
+        self.win = False
+        self.renderer = None
         self.fovRays = None
-        self.pixelsPerRay = None
-        self.distanceToProjection = None
         self.player = None
         self.winScreen = None
+        self.resolutionScaler = None
+        self.rayCache = None
+        self.profiler = FrameProfiler()
+        self.profilerFont = None  # Loaded when the overlay is first shown
+        self.fastStart = fastStart
+        self.startupProfiler = startupProfiler
+        self.texturedWalls = texturedWalls
+        self.castFloor = castFloor
+        self.pvsLoader = pvsLoader
 
         # Initialize raycasting logic
-        self.raycasting = Raycasting(totalRays, BLOCK_SIZE, self.level)
-
-        # Initialize pygame
-        pygame.init()
+        self.raycasting = create_raycasting(backend, totalRays, BLOCK_SIZE, self.level,
+                                            RENDER_DISTANCE // BLOCK_SIZE)
+        self.raycasting.set_flag_detection(False)  # The flag is a sprite
+        self.rayCache = RayCache(self.raycasting)
+
+        # Place sprites
+        self.sprites = Sprites(BLOCK_SIZE)
+        flagPos = self.level.get_flag_block() * BLOCK_SIZE
+        self.sprites.add((flagPos.x + BLOCK_SIZE // 2, flagPos.y + BLOCK_SIZE // 2),
+                         FLAG_SPRITE_WIDTH, FLAG_SPRITE_HEIGHT, FLAG_COLOR)
+
+        # Prepare win screen animation
+        self.cataclysm = CataclysmEffect(totalRays, self.cataclysmSpeed / self.targetFps)
+        self._mark_startup("raycasting")
+
+        # Initialize pygame (only the display in the fast start mode, the game
+        # doesn't use sound or joysticks)
+        if self.fastStart:
+            pygame.display.init()
+        else:
+            pygame.init()
         pygame.display.set_caption("Raycasting labyrint")
         self.screen = pygame.display.set_mode(self.windowSize)
+        self._mark_startup("display")
 
         # Prepare font rendering
         pygame.font.init()
-        self.font = pygame.font.SysFont("Sans Serif", 30)
-
-        # Prepare minimap
-        minimapSize = self.level.get_size() * BLOCK_SIZE // MINIMAP_SIZE_DIV
-        self.minimap = pygame.Surface((minimapSize.x, minimapSize.y))
-
-        # Compute fov related stuff
-        self.fovRays = self.raycasting.degrees_to_ray_number(self.fovDegrees)
-        self.pixelsPerRay = windowSize[0] // (totalRays // (360 // self.fovDegrees))
-
-        # Compute distance between player and the projection plane (also fov stuff)
-        self.distanceToProjection = int((PROJECTION_WIDTH) /
-                                        (tan(radians(self.fovDegrees / 2))))
-        
-        # Prepare fisheye correction
-        self.fisheyeCoefficients = self.raycasting.fisheye_coefficients(
-            self.fovDegrees,
-            self.fovRays
-        )
+        if self.fastStart:
+            self.font = pygame.font.Font(None, 30)
+        else:
+            self.font = pygame.font.SysFont("Sans Serif", 30)
+        self._mark_startup("fonts")
+
+        # Prepare HUD
+        self.hud = Hud(self.font)
+        self.hud.add_text("fps", (self.windowSize[0] - (7 * 10) - 8, 8), TEXT_COLOR)
+        self.hud.add_text("time", (self.windowSize[0] - (12 * 10) - 8, self.windowSize[1] - 16 - 8),
+                          TEXT_COLOR)
+
+        # Prepare minimap (scrolls if the level doesn't fit into the window)
+        self.minimap = Minimap(self.level, self.windowSize)
+
+        # Prepare rendering of the 3d view
+        texture = WallTexture.bricks() if self.texturedWalls else None
+        floorTexture = None
+        ceilingTexture = None
+        if self.castFloor:
+            floorTexture = WallTexture.tiles()
+            ceilingTexture = WallTexture.tiles(tileColor=CEILING_TILE_COLOR,
+                                               groutColor=CEILING_GROUT_COLOR)
+        self.renderer = Renderer(self.raycasting, self.windowSize, self.fovDegrees, texture,
+                                 floorTexture, ceilingTexture)
+        self.fovRays = self.renderer.get_fov_rays()
+        self._mark_startup("renderer")
+
+        # Prepare dynamic resolution scaling
+        if adaptiveResolution:
+            self.resolutionScaler = ResolutionScaler(int(self.fovRays), self.targetFps)
 
         # Create player object
         startPos = self.level.get_start_block() * BLOCK_SIZE
         startPos[0] = startPos.x + (BLOCK_SIZE // 2)  # Center vertically
         startPos[1] = startPos.y + (BLOCK_SIZE // 2)  # Center horizontally
-        self.player = Player(startPos, 0, self.raycasting, self.fovRays)
+        self.player = Player(startPos, 0, self.raycasting, self.fovRays,
+                             Collision(self.level, BLOCK_SIZE))
 
         # Create win screen
         self.winScreen = pygame.Surface(windowSize, flags=pygame.SRCALPHA)
@@ -116,26 +199,38 @@ class Game:
         pressQ = self.font.render("Press 'Q' to quit.", False, TEXT_COLOR)
         self.winScreen.blit(youWon, (8, 8))
         self.winScreen.blit(pressQ, (8, 40))
+        self._mark_startup("game")
     
     def run(self):
         """
-        Main game loop.
+        Main game loop. The game is simulated in steps of fixed length
+        (SIMULATION_RATE per second) no matter how fast frames are rendered. Every
+        frame runs as many steps as the time since the previous frame requires and
+        renders the camera pose interpolated between the last two steps.
         """
 
         clock = pygame.time.Clock()
         keepGoing = True
 
-        playerHasMoved = False
-        timerOn = False
-        timer = 0.0
+        self.playerHasMoved = False
+        self.timerOn = False
+        self.timer = 0.0  # Simulated time in milliseconds
 
-        win = False      # Set to True when player reaches the flag
+        self.win = False  # Set to True when player reaches the flag
         drawMinimap = False
+        drawProfiler = False
+
+        accumulator = 0.0  # Time (in seconds) not yet simulated
+        previousPose = self.player.get_pose()
 
-        cataclysm = 0.0  # Win screen animation time
-        cataclysmedRays = [0] * self.raycasting.get_total_rays()
+        # The 3d view and minimap are drawn again only when they could change,
+        # otherwise only the changed parts of the HUD are sent to the display
+        lastCamera = None
+        forceRedraw = True
 
         while keepGoing:
+            self.profiler.start_frame()
+
             #
             # Events and user input
             #
@@ -144,6 +239,8 @@ class Game:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     keepGoing = False
+                if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    forceRedraw = True
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_q:  # If 'q' was pressed down
                         # Quit game
@@ -151,224 +248,271 @@ class Game:
                     if event.key == pygame.K_m:  # If 'm' was pressed down
                         # Toggle minimap
                         drawMinimap = not drawMinimap
+                        forceRedraw = True
+                    if event.key == pygame.K_p:  # If 'p' was pressed down
+                        # Toggle profiler overlay
+                        drawProfiler = not drawProfiler
+                        forceRedraw = True
             
-            # Player and camera movement
             pressedKeys = pygame.key.get_pressed()
 
-            self.moveSpeed *= 1.0 - cataclysm
-
-            if pressedKeys[pygame.K_w]:
-                self.player.move_forward(self.moveSpeed)
-
-                if not playerHasMoved:
-                    playerHasMoved = True
-                    timerOn = True
-            if pressedKeys[pygame.K_s]:
-                self.player.move_backward(self.moveSpeed)
-                
-                if not playerHasMoved:
-                    playerHasMoved = True
-                    timerOn = True
-            if pressedKeys[pygame.K_a]:
-                self.player.move_left(self.moveSpeed)
-                
-                if not playerHasMoved:
-                    playerHasMoved = True
-                    timerOn = True
-            if pressedKeys[pygame.K_d]:
-                self.player.move_right(self.moveSpeed)
-                
-                if not playerHasMoved:
-                    playerHasMoved = True
-                    timerOn = True
-
-            if pressedKeys[pygame.K_j]:
-                self.player.turn(-self.turnSpeed)
-            if pressedKeys[pygame.K_l]:
-                self.player.turn(self.turnSpeed)
+            self.profiler.mark("input")
 
             #
-            # Win stuff
+            # Simulation
             #
-            
-            # Check if flag was reached
-            if (not win) and self.player.get_pos() // BLOCK_SIZE == self.level.get_flag_block():
-                win = True
-                timerOn = False
 
-                self.moveSpeed /= 2.0
-                self.turnSpeed //= 2
-            
-            # Animate cataclysm
-            i = 0
-            while i < len(cataclysmedRays):
-                if cataclysmedRays[i] < 3:
-                    if random() < cataclysm:
-                        cataclysmedRays[i] = 1
-                    if random() < cataclysm:
-                        cataclysmedRays[i] = 2
-                    if random() < cataclysm:
-                        cataclysmedRays[i] = 3
-                i += 1
-
-            if win:
-                if cataclysm < 1.0:
-                    cataclysm += self.cataclysmSpeed
-                else:
-                    cataclysm = 1.0
-            
+            accumulator += clock.get_time() / 1000
+            accumulator = min(accumulator, MAX_STEPS_PER_FRAME * self.timeStep)
+            while accumulator >= self.timeStep:
+                previousPose = self.player.get_pose()
+                self._simulate(pressedKeys, self.timeStep)
+                accumulator -= self.timeStep
+
+            self.profiler.mark("simulation")
+
             #
             # Rendering
             #
 
-            # Draw floor and ceiling
-            self.screen.fill(FLOOR_COLOR)
-            ceilRect = pygame.Rect(0, 0, self.windowSize[0], self.windowSize[1] // 2)
-            pygame.draw.rect(self.screen, CEIL_COLOR, ceilRect)
-
-            # Render walls
-            distances, intersections, flagDistances = self.raycasting.cast_rays(  # Cast rays
-                self.player.get_left_ray(),
-                self.player.get_right_ray(),
-                self.player.get_pos(),
-                messUpRays=cataclysmedRays
-            )
-            for i, distance in enumerate(distances):
-                if not distance is None:
-                    #
-                    # Draw a column coresponding to each cast ray
-                    #
-
-                    currPixel = i * self.pixelsPerRay
-
-                    # Compute height of the column
-                    if -1.0 < distance < 1.0:
-                        height = self.windowSize[1]
-                    else:
-                        height = self.windowSize[1] / distance * self.distanceToProjection
-                    
-                    # Apply fisheye correction
-                    height *= self.fisheyeCoefficients[i]
-
-                    # Compute color of the column
-                    colorCoeficient = distance / RENDER_DISTANCE
-                    if colorCoeficient > 1.0:
-                        colorCoeficient = 1.0
-                    red = WALL_COLOR[0] * (1.0 - colorCoeficient) + \
-                          CEIL_COLOR[0] * colorCoeficient
-                    green = WALL_COLOR[1] * (1.0 - colorCoeficient) + \
-                            CEIL_COLOR[1] * colorCoeficient
-                    blue = WALL_COLOR[2] * (1.0 - colorCoeficient) + \
-                           CEIL_COLOR[2] * colorCoeficient
-                    color = (red, green, blue)
-
-                    # Draw the column
-                    column = pygame.Rect(currPixel, self.windowSize[1] // 2 - (height // 2),
-                                       self.pixelsPerRay, height)
-                    pygame.draw.rect(self.screen, color, column)
-            
-            # Render flag
-            for i, distance in enumerate(flagDistances):
-                if not distance is None:
-                    currPixel = i * self.pixelsPerRay
-
-                    # Compute height of the column
-                    if -0.1 < distance < 0.1:
-                        height = self.windowSize[1]
-                    else:
-                        height = self.windowSize[1] / distance * self.distanceToProjection / FLAG_HEIGHT_DIV
-                    
-                    # Apply fisheye correction
-                    height *= self.fisheyeCoefficients[i]
-
-                    # Compute color of the column
-                    colorCoeficient = distance / RENDER_DISTANCE
-                    if colorCoeficient > 1.0:
-                        colorCoeficient = 1.0
-                    red = FLAG_COLOR[0] * (1.0 - colorCoeficient) + \
-                          CEIL_COLOR[0] * colorCoeficient
-                    green = FLAG_COLOR[1] * (1.0 - colorCoeficient) + \
-                            CEIL_COLOR[1] * colorCoeficient
-                    blue = FLAG_COLOR[2] * (1.0 - colorCoeficient) + \
-                           CEIL_COLOR[2] * colorCoeficient
-                    color = (red, green, blue)
-
-                    # Draw the column
-                    column = pygame.Rect(currPixel, self.windowSize[1] // 2 - (height // 2),
-                                       self.pixelsPerRay, height)
-                    pygame.draw.rect(self.screen, color, column)
+            # Render walls and sprites
+            step = 1  # Cast every step-th ray of the fov
+            if not self.resolutionScaler is None:
+                step = self.resolutionScaler.get_step()
+
+            # Camera between the previous and the current simulation step
+            camera = self._interpolate_camera(previousPose, accumulator / self.timeStep)
+            pos, leftRay, rightRay = camera
+
+            # Nothing in the view changes unless the camera or sprites move or the
+            # win animation runs
+            cameraKey = (tuple(pos), leftRay, step)
+            redraw = forceRedraw or drawProfiler or self.cataclysm.is_active() or \
+                     cameraKey != lastCamera or self.sprites.pop_changed()
+            lastCamera = cameraKey
+            forceRedraw = False
+
+            if redraw:
+                # Once the potentially visible set is loaded, it limits how far
+                # rays go and which sprites are projected
+                pvs = None if self.pvsLoader is None else self.pvsLoader.get_pvs()
+                self.raycasting.set_pvs(pvs)
+
+                if self.cataclysm.is_active():
+                    # Cast vertical and horizontal intersections apart and mess
+                    # them up afterwards
+                    vertical, horizontal = self._cast_fov(camera, step, axes=True)
+                    self.profiler.mark("cast")
+                    rays = self.raycasting.ray_range(leftRay, rightRay, step)
+                    distances, intersections, flagDistances = \
+                        self.cataclysm.apply(rays, vertical, horizontal)
+                    self.profiler.mark("effects")
+                else:
+                    distances, intersections, flagDistances = self._cast_fov(camera, step)
+                    self.profiler.mark("cast")
+                raysCast, cellsTraversed = self.raycasting.pop_traversal_counts()
+                self.profiler.count("rays", raysCast)
+                self.profiler.count("cells/ray", cellsTraversed / raysCast if raysCast else 0.0)
+
+                columns = None
+                if self.castFloor:
+                    columns = self.renderer.rasterize_floor(self.screen, pos, leftRay,
+                                                            len(distances), step)
+                    self.profiler.mark("floor")
+                if self.texturedWalls:
+                    sides, offsets = self.raycasting.texture_coordinates(intersections, pos)
+                    columns = self.renderer.rasterize_textured_walls(self.screen, distances,
+                                                                     sides, offsets, step,
+                                                                     columns)
+                else:
+                    columns = self.renderer.rasterize_walls(self.screen, distances, step,
+                                                            columns)
+                self.profiler.mark("walls")
+                self.renderer.rasterize_sprites(self.screen, columns, distances, self.sprites,
+                                                pos, leftRay, step, pvs)
+                self.profiler.mark("sprites")
+                self.renderer.blit_columns(self.screen, columns, step)
+                self.profiler.mark("blit")
 
             #
             # Draw UI
             #
 
             # Minimap
-            if drawMinimap:
-                # Draw walls on minimap
-                self.minimap.fill(FLOOR_COLOR)
-                for x, wall_column in enumerate(self.level.get_walls()):
-                    for y, wall in enumerate(wall_column):
-                        if wall:
-                            rectSize = BLOCK_SIZE // MINIMAP_SIZE_DIV
-                            rectX = x * rectSize
-                            rectY = y * rectSize
-                            rect = pygame.Rect(rectX, rectY, rectSize, rectSize)
-                            pygame.draw.rect(self.minimap, WALL_COLOR, rect)
-                
-                # Draw flag on minimap
-                x, y = self.level.get_flag_block()
-                rectSize = BLOCK_SIZE // MINIMAP_SIZE_DIV
-                rectX = x * rectSize
-                rectY = y * rectSize
-                rect = pygame.Rect(rectX, rectY, rectSize, rectSize)
-                pygame.draw.rect(self.minimap, FLAG_COLOR, rect)
-                
-                # Draw player on minimap
-                rectX = self.player.get_pos().x // MINIMAP_SIZE_DIV
-                rectY = self.player.get_pos().y // MINIMAP_SIZE_DIV
-                rectX -= MINIMAP_PLAYER_SIZE // 2
-                rectY -= MINIMAP_PLAYER_SIZE // 2
-                rect = pygame.Rect(rectX, rectY, MINIMAP_PLAYER_SIZE, MINIMAP_PLAYER_SIZE)
-                pygame.draw.rect(self.minimap, MINIMAP_COLOR, rect)
-
-                # Draw intersections (of rays that have been cast) on minimap
-                for intersection in intersections:
-                    if not intersection is None:
-                        rectX = intersection.x // MINIMAP_SIZE_DIV
-                        rectY = intersection.y // MINIMAP_SIZE_DIV
-                        rect = pygame.Rect(rectX, rectY, 1, 1)
-                        pygame.draw.rect(self.minimap, MINIMAP_COLOR, rect)
-                
-                # Blit minimap onto window
-                self.screen.blit(self.minimap, (0, 0))
+            if redraw and drawMinimap:
+                self.minimap.draw(self.screen, pos, intersections)
+
+            self.profiler.mark("minimap")
 
             # Fps
             fpsCount = ceil(clock.get_fps())
             fpsText = "fps: %d" % (fpsCount)
             color = TEXT_COLOR if fpsCount > (self.targetFps - 10) else MINIMAP_COLOR
-            fpsSurface = self.font.render(fpsText, False, color)
-            self.screen.blit(fpsSurface, (self.windowSize[0] - (7 * 10) - 8, 8))
+            self.hud.set_text("fps", fpsText, color)
+            dirtyRects = self.hud.draw(self.screen, "fps", redraw)
 
             # Win screen
-            if win:
+            if self.win:
                 self.screen.blit(self.winScreen, (0, 0))
             
             # Timer
-            timeText  = "time: %.2f s" % (timer / 1000)
-            timeSurface = self.font.render(timeText, False, TEXT_COLOR)
-            self.screen.blit(timeSurface, (self.windowSize[0] - (12 * 10) - 8, self.windowSize[1] - 16 - 8))
+            timeText  = "time: %.2f s" % (self.timer / 1000)
+            self.hud.set_text("time", timeText)
+            dirtyRects += self.hud.draw(self.screen, "time", redraw)
+
+            # Profiler overlay (shows times of previous frames)
+            if drawProfiler:
+                self.profiler.draw_overlay(self.screen, self._get_profiler_font(), TEXT_COLOR)
+
+            self.profiler.mark("hud")
     
             #
             # Finish drawing 
             #
 
-            pygame.display.flip()
+            if redraw:
+                pygame.display.flip()
+            elif dirtyRects:
+                pygame.display.update(dirtyRects)
+            self.profiler.mark("flip")
 
             #
             # Time
             #
-
-            if timerOn:
-                timer += clock.get_time()
             
             clock.tick(self.targetFps)
+            self.profiler.mark("wait")
+            self.profiler.end_frame()
+
+            if not self.resolutionScaler is None:
+                # Time the frame took without waiting for the next one
+                self.resolutionScaler.update(clock.get_rawtime())
+
+        # Stop worker processes etc. of the raycasting backend
+        self.raycasting.close()
+
+        # Save times of all frames
+        if not self.profileExport is None:
+            self.profiler.export(self.profileExport)
+
+    def _simulate(self, pressedKeys, timeStep):
+        """
+        Advance the game by one simulation step.
+
+        Parameters
+        ----------
+        pressedKeys : sequence of bools (see pygame.key.get_pressed())
+        timeStep : float (length of the step in seconds)
+        """
+        # Player and camera movement. The cataclysm slows the player down by its
+        # strength every frame of targetFps frames per second.
+        self.moveSpeed *= (1.0 - self.cataclysm.get_strength()) ** (timeStep * self.targetFps)
+        move = self.moveSpeed * timeStep
+        turn = self.turnSpeed * timeStep
+
+        forward = pressedKeys[pygame.K_w] - pressedKeys[pygame.K_s]
+        right = pressedKeys[pygame.K_d] - pressedKeys[pygame.K_a]
+        if forward or right:
+            self.player.move_relative(forward * move, right * move)
+
+            if not self.playerHasMoved:
+                self.playerHasMoved = True
+                self.timerOn = True
+
+        if pressedKeys[pygame.K_j]:
+            self.player.turn(-turn)
+        if pressedKeys[pygame.K_l]:
+            self.player.turn(turn)
+
+        if self.timerOn:
+            self.timer += timeStep * 1000
+
+        #
+        # Win stuff
+        #
+        
+        # Check if flag was reached
+        if (not self.win) and self.player.get_pos() // BLOCK_SIZE == self.level.get_flag_block():
+            self.win = True
+            self.timerOn = False
+
+            self.moveSpeed /= 2.0
+            self.turnSpeed //= 2
+
+            self.cataclysm.start()
+        
+        # Animate cataclysm as if it advanced once every frame of targetFps
+        # frames per second
+        self.cataclysm.update(timeStep * self.targetFps)
+
+    def _interpolate_camera(self, previousPose, alpha):
+        """
+        Returns the camera (position, left ray, right ray) a fraction alpha of the
+        way from the previous pose of the player to the current one.
+
+        Parameters
+        ----------
+        previousPose : tupple (see Player.get_pose())
+        alpha : float (0.0 is the previous pose, 1.0 the current one)
+        """
+        previousPos, previousRay = previousPose
+        pos = previousPos.lerp(self.player.get_pos(), alpha)
+
+        # Turn the shorter way around
+        totalRays = self.raycasting.get_total_rays()
+        turn = (self.player.get_middle_ray() - previousRay + totalRays // 2) % totalRays - \
+               totalRays // 2
+        middleRay = self.raycasting.offset_ray(previousRay, round(alpha * turn))
+
+        leftRay, rightRay = self.player.get_fov_edges(middleRay)
+        return pos, leftRay, rightRay
+
+    def _cast_fov(self, camera, step=1, axes=False):
+        """
+        Cast every step-th ray of the camera's fov. Rays are taken from the ray
+        cache if possible. If axes is True, vertical and horizontal results are
+        returned apart (see Raycasting.cast_fov_axes()) and the cache isn't used.
+        If the raycasting backend fails, switch to the reference backend and cast
+        them again, so that the game keeps running.
+
+        Parameters
+        ----------
+        camera : tupple (position, left ray, right ray)
+        step : int
+        axes : bool
+        """
+        pos, leftRay, rightRay = camera
+        try:
+            if axes:
+                return self.raycasting.cast_fov_axes(leftRay, rightRay, pos, step=step)
+            return self.rayCache.cast_fov(leftRay, rightRay, pos, step=step)
+        except Exception as e:
+            if type(self.raycasting) is Raycasting:
+                raise
+            print("Raycasting backend %s failed (%s), falling back to the reference one." %
+                  (type(self.raycasting).__name__, e))
+            self.raycasting.close()
+            self.raycasting = Raycasting(self.raycasting.get_total_rays(), BLOCK_SIZE,
+                                         self.level, RENDER_DISTANCE // BLOCK_SIZE)
+            self.raycasting.set_flag_detection(False)
+            self.player.set_raycasting(self.raycasting)
+            self.rayCache = RayCache(self.raycasting)
+            return self._cast_fov(camera, step, axes)
+
+    def _get_profiler_font(self):
+        """
+        Returns the font of the profiler overlay, loading it on first use.
+        """
+        if self.profilerFont is None:
+            if self.fastStart:
+                self.profilerFont = pygame.font.Font(None, PROFILER_FONT_SIZE)
+            else:
+                self.profilerFont = pygame.font.SysFont("monospace", PROFILER_FONT_SIZE)
+        return self.profilerFont
+
+    def _mark_startup(self, phase):
+        """
+        Mark a finished phase of the initialization if startup is being profiled.
+        """
+        if not self.startupProfiler is None:
+            self.startupProfiler.mark(phase)
@@ -0,0 +1,146 @@
+"""
+Contains the headless renderer, which renders frames into NumPy arrays without
+opening a window. Useful for rendering on servers and benchmarking on machines
+without a display.
+"""
+
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # Never open a window
+
+import numpy as np
+import pygame
+from pygame import Vector2
+
+from player import Player
+from backends import create_raycasting
+from sprites import Sprites
+from renderer import (Renderer, BLOCK_SIZE, FLAG_COLOR, FLAG_SPRITE_WIDTH, FLAG_SPRITE_HEIGHT,
+                      RENDER_DISTANCE)
+
+
+class HeadlessRenderer:
+    """
+    Renders the 3d view of a level from arbitrary camera poses into an off-screen
+    surface and returns the frames as NumPy arrays. Keep one object around to
+    render many frames of the same level. The flag is a sprite, like in the
+    game.
+    """
+
+    def __init__(self, level, windowSize=(800, 600), totalRays=600, fovDegrees=60,
+                 backend=None):
+        """
+        Parameters
+        ----------
+        level : Level
+        windowSize : tupple of two ints
+        totalRays : int
+        fovDegrees : int
+        backend : string (see backends.py)
+        """
+        self.level = level
+        self.windowSize = windowSize
+
+        self.raycasting = create_raycasting(backend, totalRays, BLOCK_SIZE, level,
+                                            RENDER_DISTANCE // BLOCK_SIZE)
+        self.raycasting.set_flag_detection(False)  # The flag is a sprite
+        self.renderer = Renderer(self.raycasting, windowSize, fovDegrees)
+        self.surface = pygame.Surface(windowSize)
+
+        # Place sprites
+        self.sprites = Sprites(BLOCK_SIZE)
+        flagPos = level.get_flag_block() * BLOCK_SIZE
+        self.sprites.add((flagPos.x + BLOCK_SIZE // 2, flagPos.y + BLOCK_SIZE // 2),
+                         FLAG_SPRITE_WIDTH, FLAG_SPRITE_HEIGHT, FLAG_COLOR)
+
+    def get_raycasting(self):
+        """
+        Returns the Raycasting object used for casting rays.
+        """
+        return self.raycasting
+
+    def get_renderer(self):
+        """
+        Returns the Renderer object used for drawing.
+        """
+        return self.renderer
+
+    def get_sprites(self):
+        """
+        Returns the Sprites object with the sprites drawn into frames.
+        """
+        return self.sprites
+
+    def get_surface(self):
+        """
+        Returns the off-screen surface the frames are drawn onto.
+        """
+        return self.surface
+
+    def render(self, pos, middleRay, step=1):
+        """
+        Render the view of a player standing at pos and looking in the direction
+        of middleRay. Returns a tupple of two NumPy arrays:
+
+        (
+            frame : array of uint8 of shape (height, width, 3) with RGB colors,
+            depth : array of floats of shape (width,) with distance to the wall
+                    seen in each column of pixels ('inf' if there is no wall)
+        )
+
+        Parameters
+        ----------
+        pos : pygame.Vector2 or tupple of two floats (in units, not blocks)
+        middleRay : int
+        step : int (cast only every step-th ray, see Raycasting.cast_fov())
+        """
+        player = Player(Vector2(pos), middleRay, self.raycasting,
+                        self.renderer.get_fov_rays())
+        distances, intersections, flagDistances = self.raycasting.cast_fov(
+            player.get_left_ray(),
+            player.get_right_ray(),
+            player.get_pos(),
+            step=step
+        )
+        columns = self.renderer.rasterize_walls(self.surface, distances, step)
+        self.renderer.rasterize_sprites(self.surface, columns, distances, self.sprites,
+                                        player.get_pos(), player.get_left_ray(), step)
+        self.renderer.blit_columns(self.surface, columns, step)
+
+        frame = pygame.surfarray.array3d(self.surface).transpose(1, 0, 2)
+
+        columnWidth = self.renderer.get_pixels_per_ray() * step
+        depth = np.full(self.windowSize[0], np.inf)
+        columns = np.repeat(np.nan_to_num(distances, nan=np.inf), columnWidth)
+        depth[:columns.size] = columns[:self.windowSize[0]]
+
+        return frame, depth
+
+    def close(self):
+        """
+        Release resources of the raycasting backend.
+        """
+        self.raycasting.close()
+
+
+def render_frame(level, pos, middleRay, windowSize=(800, 600), totalRays=600,
+                 fovDegrees=60, backend=None):
+    """
+    Render a single frame, see HeadlessRenderer.render(). Creating a
+    HeadlessRenderer is cheaper when rendering more than one frame.
+
+    Parameters
+    ----------
+    level : Level
+    pos : pygame.Vector2 or tupple of two floats
+    middleRay : int
+    windowSize : tupple of two ints
+    totalRays : int
+    fovDegrees : int
+    backend : string
+    """
+    renderer = HeadlessRenderer(level, windowSize, totalRays, fovDegrees, backend)
+    try:
+        return renderer.render(pos, middleRay)
+    finally:
+        renderer.close()
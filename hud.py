@@ -0,0 +1,124 @@
+"""
+Contains the HUD, which draws text from cached glyphs and reports which parts of
+the screen it changed, so that the display can be updated with dirty rectangles.
+"""
+
+import pygame
+
+
+#
+# Classes
+#
+
+class Hud:
+    """
+    Draws named text elements onto a surface. Every character is rendered by the
+    font only once per color, text is then composed by blitting the cached glyphs.
+    An element is redrawn only when its text or color changes or when the
+    background was redrawn (see draw()). What was under the text is saved, so that
+    the old text can be erased without redrawing the rest of the screen.
+    """
+
+    def __init__(self, font):
+        """
+        Parameters
+        ----------
+        font : pygame.font.Font
+        """
+        self.font = font
+        self.glyphs = {}    # (character, color) -> pygame.Surface
+        self.elements = {}  # Name -> dictionary (see add_text())
+
+    def add_text(self, name, pos, color):
+        """
+        Add a text element.
+
+        Parameters
+        ----------
+        name : string
+        pos : tupple of two ints (top left corner of the text)
+        color : tupple of three ints
+        """
+        self.elements[name] = {
+            "pos": pos,
+            "color": color,
+            "text": "",
+            "changed": True,
+            "rect": None,        # Where the text is drawn now
+            "savedUnder": None   # Copy of the surface under rect
+        }
+
+    def set_text(self, name, text, color=None):
+        """
+        Change text (and optionally color) of an element. Nothing is drawn until
+        draw() is called.
+
+        Parameters
+        ----------
+        name : string
+        text : string
+        color : tupple of three ints or None (keep the current color)
+        """
+        element = self.elements[name]
+        if color is None:
+            color = element["color"]
+        if text != element["text"] or color != element["color"]:
+            element["text"] = text
+            element["color"] = color
+            element["changed"] = True
+
+    def draw(self, surface, name, backgroundRedrawn):
+        """
+        Draw an element if needed. Returns a list of rectangles of the surface that
+        changed (empty if the element didn't have to be redrawn).
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+        name : string
+        backgroundRedrawn : bool (True if whatever was under the element was drawn
+                            again since the last call, e.g. a new frame of the 3d
+                            view, False if the surface still contains the element
+                            as it was drawn last time)
+        """
+        element = self.elements[name]
+        if not backgroundRedrawn and not element["changed"]:
+            return []
+
+        dirtyRects = []
+
+        # Erase the old text
+        if not backgroundRedrawn and not element["rect"] is None:
+            surface.blit(element["savedUnder"], element["rect"])
+            dirtyRects.append(element["rect"])
+
+        # Compose the new text from glyphs
+        x, y = element["pos"]
+        blitSequence = []
+        for character in element["text"]:
+            glyph = self._get_glyph(character, element["color"])
+            blitSequence.append((glyph, (x, y)))
+            x += glyph.get_width()
+        rect = pygame.Rect(element["pos"], (x - element["pos"][0], self.font.get_height()))
+        rect = rect.clip(surface.get_rect())
+
+        element["savedUnder"] = surface.subsurface(rect).copy()
+        element["rect"] = rect
+        element["changed"] = False
+        surface.blits(blitSequence, doreturn=False)
+        dirtyRects.append(rect)
+
+        return dirtyRects
+
+    #
+    # Internal methods of the class
+    #
+
+    def _get_glyph(self, character, color):
+        """
+        Returns the rendered character, rendering it if it isn't cached.
+        """
+        key = (character, color)
+        if not key in self.glyphs:
+            self.glyphs[key] = self.font.render(character, False, color)
+        return self.glyphs[key]
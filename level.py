@@ -1,10 +1,23 @@
+import numpy as np
 from pygame import Vector2
 
+# Values of blocks in the level grid (bit flags)
+EMPTY = 0
+WALL = 1
+FLAG = 2
+START = 4
+OUTSIDE = 8  # Border around the level
+
 class Level:
     """
     Represents a maze already loaded into program memory. Loading a maze from a file
     happens on object creation. Coordinates used inside of this object are in blocks,
     not in units.
+
+    The maze is stored as a uint8 NumPy grid (see the constants above) with a one
+    block wide border of OUTSIDE blocks, so block [x, y] is stored at grid[x + 1, y + 1].
+    Thanks to the border, lookups can be clamped to the grid instead of checking
+    bounds.
     """
 
     def __init__(self, levelFile):
@@ -13,50 +26,106 @@ class Level:
         ----------
         levelFile : string
         """
-        self.walls = []
+        self.grid = None
+        self.gridView = None
+        self.cells = None
+        self.width = None
+        self.height = None
+        self.stride = None
         self.size = None
         self.startBlock = None
         self.flagBlock = None
+        self.distanceField = None
 
         # Load walls and player positions from level file
         with open(levelFile, "r") as f:
             width, height = map(int, f.readline().split())
             self.size = Vector2(width, height)
 
-            self.walls = [[False] * height for i in range(width)]
+            self.grid = np.full((width + 2, height + 2), OUTSIDE, dtype=np.uint8)
+            self.grid[1:-1, 1:-1] = EMPTY
 
             for y, line in enumerate(f):
-                if y > self.size[1]:
-                    raise Exception("There are too many lines for the specified level height (%d specified)")
-
                 line = line.split()
 
+                if y >= self.size[1] and line:
+                    raise Exception("There are too many lines for the specified level height (%d specified)")
+
                 for x, char in enumerate(line):
-                    if x > self.size[0]:
+                    if x >= self.size[0]:
                         raise Exception("Line %d has too many blocks for the specified level width (%d specified):\n%s" %
                                         (y + 1, line, self.size[0]))
 
                     if char.lower() == "w":
-                        self.walls[x][y] = True
+                        self.grid[x + 1, y + 1] = WALL
                     elif char.lower() == "p":
                         if not self.startBlock is None:
                             raise Exception("Player starting position is present more than one time.")
                         self.startBlock = Vector2(x, y)
+                        self.grid[x + 1, y + 1] = START
                     elif char.lower() == "f":
                         if not self.flagBlock is None:
                             raise Exception("Flag position is present more than one time.")
                         self.flagBlock = Vector2(x, y)
+                        self.grid[x + 1, y + 1] = FLAG
             
             if self.startBlock is None:
                 raise Exception("There is no player position.")
             if self.flagBlock is None:
                 raise Exception("There is no flag position.")
+
+        self._prepare_grid()
+        self.distanceField = self._compute_distance_field()
+
+    @classmethod
+    def from_grid(cls, grid, startBlock, flagBlock, distanceField=None):
+        """
+        Creates a level from an already loaded padded grid (see the class
+        docstring) instead of a level file. The grid isn't copied.
+
+        Parameters
+        ----------
+        grid : NumPy array of uint8
+        startBlock : pygame.Vector2
+        flagBlock : pygame.Vector2
+        distanceField : NumPy array (computed if not given)
+        """
+        level = cls.__new__(cls)
+        level.grid = grid
+        level.size = Vector2(grid.shape[0] - 2, grid.shape[1] - 2)
+        level.startBlock = Vector2(startBlock)
+        level.flagBlock = Vector2(flagBlock)
+        level._prepare_grid()
+        if distanceField is None:
+            distanceField = level._compute_distance_field()
+        level.distanceField = distanceField
+        return level
+
+    def _prepare_grid(self):
+        """
+        Prepares the read-only view of the grid and a flat memoryview of it for
+        fast lookups of single blocks (indexing NumPy arrays with single ints is
+        slow).
+        """
+        self.gridView = self.grid.view()
+        self.gridView.flags.writeable = False
+        self.cells = memoryview(self.grid).cast("B")
+        self.width = self.grid.shape[0] - 2
+        self.height = self.grid.shape[1] - 2
+        self.stride = self.grid.shape[1]
     
     def get_walls(self):
         """
-        Returns a 2d array.
+        Returns a 2d boolean array indexed [x][y].
+        """
+        return (self.gridView[1:-1, 1:-1] & WALL) != 0
+
+    def get_grid(self):
         """
-        return self.walls
+        Returns a read-only view of the padded level grid (see the class
+        docstring). Block [x, y] is at [x + 1, y + 1].
+        """
+        return self.gridView
     
     def get_size(self):
         """
@@ -75,6 +144,21 @@ class Level:
         Returns the block coordinates of flag as a pygame vector.
         """
         return self.flagBlock
+
+    def get_blocks(self, x, y):
+        """
+        Returns values of blocks (see the constants above) at given block
+        coordinates. Vectorized, takes arrays (of floats or ints) of any shape.
+        Coordinates outside of the level give OUTSIDE.
+
+        Parameters
+        ----------
+        x : NumPy array
+        y : NumPy array
+        """
+        x = np.clip(x, -1, self.width).astype(np.intp)
+        y = np.clip(y, -1, self.height).astype(np.intp)
+        return self.gridView[x + 1, y + 1]
     
     def is_wall_at(self, x, y):
         """
@@ -86,11 +170,9 @@ class Level:
         x : int
         y : int
         """
-        if x < 0 or x >= self.size.x:
-            return False
-        if y < 0 or y >= self.size.y:
-            return False
-        return self.walls[x][y]
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.cells[(x + 1) * self.stride + y + 1] == WALL
+        return False
     
     def is_wall_at_vector(self, v):
         """
@@ -102,7 +184,7 @@ class Level:
     
     def is_flag_at(self, x, y):
         """
-        Returns if wall is present at given block coordinates. Returns False if
+        Returns if flag is present at given block coordinates. Returns False if
         coordinates outside of the level.
 
         Parameters
@@ -110,11 +192,9 @@ class Level:
         x : int
         y : int
         """
-        if x < 0 or x >= self.size.x:
-            return False
-        if y < 0 or y >= self.size.y:
-            return False
-        return x == int(self.flagBlock.x) and y == int(self.flagBlock.y)
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.cells[(x + 1) * self.stride + y + 1] == FLAG
+        return False
     
     def is_flag_at_vector(self, v):
         """
@@ -123,3 +203,85 @@ class Level:
         x = int(v.x)
         y = int(v.y)
         return self.is_flag_at(x, y)
+
+    def get_distance_field(self):
+        """
+        Returns a 2d NumPy array with the Chebyshev distance (in blocks) from every
+        block to the nearest wall or flag block. Walls and flag have distance 0.
+        """
+        return self.distanceField
+
+    def get_empty_radius(self, x, y):
+        """
+        Returns distance from given block coordinates to the nearest wall or flag
+        block, so that all blocks less than this distance away (in Chebyshev
+        metric) are empty. Works for coordinates outside of the level as well.
+
+        Parameters
+        ----------
+        x : int
+        y : int
+        """
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return int(self.distanceField[x, y])
+
+        # There is nothing outside of the level, so it's enough to know how far
+        # the level is
+        outsideX = -x if x < 0 else max(0, x - self.width + 1)
+        outsideY = -y if y < 0 else max(0, y - self.height + 1)
+        return max(outsideX, outsideY)
+
+    def get_empty_radii(self, x, y):
+        """
+        Vectorized version of get_empty_radius(), takes arrays of ints of any
+        shape.
+
+        Parameters
+        ----------
+        x : NumPy array
+        y : NumPy array
+        """
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=np.intp), np.asarray(y, dtype=np.intp))
+        outsideX = np.maximum(np.maximum(-x, x - self.width + 1), 0)
+        outsideY = np.maximum(np.maximum(-y, y - self.height + 1), 0)
+        inside = (outsideX == 0) & (outsideY == 0)
+        radii = np.maximum(outsideX, outsideY)
+        radii[inside] = self.distanceField[x[inside], y[inside]]
+        return radii
+
+    def _compute_distance_field(self):
+        """
+        Computes the array returned by get_distance_field().
+        """
+        return compute_distance_field(self.grid[1:-1, 1:-1])
+
+
+def compute_distance_field(blocks):
+    """
+    Returns an int32 array of the same shape as blocks with the Chebyshev distance
+    from every block to the nearest wall or flag block (0 for those blocks). It is
+    computed by growing the area around walls and flag by one block in every
+    direction at a time. There has to be at least one wall or flag block.
+
+    Parameters
+    ----------
+    blocks : NumPy array of uint8 (values of blocks indexed [x, y])
+    """
+    reached = (blocks & (WALL | FLAG)) != 0
+
+    field = np.zeros(reached.shape, dtype=np.int32)
+    distance = 0
+    while not reached.all():
+        distance += 1
+        previous = reached
+
+        grown = previous.copy()
+        grown[1:, :] |= previous[:-1, :]
+        grown[:-1, :] |= previous[1:, :]
+        reached = grown.copy()
+        reached[:, 1:] |= grown[:, :-1]
+        reached[:, :-1] |= grown[:, 1:]
+
+        field[reached & ~previous] = distance
+
+    return field
@@ -0,0 +1,182 @@
+"""
+Contains the minimap. Walls and flag never change, so they are pre-rendered into
+tiles once and only the player and the ray intersections are drawn every frame.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+
+from level import WALL, FLAG
+from renderer import BLOCK_SIZE, WALL_COLOR, FLOOR_COLOR, FLAG_COLOR
+
+
+#
+# Constants
+#
+
+MINIMAP_COLOR = (255, 0, 0)
+MINIMAP_SIZE_DIV = 4     # Draw minimap this number times smaller than real units
+MINIMAP_PLAYER_SIZE = 4  # How many pixels wide should the player dot be
+
+TILE_BLOCKS = 16  # Tiles of the static layer are this number of blocks wide and high
+
+
+#
+# Classes
+#
+
+class Minimap:
+    """
+    Draws the level as seen from above. Levels whose minimap doesn't fit into the
+    viewport are shown scrolled so that the player is in the middle. The static
+    layer (walls and flag) is split into tiles, which are rendered when they first
+    become visible and kept in a cache of bounded size, so the cost of a frame
+    doesn't depend on the size of the level.
+    """
+
+    def __init__(self, level, viewportSize):
+        """
+        Parameters
+        ----------
+        level : Level
+        viewportSize : tupple of two ints (maximal size of the minimap in pixels)
+        """
+        self.level = level
+        self.blockPixels = BLOCK_SIZE // MINIMAP_SIZE_DIV
+        self.tilePixels = TILE_BLOCKS * self.blockPixels
+
+        levelSize = level.get_size()
+        self.mapSize = (int(levelSize.x) * self.blockPixels,
+                        int(levelSize.y) * self.blockPixels)
+        self.viewportSize = (min(viewportSize[0], self.mapSize[0]),
+                             min(viewportSize[1], self.mapSize[1]))
+
+        # Enough tiles for the viewport to move by one tile in any direction
+        tilesX = -(-self.viewportSize[0] // self.tilePixels) + 2
+        tilesY = -(-self.viewportSize[1] // self.tilePixels) + 2
+        self.maxTiles = tilesX * tilesY
+        self.tiles = OrderedDict()  # (tileX, tileY) -> pygame.Surface, oldest first
+
+    def get_viewport_size(self):
+        """
+        Returns size of the minimap on the screen in pixels.
+        """
+        return self.viewportSize
+
+    def draw(self, surface, playerPos, intersections, dest=(0, 0)):
+        """
+        Draw the minimap onto a surface.
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+        playerPos : pygame vector
+        intersections : numpy array of shape (n, 2) (NaN for rays that didn't hit)
+        dest : tupple of two ints (top left corner of the minimap on the surface)
+        """
+        playerX = int(playerPos.x // MINIMAP_SIZE_DIV)
+        playerY = int(playerPos.y // MINIMAP_SIZE_DIV)
+        originX = self._clamp_origin(playerX, 0)
+        originY = self._clamp_origin(playerY, 1)
+        viewport = pygame.Rect(dest, self.viewportSize)
+        offsetX = dest[0] - originX
+        offsetY = dest[1] - originY
+
+        oldClip = surface.get_clip()
+        surface.set_clip(viewport.clip(oldClip))
+
+        # Static layer
+        firstTileX = originX // self.tilePixels
+        firstTileY = originY // self.tilePixels
+        lastTileX = (originX + self.viewportSize[0] - 1) // self.tilePixels
+        lastTileY = (originY + self.viewportSize[1] - 1) // self.tilePixels
+        for tileX in range(firstTileX, lastTileX + 1):
+            for tileY in range(firstTileY, lastTileY + 1):
+                surface.blit(self._get_tile(tileX, tileY),
+                             (tileX * self.tilePixels + offsetX,
+                              tileY * self.tilePixels + offsetY))
+
+        # Player
+        rect = pygame.Rect(playerX - MINIMAP_PLAYER_SIZE // 2 + offsetX,
+                           playerY - MINIMAP_PLAYER_SIZE // 2 + offsetY,
+                           MINIMAP_PLAYER_SIZE, MINIMAP_PLAYER_SIZE)
+        pygame.draw.rect(surface, MINIMAP_COLOR, rect)
+
+        surface.set_clip(oldClip)
+
+        # Intersections (of rays that have been cast)
+        self._draw_points(surface, intersections, offsetX, offsetY, viewport.clip(oldClip))
+
+    #
+    # Internal methods of the class
+    #
+
+    def _clamp_origin(self, playerCoord, axis):
+        """
+        Returns the minimap pixel coordinate of the top left corner of the
+        viewport along an axis, so that the player is in the middle unless the
+        viewport would leave the map.
+        """
+        origin = playerCoord - self.viewportSize[axis] // 2
+        return max(0, min(origin, self.mapSize[axis] - self.viewportSize[axis]))
+
+    def _get_tile(self, tileX, tileY):
+        """
+        Returns the pre-rendered tile, rendering it if it isn't cached.
+        """
+        key = (tileX, tileY)
+        if key in self.tiles:
+            self.tiles.move_to_end(key)
+            return self.tiles[key]
+
+        tile = self._render_tile(tileX, tileY)
+        self.tiles[key] = tile
+        if len(self.tiles) > self.maxTiles:
+            self.tiles.popitem(last=False)
+        return tile
+
+    def _render_tile(self, tileX, tileY):
+        """
+        Render walls and flag of a tile into a new surface.
+        """
+        firstX = tileX * TILE_BLOCKS
+        firstY = tileY * TILE_BLOCKS
+        lastX = min(firstX + TILE_BLOCKS, int(self.level.get_size().x))
+        lastY = min(firstY + TILE_BLOCKS, int(self.level.get_size().y))
+        blocks = self.level.get_blocks(np.arange(firstX, lastX)[:, None],
+                                       np.arange(firstY, lastY)[None, :])
+
+        colors = np.empty(blocks.shape + (3,), dtype=np.uint8)
+        colors[:] = FLOOR_COLOR
+        colors[(blocks & WALL) != 0] = WALL_COLOR
+        colors[(blocks & FLAG) != 0] = FLAG_COLOR
+        pixels = colors.repeat(self.blockPixels, axis=0).repeat(self.blockPixels, axis=1)
+
+        tile = pygame.surfarray.make_surface(pixels)
+        if not pygame.display.get_surface() is None:
+            tile = tile.convert()  # Same pixel format as the window blits faster
+        return tile
+
+    @staticmethod
+    def _draw_points(surface, points, offsetX, offsetY, clip):
+        """
+        Set pixels of the surface at minimap coordinates of the points (skipping
+        NaN points and points outside the clip rect) to MINIMAP_COLOR.
+        """
+        points = np.asarray(points, dtype=float)
+        points = points[~np.isnan(points[:, 0])]
+        x = (points[:, 0] // MINIMAP_SIZE_DIV).astype(np.intp) + offsetX
+        y = (points[:, 1] // MINIMAP_SIZE_DIV).astype(np.intp) + offsetY
+        inside = (x >= clip.left) & (x < clip.right) & (y >= clip.top) & (y < clip.bottom)
+        if not inside.any():
+            return
+
+        if surface.get_bytesize() in (2, 4):
+            pixels = pygame.surfarray.pixels2d(surface)
+            pixels[x[inside], y[inside]] = surface.map_rgb(MINIMAP_COLOR)
+        else:
+            pixels = pygame.surfarray.pixels3d(surface)
+            pixels[x[inside], y[inside]] = MINIMAP_COLOR
+        del pixels  # Unlock the surface
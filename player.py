@@ -3,7 +3,7 @@ class Player:
     Represents the state of the player: his position and camera orientation.
     """
 
-    def __init__(self, startPos, startRay, raycasting, fovRays):
+    def __init__(self, startPos, startRay, raycasting, fovRays, collision=None):
         """
         Parameters
         ----------
@@ -11,10 +11,13 @@ class Player:
         startRay : int
         raycasting : Raycasting object from raycasting.py
         fovRays : int
+        collision : Collision object from collision.py (if None, collisions are
+                    checked by casting rays and move() can't be used)
         """
         self.pos = startPos
         self.middleRay = startRay  # Which ray should be in the middle of the screen
         self.raycasting = raycasting
+        self.collision = collision
 
         self.leftRay = None
         self.rightRay = None
@@ -44,6 +47,32 @@ class Player:
         Get the ray in the far right of FOV.
         """
         return self.rightRay
+
+    def get_pose(self):
+        """
+        Returns a copy of the position and the middle ray in a tupple.
+        """
+        return self.pos.copy(), self.middleRay
+
+    def get_fov_edges(self, middleRay):
+        """
+        Returns rays on the far left and right of FOV in a tupple if the given ray
+        was in the middle.
+
+        Parameters
+        ----------
+        middleRay : int
+        """
+        turn = middleRay - self.middleRay
+        return (self.raycasting.offset_ray(self.leftRay, turn),
+                self.raycasting.offset_ray(self.rightRay, turn))
+
+    def set_raycasting(self, raycasting):
+        """
+        Replace the Raycasting object used for collision checks, e.g. when switching
+        raycasting backends.
+        """
+        self.raycasting = raycasting
     
     #
     # Movement
@@ -67,9 +96,12 @@ class Player:
         magnitude : float
         ray : int
         """
+        if not self.collision is None:
+            self.move(self.raycasting.get_ray_vector(ray) * magnitude)
+            return
+
         # Check for collision with a wall first
-        foo, bar, foobar = self.raycasting.cast_rays(ray, ray, self.pos)
-        distanceToWall = foo[0]
+        distanceToWall = self.raycasting.distance_to_wall(ray, self.pos)
         collision = (not distanceToWall is None) and distanceToWall <= magnitude
 
         if not collision:
@@ -77,6 +109,34 @@ class Player:
             vector = self.raycasting.get_ray_vector(ray)
             self._move_absolute(vector * magnitude)
 
+    def move(self, vector):
+        """
+        Move by a vector, sliding along walls that are in the way. Needs the
+        Collision object.
+
+        Parameters
+        ----------
+        vector : pygame.Vector2
+        """
+        self.pos.update(self.collision.move(self.pos, vector))
+
+    def move_relative(self, forward, right):
+        """
+        Move a specified number of units forward (backward if negative) and to the
+        right (left if negative) at once. Needs the Collision object.
+
+        Parameters
+        ----------
+        forward : float
+        right : float
+        """
+        ray = self.middleRay
+        vector = self.raycasting.get_ray_vector(ray) * forward
+        ray = self.raycasting.perpendicular_right_ray(ray)
+        vector += self.raycasting.get_ray_vector(ray) * right
+        if vector.x != 0 or vector.y != 0:
+            self.move(vector)
+
     def move_forward(self, magnitude):
         """
         Move a specified number of units forward.
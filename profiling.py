@@ -0,0 +1,206 @@
+"""
+Contains instrumentation for measuring how long individual stages of a frame take.
+"""
+
+import csv
+import json
+from collections import deque
+from time import perf_counter
+
+import numpy as np
+
+
+class FrameProfiler:
+    """
+    Measures how long each stage of every frame takes. Call start_frame() at the
+    beginning of a frame, mark() after each stage and end_frame() at the end.
+    Only one perf_counter() call per stage is made, so the overhead is tiny.
+
+    Recent frames are kept for the on-screen overlay (rolling percentiles), all
+    frames (up to maxTraceFrames) are kept for exporting a trace at exit.
+    """
+
+    def __init__(self, window=120, maxTraceFrames=100000):
+        """
+        Parameters
+        ----------
+        window : int (how many recent frames percentiles are computed from)
+        maxTraceFrames : int (how many frames can be exported at most)
+        """
+        self.window = window
+        self.maxTraceFrames = maxTraceFrames
+
+        self.stages = []    # Names of stages in order of first appearance
+        self.recent = {}    # Stage -> deque of recent times in milliseconds
+        self.trace = []     # One dictionary of stage -> milliseconds per frame
+        self.frame = None   # Times of stages of the current frame
+        self.frameStart = None
+        self.lastMark = None
+
+    def start_frame(self):
+        """
+        Start measuring a new frame.
+        """
+        self.frame = {}
+        self.frameStart = self.lastMark = perf_counter()
+
+    def mark(self, stage):
+        """
+        Record that a stage has just finished. Its time is the time since the
+        previous mark (or the start of the frame). Marking the same stage more
+        than once in a frame adds the times up.
+
+        Parameters
+        ----------
+        stage : string
+        """
+        now = perf_counter()
+        self.frame[stage] = self.frame.get(stage, 0.0) + (now - self.lastMark) * 1000
+        self.lastMark = now
+
+    def count(self, name, value):
+        """
+        Record a value other than time for the current frame (e.g. how many grid
+        blocks rays traversed).
+
+        Parameters
+        ----------
+        name : string
+        value : float
+        """
+        self.frame[name] = value
+
+    def end_frame(self):
+        """
+        Finish the current frame and store its times.
+        """
+        self.frame["total"] = (perf_counter() - self.frameStart) * 1000
+
+        for stage, value in self.frame.items():
+            if not stage in self.recent:
+                self.stages.append(stage)
+                self.recent[stage] = deque(maxlen=self.window)
+            self.recent[stage].append(value)
+
+        if len(self.trace) < self.maxTraceFrames:
+            self.trace.append(self.frame)
+        self.frame = None
+
+    def get_percentiles(self, stage, percentiles=(50, 95, 99)):
+        """
+        Returns the given percentiles of the stage over the recent frames as a list
+        (or None if the stage wasn't measured yet).
+
+        Parameters
+        ----------
+        stage : string
+        percentiles : tupple of numbers
+        """
+        if not stage in self.recent or not self.recent[stage]:
+            return None
+        return list(np.percentile(self.recent[stage], percentiles))
+
+    def get_summary_lines(self):
+        """
+        Returns lines of text with rolling percentiles of every stage.
+        """
+        lines = ["%-10s %7s %7s %7s" % ("stage", "p50", "p95", "p99")]
+        for stage in self.stages:
+            p50, p95, p99 = self.get_percentiles(stage)
+            lines.append("%-10s %7.2f %7.2f %7.2f" % (stage, p50, p95, p99))
+        return lines
+
+    def draw_overlay(self, surface, font, color, pos=(8, 8)):
+        """
+        Draw the rolling percentiles of all stages onto a surface.
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+        font : pygame.font.Font (preferably monospace)
+        color : tupple of three ints
+        pos : tupple of two ints
+        """
+        x, y = pos
+        for line in self.get_summary_lines():
+            textSurface = font.render(line, False, color)
+            surface.blit(textSurface, (x, y))
+            y += font.get_linesize()
+
+    def export(self, path):
+        """
+        Save the trace of all frames. Format is chosen by extension of the path:
+        '.csv' (one row per frame, one column per stage) or JSON otherwise.
+
+        Parameters
+        ----------
+        path : string
+        """
+        if path.lower().endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=self.stages)
+                writer.writeheader()
+                writer.writerows(self.trace)
+        else:
+            # Stages that first appeared after the trace got full have no frames
+            # in it, their summary is null
+            summary = {}
+            for stage in self.stages:
+                values = [frame[stage] for frame in self.trace if stage in frame]
+                if not values:
+                    summary[stage] = {"p50": None, "p95": None, "p99": None, "mean": None}
+                    continue
+                p50, p95, p99 = np.percentile(values, (50, 95, 99))
+                summary[stage] = {"p50": p50, "p95": p95, "p99": p99,
+                                  "mean": float(np.mean(values))}
+            with open(path, "w") as f:
+                json.dump({"stages": self.stages, "summary": summary, "frames": self.trace},
+                          f, indent=1)
+
+
+class StartupProfiler:
+    """
+    Measures how long each phase of starting the game takes. Create it as early as
+    possible (or pass it the time the process started doing work) and call mark()
+    after each phase.
+    """
+
+    def __init__(self, start=None):
+        """
+        Parameters
+        ----------
+        start : float or None (perf_counter() time the first phase started at,
+                now by default)
+        """
+        self.start = perf_counter() if start is None else start
+        self.lastMark = self.start
+        self.phases = []  # Tupples (phase, milliseconds) in order
+
+    def mark(self, phase):
+        """
+        Record that a phase has just finished. Its time is the time since the
+        previous mark (or the start).
+
+        Parameters
+        ----------
+        phase : string
+        """
+        now = perf_counter()
+        self.phases.append((phase, (now - self.lastMark) * 1000))
+        self.lastMark = now
+
+    def get_total(self):
+        """
+        Returns milliseconds from the start to the last mark.
+        """
+        return (self.lastMark - self.start) * 1000
+
+    def get_summary_lines(self):
+        """
+        Returns lines of text with the time of every phase and the total.
+        """
+        lines = ["%-12s %9s" % ("phase", "ms")]
+        for phase, time in self.phases:
+            lines.append("%-12s %9.2f" % (phase, time))
+        lines.append("%-12s %9.2f" % ("total", self.get_total()))
+        return lines
@@ -0,0 +1,460 @@
+#! /usr/bin/env python3
+
+"""
+Contains the potentially visible set (PVS) of a level: for every block, which
+blocks around it can be seen from anywhere inside of it. Things in blocks that
+can't be seen from the block of the camera (sprites behind walls) are skipped
+without projecting them and rays stop one line behind the farthest block that
+can be seen (see Raycasting.set_pvs()).
+
+Only blocks closer than the render distance can be seen, so every block keeps
+a window of (2 * radius + 1) x (2 * radius + 1) blocks centered at it, packed
+into bits (see np.packbits()). The PVS is built on a pool of worker processes
+and cached next to the level file like compiled levels (see compiled.py). The
+game loads it in the background (see PvsLoader), so building it doesn't delay
+the start.
+
+A PVS file consists of a header and the packed windows of all blocks indexed
+[x, y].
+
+Usage: python3 pvs.py level.lvl
+"""
+
+import mmap
+import multiprocessing
+import os
+import struct
+import threading
+from math import pi
+from sys import argv, exit
+from time import perf_counter
+
+import numpy as np
+
+from level import Level, WALL, OUTSIDE
+from compiled import CACHE_DIR, hash_file
+from renderer import BLOCK_SIZE, RENDER_DISTANCE
+
+
+#
+# Constants
+#
+
+PVS_RADIUS = RENDER_DISTANCE // BLOCK_SIZE + 1  # Blocks this far away (in Chebyshev
+                                                # metric) can be seen at most
+PVS_RAYS = 720            # Rays cast from every sample point of a block
+SAMPLE_GRID = 3           # Rays start from SAMPLE_GRID x SAMPLE_GRID points of every block
+STEPS_PER_BLOCK = 4       # Rays are sampled this number of times per block of length
+CELLS_PER_TASK = 64       # Blocks are sent to worker processes in tasks of this size
+
+MAGIC = b"LPVS"
+VERSION = 2
+HEADER = struct.Struct("<4sHHIII")  # Magic, version, reserved, width, height, radius
+
+
+#
+# Classes
+#
+
+class PotentiallyVisibleSet:
+    """
+    Answers which blocks can be seen from which. Blocks outside of the window of
+    the block of the camera can't be seen. When the camera is outside of the
+    level (or inside of a wall), everything is considered visible.
+    """
+
+    def __init__(self, bits, radius):
+        """
+        Parameters
+        ----------
+        bits : NumPy array of uint8 of shape (width, height, bytes) (the packed
+               windows, see build_pvs())
+        radius : int
+        """
+        self.bits = bits
+        self.radius = radius
+        self.side = 2 * radius + 1
+        self.width = bits.shape[0]
+        self.height = bits.shape[1]
+        self.reaches = None  # Computed on demand, see get_reaches()
+
+    def get_radius(self):
+        """
+        Returns how far away (in Chebyshev metric) blocks can be seen at most.
+        """
+        return self.radius
+
+    def get_visible_blocks(self, x, y):
+        """
+        Returns a boolean array of shape (2 * radius + 1, 2 * radius + 1) with
+        the blocks visible from the block at given coordinates. Index [radius,
+        radius] is the block itself.
+
+        Parameters
+        ----------
+        x : int
+        y : int
+        """
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return np.ones((self.side, self.side), dtype=bool)
+        window = np.unpackbits(self.bits[x, y], count=self.side * self.side)
+        return window.reshape(self.side, self.side).astype(bool)
+
+    def get_reaches(self, x, y):
+        """
+        Returns an array of ints of shape x.shape + (4,) with how far (in blocks)
+        the visible blocks reach from the blocks at coordinates x and y in
+        directions +x, -x, +y and -y. Where that isn't known (blocks outside of
+        the level or inside of walls, or blocks seeing the border of their window
+        in any direction), all reaches are the radius. Vectorized, x and y are arrays of ints.
+
+        Parameters
+        ----------
+        x : NumPy array
+        y : NumPy array
+        """
+        if self.reaches is None:
+            self.reaches = self._compute_reaches()
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=np.intp), np.asarray(y, dtype=np.intp))
+        inside = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+        reaches = self.reaches[np.where(inside, x, 0), np.where(inside, y, 0)]
+        return np.where(inside[..., None], reaches, self.radius)
+
+    def are_visible(self, fromX, fromY, toX, toY):
+        """
+        Returns a boolean array telling if the blocks at coordinates toX and toY
+        can be seen from the block at coordinates fromX and fromY. Vectorized,
+        toX and toY are arrays of ints of any shape.
+
+        Parameters
+        ----------
+        fromX : int
+        fromY : int
+        toX : NumPy array
+        toY : NumPy array
+        """
+        toX, toY = np.broadcast_arrays(np.asarray(toX, dtype=np.intp),
+                                       np.asarray(toY, dtype=np.intp))
+        if not (0 <= fromX < self.width and 0 <= fromY < self.height):
+            return np.ones(toX.shape, dtype=bool)
+
+        localX = toX - fromX + self.radius
+        localY = toY - fromY + self.radius
+        inside = (localX >= 0) & (localX < self.side) & (localY >= 0) & (localY < self.side)
+        bit = np.where(inside, localX * self.side + localY, 0)
+
+        # np.packbits() puts the first bit into the highest bit of a byte
+        window = self.bits[fromX, fromY]
+        return inside & ((window[bit >> 3] >> (7 - (bit & 7))) & 1).astype(bool)
+
+    #
+    # Internal methods of the class
+    #
+
+    def _compute_reaches(self):
+        """
+        Computes the array returned by get_reaches() for all blocks of the level.
+        """
+        offsets = np.arange(self.side) - self.radius
+        reaches = np.empty((self.width, self.height, 4), dtype=np.intp)
+        for x in range(self.width):
+            windows = np.unpackbits(self.bits[x], axis=1, count=self.side * self.side)
+            windows = windows.reshape(self.height, self.side, self.side).astype(bool)
+            columns = windows.any(axis=2)  # Some block visible at every offset in x
+            rows = windows.any(axis=1)     # and in y
+            for i, (seen, sign) in enumerate(((columns, 1), (columns, -1),
+                                              (rows, 1), (rows, -1))):
+                reaches[x, :, i] = np.where(seen & (offsets * sign > 0),
+                                            offsets * sign, 0).max(axis=1)
+
+            # Nothing is visible from walls (rays never start there) and blocks
+            # that see the border of their window may see farther in any direction
+            unknown = ~columns.any(axis=1) | (reaches[x].max(axis=1) >= self.radius)
+            reaches[x, unknown] = self.radius
+        return reaches
+
+
+class PvsLoader:
+    """
+    Loads the PotentiallyVisibleSet of a level (see load_pvs()) in a background
+    thread. Until it is ready, get_pvs() returns None and nothing is culled.
+    """
+
+    def __init__(self, levelFile, level, radius=PVS_RADIUS, cacheDir=None):
+        """
+        Parameters
+        ----------
+        levelFile : string
+        level : Level
+        radius : int
+        cacheDir : string or None (see load_pvs())
+        """
+        self.pvs = None
+        self.thread = threading.Thread(target=self._load,
+                                       args=(levelFile, level, radius, cacheDir),
+                                       daemon=True)
+        self.thread.start()
+
+    def get_pvs(self):
+        """
+        Returns the PotentiallyVisibleSet or None if it isn't ready yet.
+        """
+        return self.pvs
+
+    def wait(self):
+        """
+        Block until loading has finished and return the PotentiallyVisibleSet
+        (None if it couldn't be loaded).
+        """
+        self.thread.join()
+        return self.pvs
+
+    #
+    # Internal methods of the class
+    #
+
+    def _load(self, levelFile, level, radius, cacheDir):
+        """
+        Body of the background thread.
+        """
+        building = not os.path.exists(get_pvs_file(levelFile, radius, cacheDir))
+        if building:
+            print("Building the potentially visible set in the background, "
+                  "sprites aren't culled until it is ready")
+        start = perf_counter()
+        try:
+            self.pvs = load_pvs(levelFile, level, radius, cacheDir)
+        except Exception as e:
+            print("Error while loading the potentially visible set: %s" % (e))
+            return
+        if building:
+            print("Potentially visible set ready in %.2f s" % (perf_counter() - start))
+
+
+#
+# Building
+#
+
+def build_pvs(level, radius=PVS_RADIUS, workers=None):
+    """
+    Returns the PotentiallyVisibleSet of a level. Rays are cast in all
+    directions from a grid of points in every block up to radius blocks far and
+    every block a ray passes through (up to the first wall) is visible. Blocks
+    are split among a pool of worker processes.
+
+    Parameters
+    ----------
+    level : Level
+    radius : int
+    workers : int (number of worker processes, all cpu cores by default)
+    """
+    grid = np.ascontiguousarray(level.get_grid())
+    width = grid.shape[0] - 2
+    height = grid.shape[1] - 2
+    cellCount = width * height
+
+    tasks = [(first, min(first + CELLS_PER_TASK, cellCount))
+             for first in range(0, cellCount, CELLS_PER_TASK)]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers > 1:
+        # Workers are spawned, not forked: the game builds the PVS in a thread
+        # while other threads (SDL) may hold locks a forked process would copy
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(workers, initializer=_init_worker,
+                          initargs=(grid, radius)) as pool:
+            parts = pool.starmap(_build_cells, tasks)
+    else:
+        _init_worker(grid, radius)
+        parts = [_build_cells(first, last) for first, last in tasks]
+
+    bits = np.concatenate(parts).reshape(width, height, -1)
+    return PotentiallyVisibleSet(bits, radius)
+
+
+def save_pvs(pvs, pvsFile):
+    """
+    Save a PotentiallyVisibleSet into a file. The file is written under a
+    temporary name and renamed (see compiled.compile_level()).
+
+    Parameters
+    ----------
+    pvs : PotentiallyVisibleSet
+    pvsFile : string
+    """
+    bits = pvs.bits
+    temporaryFile = "%s.%d.tmp" % (pvsFile, os.getpid())
+    with open(temporaryFile, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, bits.shape[0], bits.shape[1],
+                            pvs.get_radius()))
+        f.write(np.ascontiguousarray(bits).tobytes())
+    os.replace(temporaryFile, pvsFile)
+
+
+def load_pvs_file(pvsFile):
+    """
+    Returns a PotentiallyVisibleSet backed by a memory-mapped PVS file.
+
+    Parameters
+    ----------
+    pvsFile : string
+    """
+    with open(pvsFile, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, _, width, height, radius = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise Exception("%s is not a PVS file of version %d" % (pvsFile, VERSION))
+
+    windowBytes = -(-(2 * radius + 1) ** 2 // 8)
+    if len(data) != HEADER.size + width * height * windowBytes:
+        raise Exception("%s is truncated" % (pvsFile))
+
+    bits = np.frombuffer(data, dtype=np.uint8, offset=HEADER.size)
+    return PotentiallyVisibleSet(bits.reshape(width, height, windowBytes), radius)
+
+
+def load_pvs(levelFile, level, radius=PVS_RADIUS, cacheDir=None):
+    """
+    Returns the PotentiallyVisibleSet of a level loaded from levelFile. The PVS
+    is built on the first load and cached under the hash of the level file
+    (see compiled.load_level()).
+
+    Parameters
+    ----------
+    levelFile : string
+    level : Level
+    radius : int
+    cacheDir : string or None (CACHE_DIR next to the level file by default)
+    """
+    pvsFile = get_pvs_file(levelFile, radius, cacheDir)
+    if os.path.exists(pvsFile):
+        return load_pvs_file(pvsFile)
+
+    pvs = build_pvs(level, radius)
+    try:
+        os.makedirs(os.path.dirname(pvsFile), exist_ok=True)
+        save_pvs(pvs, pvsFile)
+    except OSError:
+        pass  # Read-only location, just don't cache
+    return pvs
+
+
+def get_pvs_file(levelFile, radius=PVS_RADIUS, cacheDir=None):
+    """
+    Returns the path the PVS of a level file is cached at (see load_pvs()).
+
+    Parameters
+    ----------
+    levelFile : string
+    radius : int
+    cacheDir : string or None (CACHE_DIR next to the level file by default)
+    """
+    if cacheDir is None:
+        cacheDir = os.path.join(os.path.dirname(os.path.abspath(levelFile)), CACHE_DIR)
+    return os.path.join(cacheDir, "%s-%d-v%d.pvs" % (hash_file(levelFile), radius, VERSION))
+
+
+_worker = None  # State of the current worker process, see _init_worker()
+
+
+def _init_worker(grid, radius):
+    """
+    Prepare the level grid and the rays shared by all blocks in a worker process
+    of build_pvs().
+    """
+    global _worker
+
+    # Rays never leave the grid padded with radius + 1 more OUTSIDE blocks
+    border = radius + 1
+    padded = np.pad(grid, border, constant_values=OUTSIDE)
+    stride = padded.shape[1]
+    side = 2 * radius + 1
+
+    # Sample points spread over the block from edge to edge
+    coords = np.linspace(0.01, 0.99, SAMPLE_GRID)
+    pointsX, pointsY = np.meshgrid(coords, coords, indexing="ij")
+
+    # Blocks (relative to the block of the points) of samples along every ray
+    # from every point, one row per ray. Blocks are integers, so this is the
+    # same for every block of the level.
+    angles = np.arange(PVS_RAYS) * (2 * pi / PVS_RAYS)
+    lengths = np.arange(radius * STEPS_PER_BLOCK + 1) / STEPS_PER_BLOCK
+    blocksX = np.floor(pointsX.reshape(-1, 1, 1) +
+                       np.cos(angles)[None, :, None] * lengths[None, None, :])
+    blocksY = np.floor(pointsY.reshape(-1, 1, 1) +
+                       np.sin(angles)[None, :, None] * lengths[None, None, :])
+    blocksX = blocksX.astype(np.intp).reshape(-1, lengths.size)
+    blocksY = blocksY.astype(np.intp).reshape(-1, lengths.size)
+
+    # Rays sample most blocks several times, keep every block once (rays are
+    # padded with their last block) and cast every sequence of blocks only once
+    rays = blocksX * stride + blocksY
+    changed = np.ones(rays.shape, dtype=bool)
+    changed[:, 1:] = rays[:, 1:] != rays[:, :-1]
+    order = np.argsort(~changed, axis=1, kind="stable")
+    last = changed.sum(axis=1) - 1
+    order = np.take_along_axis(order, np.minimum(np.arange(rays.shape[1]), last[:, None]), axis=1)
+    rays = np.take_along_axis(rays, order, axis=1)[:, :last.max() + 1]
+    rays = np.unique(rays, axis=0)
+    blocksX = np.floor_divide(rays + stride // 2, stride)
+    blocksY = rays - blocksX * stride
+
+    # Bits of the blocks in the window (blocks outside of it go to an extra bit)
+    inside = (np.abs(blocksX) <= radius) & (np.abs(blocksY) <= radius)
+    bits = np.where(inside, (blocksX + radius) * side + blocksY + radius, side * side)
+
+    # Blocks of the window relative to the block of the points
+    offsets = np.arange(-radius, radius + 1)
+    window = (offsets[:, None] * stride + offsets[None, :]).reshape(-1)
+
+    _worker = (padded, border, radius, rays, bits, window)
+
+
+def _build_cells(first, last):
+    """
+    Returns the packed windows of blocks first to last (excluding), numbered
+    x * height + y.
+    """
+    padded, border, radius, rays, bits, window = _worker
+    height = padded.shape[1] - 2 * border - 2
+    stride = padded.shape[1]
+    flatGrid = padded.reshape(-1)
+    side = 2 * radius + 1
+
+    windows = np.zeros((last - first, side * side + 1), dtype=bool)
+    for i, cell in enumerate(range(first, last)):
+        x, y = divmod(cell, height)
+        origin = (x + border + 1) * stride + y + border + 1
+        if flatGrid[origin] & WALL:
+            continue  # The camera is never inside of a wall
+
+        solid = (flatGrid.take(origin + rays) & (WALL | OUTSIDE)) != 0
+
+        # Samples up to the first wall of their ray (including it) are seen
+        seen = (np.cumsum(solid, axis=1) - solid) == 0
+        windows[i, bits[seen]] = True
+
+        # Rays are only samples and can miss a block seen past a corner, so
+        # blocks next to seen empty blocks count as seen too
+        empty = (flatGrid.take(origin + window) & (WALL | OUTSIDE)) == 0
+        visible = windows[i, :-1].reshape(side, side)
+        grown = np.pad(visible & empty.reshape(side, side), 1)
+        for dx in range(3):
+            for dy in range(3):
+                visible |= grown[dx:dx + side, dy:dy + side]
+
+    return np.packbits(windows[:, :-1], axis=1)
+
+
+def main():
+    if len(argv) < 2:
+        print("Usage: python3 pvs.py level.lvl")
+        exit(1)
+    start = perf_counter()
+    pvs = load_pvs(argv[1], Level(argv[1]))
+    print("PVS of %d x %d blocks with radius %d ready in %.2f s" %
+          (pvs.bits.shape[0], pvs.bits.shape[1], pvs.get_radius(), perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Contains a cache of ray casting results reused between frames.
+"""
+
+import numpy as np
+
+
+class RayCache:
+    """
+    Remembers the result of every ray cast from the current player position. Ray
+    directions are fixed (see Raycasting), so as long as the player doesn't move,
+    a ray always hits the same spot. When the player only turns, just the newly
+    exposed rays have to be cast and when the player stands still, nothing has to
+    be cast at all. Moving invalidates the whole cache.
+    """
+
+    def __init__(self, raycasting):
+        """
+        Parameters
+        ----------
+        raycasting : Raycasting object (any backend)
+        """
+        self.raycasting = raycasting
+
+        totalRays = raycasting.get_total_rays()
+        self.pos = None  # Position the cached rays were cast from as a tupple
+        self.valid = np.zeros(totalRays, dtype=bool)
+        self.distances = np.full(totalRays, np.nan)
+        self.intersections = np.full((totalRays, 2), np.nan)
+        self.flagDistances = np.full(totalRays, np.nan)
+
+    def invalidate(self):
+        """
+        Forget all cached rays.
+        """
+        self.valid[:] = False
+
+    def cast_fov(self, startRay, endRay, fromPos, step=1):
+        """
+        Same as Raycasting.cast_fov() (without messing up rays), but only casts the
+        rays that aren't cached yet.
+
+        Parameters
+        ----------
+        startRay : int
+        endRay : int
+        fromPos : pygame.Vector2
+        step : int
+        """
+        pos = (fromPos.x, fromPos.y)
+        if pos != self.pos:
+            self.invalidate()
+            self.pos = pos
+
+        rays = self.raycasting.ray_range(startRay, endRay, step)
+        missing = rays[~self.valid[rays]]
+        if missing.size:
+            distances, intersections, flagDistances = \
+                self.raycasting.cast_selected_rays(missing, fromPos)
+            self.distances[missing] = distances
+            self.intersections[missing] = intersections
+            self.flagDistances[missing] = flagDistances
+            self.valid[missing] = True
+
+        return self.distances[rays], self.intersections[rays], self.flagDistances[rays]
@@ -3,67 +3,74 @@ Contains miscellanious functions used for computing graphics and physics.
 """
 
 import numpy as np
-from math import sin, cos, pi, radians
+from math import cos, pi, radians, floor, hypot
 
 from pygame import Vector2
 
+from level import WALL, FLAG
+
+
+FIRST_PASS_LINES = 12  # Grid lines every ray of a batch is extended over at once (most
+                       # rays hit a wall within them), following passes are twice as long
+
 
 class Raycasting:
     """
     Contains logic for everything that has something to do with rays.
     """
 
-    def __init__(self, totalRays, blockSize, level):
+    def __init__(self, totalRays, blockSize, level, renderDistance=10):
         """
         Parameters
         ----------
         totalRays : int
         blockSize : int
         level : Level
+        renderDistance : int (how many grid lines of each direction a ray can cross)
         """
         self.totalRays = totalRays
         self.blockSize = blockSize
         self.level = level
 
-        self.renderDistance = 10
-
-        self.rayAngles = []   # Angles of rays in radians
-        self.rayVectors = []  # Normalized pygame 2d vector for every ray
-        self.rayHorizontalHypotenuses = []  # See documentation
-        self.rayVerticalHypotenuses = []
-
-        for x in range(totalRays):
-            # Compute ray angles. Equally distribute across 2pi radians.
-            angle = x * 2*pi / totalRays  # In radians
-            self.rayAngles.append(angle)
-
-            # Compute ray vectors
-            v = Vector2(cos(angle), sin(angle))
-            self.rayVectors.append(v)
-
-            # Compute vertical hypotenuses
-            # Test if hypotenuse isn't parallel to the horizontal grid lines first
-            delta = 10e-10  # So that we don't compare floats with ==
-            if (pi/2 - delta) < angle < (pi/2 + delta) or \
-               (3*pi/2 - delta) < angle < (3*pi/2 - delta):
-                # Hypotenuse is parallel to the horizontal grid lines
-                hypotenuse = v * self.blockSize  # TODO maybe do something else with these horizontal vectors
-            else:
-                lenght = blockSize / abs(cos(angle))
-                hypotenuse = v * lenght
-            self.rayVerticalHypotenuses.append(hypotenuse)
-
-            # Compute horizontal hypotenuses
-            # Test if hypotenuse isn't parallel to the vertical grid lines first
-            delta = 10e-10  # So that we don't compare floats with ==
-            if angle > (2*pi - delta) or angle < (0*pi + delta) or \
-               (pi - delta) < angle < (pi - delta):
-                # Hypotenuse is parallel to the vertical grid lines
-                hypotenuse = v * self.blockSize
-            else:
-                lenght = blockSize / abs(sin(angle))
-                hypotenuse = v * lenght
-            self.rayHorizontalHypotenuses.append(hypotenuse)
+        self.renderDistance = renderDistance
+
+        # Whether rays look for the flag, see set_flag_detection()
+        self.detectFlag = True
+
+        # Potentially visible set limiting how far rays go, see set_pvs()
+        self.pvs = None
+
+        # Statistics for profiling, see pop_traversal_counts()
+        self.raysCast = 0
+        self.cellsTraversed = 0
+
+        # Compute ray angles. Equally distribute across 2pi radians.
+        angles = np.arange(totalRays) * 2*pi / totalRays  # In radians
+        vectors = np.stack((np.cos(angles), np.sin(angles)), axis=1)
+        delta = 10e-10  # So that we don't compare floats with ==
+
+        # Compute vertical and horizontal hypotenuses. Hypotenuses parallel to the
+        # grid lines they should cross are just vectors of block length (the
+        # division by zero for them is thrown away).
+        with np.errstate(divide="ignore"):
+            parallel = ((pi/2 - delta) < angles) & (angles < (pi/2 + delta))
+            lengths = np.where(parallel, blockSize, blockSize / np.abs(vectors[:, 0]))
+            verticalHypotenuses = vectors * lengths[:, None]
+
+            parallel = (angles > (2*pi - delta)) | (angles < (0*pi + delta))
+            lengths = np.where(parallel, blockSize, blockSize / np.abs(vectors[:, 1]))
+            horizontalHypotenuses = vectors * lengths[:, None]
+
+        # Tables as NumPy arrays for casting many rays at once
+        self.rayVectorArray = vectors
+        self.rayVerticalHypotenuseArray = verticalHypotenuses
+        self.rayHorizontalHypotenuseArray = horizontalHypotenuses
+
+        # And as lists of pygame vectors for casting single rays
+        self.rayAngles = angles.tolist()  # Angles of rays in radians
+        self.rayVectors = [Vector2(v) for v in vectors.tolist()]  # Normalized
+        self.rayHorizontalHypotenuses = [Vector2(h) for h in horizontalHypotenuses.tolist()]  # See documentation
+        self.rayVerticalHypotenuses = [Vector2(h) for h in verticalHypotenuses.tolist()]
 
     #
     # Getting properties of rays
@@ -165,6 +172,218 @@ class Raycasting:
         degreesPerRay = 360 / self.totalRays
         return degrees // degreesPerRay
 
+    #
+    # Backend interface
+    #
+    # Game and Player cast rays only through these methods. Subclasses in
+    # backends.py override them with faster engines, this class is the reference.
+    #
+
+    def cast_fov(self, startRay, endRay, fromPos, messUpRays=None, step=1):
+        """
+        Cast all rays in range <startRay, endRay> (including both of these) like
+        cast_rays() does, but return the results as a tupple of NumPy arrays
+        (distances, intersections, flagDistances) with 'nan' values instead of
+        'None' values. See cast_rays_batch().
+
+        If step is greater than 1, only every step-th ray of the range is cast
+        (lower resolution). The reference backend casts all of them anyway and
+        throws the rest away.
+
+        Parameters
+        ----------
+        startRay : int
+        endRay : int
+        fromPos : pygame.Vector2
+        messUpRays : list of ints
+        step : int
+        """
+        distances, intersections, flagDistances = self.cast_rays(
+            startRay, endRay, fromPos, messUpRays
+        )
+        distances = distances[::step]
+        intersections = intersections[::step]
+        flagDistances = flagDistances[::step]
+        resultDistances = np.array(distances, dtype=float)
+        resultIntersections = np.array(
+            [(np.nan, np.nan) if i is None else (i.x, i.y) for i in intersections]
+        ).reshape(-1, 2)
+        resultFlagDistances = np.array(flagDistances, dtype=float)
+        return resultDistances, resultIntersections, resultFlagDistances
+
+    def cast_fov_axes(self, startRay, endRay, fromPos, step=1):
+        """
+        Cast rays like cast_fov() does, but return two tupples of arrays instead of
+        one: (vertical, horizontal). Vertical contains the results all the rays
+        would have if they could only hit walls on vertical grid lines, horizontal
+        the same for horizontal grid lines. They are the same as the results of
+        cast_fov() with all rays messed up with code 2 and 1 respectively (see
+        cast_rays()), so effects (see effects.py) can mess up any ray afterwards
+        without casting it again. Flag distances of vertical are those of the
+        flag on horizontal grid lines and the other way round.
+
+        Parameters
+        ----------
+        startRay : int
+        endRay : int
+        fromPos : pygame.Vector2
+        step : int
+        """
+        vertical = self.cast_fov(startRay, endRay, fromPos, [2] * self.totalRays, step)
+        horizontal = self.cast_fov(startRay, endRay, fromPos, [1] * self.totalRays, step)
+        return vertical, horizontal
+
+    def cast_selected_rays(self, rays, fromPos):
+        """
+        Like cast_fov(), but casts the given rays (in any order) instead of a range
+        of rays.
+
+        Parameters
+        ----------
+        rays : array of ints
+        fromPos : pygame.Vector2
+        """
+        distances = np.full(len(rays), np.nan)
+        intersections = np.full((len(rays), 2), np.nan)
+        flagDistances = np.full(len(rays), np.nan)
+        for i, ray in enumerate(rays):
+            distance, intersection, flagDistance = self.cast_ray(int(ray), fromPos)
+            if not distance is None:
+                distances[i] = distance
+                intersections[i] = (intersection[0], intersection[1])
+            if not flagDistance is None:
+                flagDistances[i] = flagDistance
+        return distances, intersections, flagDistances
+
+    def cast_views(self, positions, middleRays, fovRays, step=1):
+        """
+        Cast the fov of many cameras at once, e.g. of many simulated players.
+        Camera i stands at positions[i] and looks in the direction of
+        middleRays[i], its fov spans the same rays as the fov of a Player with
+        fovRays rays. Returns a tupple of arrays like cast_fov(), but with one row
+        per camera:
+
+        (
+            distances : array of shape (cameras, rays),
+            intersections : array of shape (cameras, rays, 2),
+            flagDistances : array of shape (cameras, rays)
+        )
+
+        The reference backend casts the cameras one by one with
+        cast_selected_rays(), the other backends cast all of them in one pass.
+
+        Parameters
+        ----------
+        positions : array of shape (cameras, 2) (in units)
+        middleRays : array of ints
+        fovRays : int
+        step : int (cast only every step-th ray of every fov)
+        """
+        positions, rays = self.view_rays(positions, middleRays, fovRays, step)
+        distances = np.full(rays.shape, np.nan)
+        intersections = np.full(rays.shape + (2,), np.nan)
+        flagDistances = np.full(rays.shape, np.nan)
+        for i in range(rays.shape[0]):
+            distances[i], intersections[i], flagDistances[i] = \
+                self.cast_selected_rays(rays[i], Vector2(positions[i, 0], positions[i, 1]))
+        return distances, intersections, flagDistances
+
+    def cast_ray(self, ray, fromPos):
+        """
+        Cast a single ray and return a tupple (distance, intersection, flagDistance)
+        with 'None' values if ray didn't hit any wall and/or flag.
+
+        Parameters
+        ----------
+        ray : int
+        fromPos : pygame.Vector2
+        """
+        distances, intersections, flagDistances = self.cast_rays(ray, ray, fromPos)
+        return distances[0], intersections[0], flagDistances[0]
+
+    def distance_to_wall(self, ray, fromPos):
+        """
+        Returns how far from fromPos the nearest wall in the direction of the given
+        ray is or 'None' if there is no wall within render distance. Used for
+        collision checks.
+
+        Parameters
+        ----------
+        ray : int
+        fromPos : pygame.Vector2
+        """
+        return self.cast_ray(ray, fromPos)[0]
+
+    def texture_coordinates(self, intersections, fromPos):
+        """
+        Returns where on the walls rays cast from fromPos hit them in a tupple of
+        arrays (sides, offsets). Side is 0 for vertical sides of walls and 1 for
+        horizontal ones (as in cast_ray_dda()), offset is the position of the hit
+        along the side of the block from 0.0 to 1.0, so that textures aren't
+        mirrored on any side. Rays that didn't hit a wall get side 0 and offset
+        0.0.
+
+        Parameters
+        ----------
+        intersections : array of shape (n, 2) (see cast_fov())
+        fromPos : pygame.Vector2
+        """
+        intersections = np.nan_to_num(np.asarray(intersections, dtype=float))
+        x = intersections[:, 0]
+        y = intersections[:, 1]
+
+        # Intersections lie on the grid line of the side that was hit
+        distanceX = np.abs(x - np.round(x / self.blockSize) * self.blockSize)
+        distanceY = np.abs(y - np.round(y / self.blockSize) * self.blockSize)
+        vertical = distanceX <= distanceY
+
+        offsets = np.where(vertical, y, x) / self.blockSize % 1.0
+        flip = np.where(vertical, fromPos.x > x, fromPos.y < y)
+        offsets = np.where(flip, (1.0 - offsets) % 1.0, offsets)
+        return (~vertical).astype(np.intp), offsets
+
+    def set_flag_detection(self, enabled):
+        """
+        Turn looking for the flag while casting rays on or off. When the flag is
+        drawn as a sprite (see sprites.py), rays don't have to look for it and
+        all flag distances are 'None' (or 'nan').
+
+        Parameters
+        ----------
+        enabled : bool
+        """
+        self.detectFlag = enabled
+
+    def set_pvs(self, pvs):
+        """
+        Let the batch engine (see cast_ray_indices()) stop rays one line after
+        the farthest block the potentially visible set of the block of the camera
+        reaches in their direction, they can't hit anything behind it. Results
+        stay the same, rays in mazes just cross fewer lines.
+
+        Parameters
+        ----------
+        pvs : PotentiallyVisibleSet or None (see pvs.py)
+        """
+        self.pvs = pvs
+
+    def pop_traversal_counts(self):
+        """
+        Returns how many rays were cast and how many grid blocks they traversed
+        since the last call of this method in a tupple (rays, blocks).
+        """
+        counts = (self.raysCast, self.cellsTraversed)
+        self.raysCast = 0
+        self.cellsTraversed = 0
+        return counts
+
+    def close(self):
+        """
+        Release resources held by the backend (worker processes, shared memory).
+        The reference backend doesn't hold any.
+        """
+        pass
+
     #
     # Casting rays
     #
@@ -227,6 +446,8 @@ class Raycasting:
             downHorizontalLine = None
         if upHorizontalLine < 0:
             upHorizontalLine = None
+
+        detectFlag = self.detectFlag  # See set_flag_detection()
         
         # Line and ray intersection functions
         def inter_ray_line_vertical(rayVector, line):
@@ -305,7 +526,8 @@ class Raycasting:
             while i <= self.renderDistance and \
                   not self.level.is_wall_at_vector(interBlock):
                 # Check if flag was hit
-                if flagDistance is None and self.level.is_flag_at_vector(interBlock):
+                if detectFlag and flagDistance is None and \
+                   self.level.is_flag_at_vector(interBlock):
                     # If it was, compute distance to the flag intersection
                     flagDistance = intersection.distance_to(fromPos)
 
@@ -313,6 +535,7 @@ class Raycasting:
                 intersection += self.rayVerticalHypotenuses[ray]
                 interBlock = intersectionToBlock(intersection - Vector2(0.1, 0.1))
                 i += 1
+            self.cellsTraversed += i + 1
             
             # Compute distance to the intersection
             if i > self.renderDistance:  # Max render distance was exceeded
@@ -361,13 +584,15 @@ class Raycasting:
             i = 0
             while i <= self.renderDistance and \
                   not self.level.is_wall_at_vector(interBlock):
-                if flagDistance is None and self.level.is_flag_at_vector(interBlock):
+                if detectFlag and flagDistance is None and \
+                   self.level.is_flag_at_vector(interBlock):
                     flagDistance = intersection.distance_to(fromPos)
 
                 # Vertical instead of horizontal
                 intersection += self.rayHorizontalHypotenuses[ray]
                 interBlock = intersectionToBlock(intersection - Vector2(0.1, 0.1))
                 i += 1
+            self.cellsTraversed += i + 1
 
             if i > self.renderDistance:
                 intersection = None
@@ -499,6 +724,7 @@ class Raycasting:
             # We have the final distance and intersection values
             #
 
+            self.raysCast += 1
             resultDistances.append(distance)
             resultIntersections.append(intersection)
             resultFlagDistances.append(flagDistance)
@@ -516,6 +742,465 @@ class Raycasting:
 
         return resultDistances, resultIntersections, resultFlagDistances
 
+    def cast_rays_batch(self, startRay, endRay, fromPos, messUpRays=None, step=1):
+        """
+        Does the same as cast_rays(), but casts all the rays of the range
+        <startRay, endRay> at once using NumPy arrays instead of one by one.
+        Returns a tupple of three NumPy arrays (of the same lenght):
+
+        (
+            distances : array of floats,
+            intersections : array of shape (n, 2),
+            flagDistances : array of floats
+        )
+
+        Rays that didn't hit any wall and/or flag have 'nan' values instead of
+        'None' values. If step is greater than 1, only every step-th ray of the
+        range is cast.
+
+        Parameters
+        ----------
+        startRay : int
+        endRay : int
+        fromPos : pygame.Vector2
+        messUpRays : list of ints
+        step : int
+        """
+        rays = self.ray_range(startRay, endRay, step)
+        messUpCodes = None
+        if messUpRays is not None:
+            messUpCodes = np.asarray(messUpRays)[rays]
+        return self.cast_ray_indices(rays, fromPos.x, fromPos.y, messUpCodes)
+
+    def ray_range(self, startRay, endRay, step=1):
+        """
+        Returns every step-th ray in range <startRay, endRay> (including startRay
+        and also endRay if it is reached) as a NumPy array. The range may wrap
+        around the last ray.
+
+        Parameters
+        ----------
+        startRay : int
+        endRay : int
+        step : int
+        """
+        count = (endRay - startRay) % self.totalRays // step + 1
+        return (startRay + np.arange(count) * step) % self.totalRays
+
+    def view_rays(self, positions, middleRays, fovRays, step=1):
+        """
+        Returns positions of cameras as an array of shape (cameras, 2) and every
+        step-th ray of their fovs as an array of shape (cameras, rays) in a
+        tupple (see cast_views()). Fovs reach from fovRays // 2 rays left of the
+        middle ray to the rest of fovRays right of it, as in Player.
+
+        Parameters
+        ----------
+        positions : array of shape (cameras, 2)
+        middleRays : array of ints
+        fovRays : int
+        step : int
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        middleRays = np.asarray(middleRays, dtype=np.intp).reshape(-1)
+        if positions.shape[0] != middleRays.shape[0]:
+            raise Exception("There has to be one middle ray for every camera position.")
+
+        fovRays = int(fovRays)
+        offsets = np.arange(-(fovRays // 2), fovRays - fovRays // 2 + 1, step)
+        return positions, (middleRays[:, None] + offsets[None, :]) % self.totalRays
+
+    def cast_view_rays(self, positions, rays):
+        """
+        Cast rays of many cameras (see view_rays()) in one batch. Every ray is
+        cast from the position of its camera. Returns the same tupple of arrays
+        as cast_views().
+
+        Parameters
+        ----------
+        positions : array of shape (cameras, 2)
+        rays : array of ints of shape (cameras, rays)
+        """
+        shape = rays.shape
+        distances, intersections, flagDistances = self.cast_ray_indices(
+            rays.reshape(-1),
+            np.repeat(positions[:, 0], shape[1]),
+            np.repeat(positions[:, 1], shape[1])
+        )
+        return (distances.reshape(shape), intersections.reshape(shape + (2,)),
+                flagDistances.reshape(shape))
+
+    def cast_ray_indices(self, rays, fromX, fromY, messUpCodes=None):
+        """
+        Cast the given rays from the given coordinates at once. Returns the same
+        tupple of arrays as cast_rays_batch().
+
+        The coordinates may either be single floats or arrays of the same lenght
+        as rays (each ray is then cast from its own position).
+
+        Parameters
+        ----------
+        rays : array of ints
+        fromX : float or array of floats
+        fromY : float or array of floats
+        messUpCodes : array of ints (same meaning as messUpRays in cast_rays())
+        """
+        rays = np.asarray(rays)
+        fromX = np.broadcast_to(np.asarray(fromX, dtype=float), rays.shape)
+        fromY = np.broadcast_to(np.asarray(fromY, dtype=float), rays.shape)
+
+        self.raysCast += rays.size
+        vertical = self._cast_axis_batch(rays, fromX, fromY, vertical=True)
+        horizontal = self._cast_axis_batch(rays, fromX, fromY, vertical=False)
+        return self._combine_axes(vertical, horizontal, messUpCodes)
+
+    def cast_ray_indices_axes(self, rays, fromX, fromY):
+        """
+        Like cast_ray_indices(), but returns the vertical and horizontal results
+        separately (see cast_fov_axes()). Every ray is still cast only once.
+
+        Parameters
+        ----------
+        rays : array of ints
+        fromX : float or array of floats
+        fromY : float or array of floats
+        """
+        rays = np.asarray(rays)
+        fromX = np.broadcast_to(np.asarray(fromX, dtype=float), rays.shape)
+        fromY = np.broadcast_to(np.asarray(fromY, dtype=float), rays.shape)
+
+        self.raysCast += rays.size
+        vertical = self._cast_axis_batch(rays, fromX, fromY, vertical=True)
+        horizontal = self._cast_axis_batch(rays, fromX, fromY, vertical=False)
+        return (self._combine_axes(vertical, horizontal, np.full(rays.shape, 2)),
+                self._combine_axes(vertical, horizontal, np.full(rays.shape, 1)))
+
+    def cast_ray_dda(self, ray, fromPos):
+        """
+        Cast a single ray from the coordinates fromPos and return the distance it
+        traveled until it hit a wall, the coordinates of the hit, the distance it
+        traveled until it intersected flag (if it did intersect it) and which side
+        of the wall was hit in a tupple:
+
+        (
+            distance : float,
+            intersection : tupple of two floats,
+            flagDistance : float,
+            side : int
+        )
+
+        Side is 0 for vertical sides of walls and 1 for horizontal ones. Returns
+        'None' values if ray didn't hit any wall and/or flag.
+
+        Gives the same results as cast_rays(ray, ray, fromPos), also for rays
+        passing near block corners: like cast_rays() it steps along vertical and
+        horizontal grid lines apart and computes intersections and blocks
+        behind them the same way _cast_axis_batch() does (see
+        _cast_axis_dda()). Uses only plain floats and ints and skips empty
+        space, so it is much cheaper when casting just a few rays.
+
+        Parameters
+        ----------
+        ray : int
+        fromPos : pygame.Vector2
+        """
+        fromX = fromPos.x
+        fromY = fromPos.y
+        distanceVert, interVert, flagDistanceVert = self._cast_axis_dda(ray, fromX, fromY,
+                                                                        vertical=True)
+        distanceHor, interHor, flagDistanceHor = self._cast_axis_dda(ray, fromX, fromY,
+                                                                     vertical=False)
+        self.raysCast += 1
+
+        # Choose the nearest intersection with a wall (see _combine_axes())
+        if distanceHor is None or (not distanceVert is None and distanceVert < distanceHor):
+            distance, intersection, side = distanceVert, interVert, 0
+        else:
+            distance, intersection, side = distanceHor, interHor, 1
+        if distance is None:
+            side = None
+
+        # Flag shouldn't be seen if intersection with a wall is closer
+        flagDistances = [flagDistance for flagDistance in (flagDistanceVert, flagDistanceHor)
+                         if not flagDistance is None and
+                         (distance is None or distance >= flagDistance)]
+        flagDistance = min(flagDistances) if flagDistances else None
+
+        return distance, intersection, flagDistance, side
+
+    def _cast_axis_dda(self, ray, fromX, fromY, vertical):
+        """
+        Scalar version of _cast_axis_batch() for a single ray, with the same
+        arithmetic, so that results are equal. Lines closer to the last checked
+        block than the nearest wall or flag are skipped after every line.
+        Returns a tupple (distance, intersection, flagDistance) with 'None' values
+        if the ray didn't hit any wall and/or flag.
+
+        Parameters
+        ----------
+        ray : int
+        fromX : float
+        fromY : float
+        vertical : bool
+        """
+        blockSize = self.blockSize
+        level = self.level
+        maxLines = self.renderDistance + 1
+        vector = self.rayVectors[ray]
+
+        # Work with the coordinate perpendicular to the grid lines ("a") and the
+        # one parallel to them ("b"), see _cast_axis_batch()
+        if vertical:
+            fromA, fromB = fromX, fromY
+            directionA, directionB = vector.x, vector.y
+            hypotenuseA, hypotenuseB = self.rayVerticalHypotenuses[ray]
+            linesCount = level.get_size().x
+        else:
+            fromA, fromB = fromY, fromX
+            directionA, directionB = vector.y, vector.x
+            hypotenuseB, hypotenuseA = self.rayHorizontalHypotenuses[ray]
+            linesCount = level.get_size().y
+
+        # Nearest grid line in the direction of the ray
+        fromBlockA = fromA // blockSize
+        if directionA > 0 and fromBlockA <= linesCount - 2:
+            forward = 1
+            lineA = (fromBlockA + 1) * blockSize
+        elif directionA < 0 and fromBlockA - 1 >= 0:
+            forward = 0
+            lineA = fromBlockA * blockSize
+        else:
+            return None, None, None
+        lineB = fromB + directionB * ((lineA - fromA) / directionA)
+
+        # Lines of the other direction crossed between two lines (in blocks)
+        slope = abs(hypotenuseB) / blockSize
+
+        detectFlag = self.detectFlag  # See set_flag_detection()
+        flagStep = None
+        wallStep = None
+        step = 0
+        while step < maxLines:
+            self.cellsTraversed += 1
+
+            # Block behind the intersection
+            blockA = int((lineA + hypotenuseA * step - 0.1) // blockSize) + forward
+            blockB = int((lineB + hypotenuseB * step - 0.1) // blockSize)
+            if vertical:
+                blockX, blockY = blockA, blockB
+            else:
+                blockX, blockY = blockB, blockA
+
+            # Only walls and the flag are 0 blocks away from the nearest wall or
+            # flag, lines closer to an empty block than that are empty too
+            radius = level.get_empty_radius(blockX, blockY) - 1
+            if radius < 0:
+                if level.is_wall_at(blockX, blockY):
+                    wallStep = step
+                    break
+                if detectFlag and flagStep is None and level.is_flag_at(blockX, blockY):
+                    flagStep = step
+            elif radius > 0:
+                skip = floor(radius / slope) if slope > 0 else radius
+                step += min(skip, radius)
+            step += 1
+
+        def intersection_at(step):
+            interA = lineA + hypotenuseA * step
+            interB = lineB + hypotenuseB * step
+            return (interA, interB) if vertical else (interB, interA)
+
+        distance = None
+        intersection = None
+        if not wallStep is None:
+            intersection = intersection_at(wallStep)
+            distance = hypot(intersection[0] - fromX, intersection[1] - fromY)
+        flagDistance = None
+        if not flagStep is None:
+            flagX, flagY = intersection_at(flagStep)
+            flagDistance = hypot(flagX - fromX, flagY - fromY)
+        return distance, intersection, flagDistance
+
+    def _cast_axis_batch(self, rays, fromX, fromY, vertical):
+        """
+        Vectorized version of cast_ray_vertical() and cast_ray_horizontal() from
+        cast_rays(). Rays are extended over FIRST_PASS_LINES grid lines at once and
+        the first line behind which there is a wall is picked. Rays that didn't
+        hit anything skip the following lines that are certainly empty (see
+        Level.get_empty_radius()) and go on over twice as many lines, until they
+        hit a wall or cross renderDistance + 1 lines (or the lines the potentially
+        visible set allows, see set_pvs()), so rays in open space don't check
+        every line.
+
+        Returns a tupple of arrays (distances, intersectionsX, intersectionsY,
+        flagDistances) with 'nan' values instead of 'None' values.
+
+        Parameters
+        ----------
+        rays : array of ints
+        fromX : array of floats
+        fromY : array of floats
+        vertical : bool
+        """
+        blockSize = self.blockSize
+        levelSize = self.level.get_size()
+        maxLines = self.renderDistance + 1
+
+        # Work with the coordinate perpendicular to the grid lines ("a") and the
+        # one parallel to them ("b") so that both directions share the code
+        if vertical:
+            fromA, fromB = fromX, fromY
+            directionA = self.rayVectorArray[rays, 0]
+            directionB = self.rayVectorArray[rays, 1]
+            hypotenuses = self.rayVerticalHypotenuseArray[rays]
+            linesCount = levelSize.x
+        else:
+            fromA, fromB = fromY, fromX
+            directionA = self.rayVectorArray[rays, 1]
+            directionB = self.rayVectorArray[rays, 0]
+            hypotenuses = self.rayHorizontalHypotenuseArray[rays][:, ::-1]
+            linesCount = levelSize.y
+
+        # Nearest grid line in the direction of each ray. Rays heading along the
+        # lines and rays with no more lines in their direction don't hit anything.
+        fromBlockA = fromA // blockSize
+        forward = directionA > 0
+        backward = directionA < 0
+        valid = (forward & (fromBlockA <= linesCount - 2)) | \
+                (backward & (fromBlockA - 1 >= 0))
+        lineA = np.where(forward, fromBlockA + 1, fromBlockA) * blockSize
+
+        # Intersection with the nearest line, the following ones are a
+        # hypotenuse apart
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(valid, (lineA - fromA) / directionA, 0.0)
+        lineB = fromB + directionB * t
+
+        # Lines of the other direction crossed between two lines (in blocks)
+        slopes = np.abs(hypotenuses[:, 1]) / blockSize
+
+        # Lines every ray may cross, the line behind the farthest visible block
+        # is the last one
+        lineLimits = np.full(rays.size, maxLines)
+        if not self.pvs is None:
+            reaches = self.pvs.get_reaches((fromX // blockSize).astype(np.intp),
+                                           (fromY // blockSize).astype(np.intp))
+            direction = np.where(forward, 0, 1) + (0 if vertical else 2)
+            reaches = np.take_along_axis(reaches, direction[:, None], axis=1)[:, 0]
+            lineLimits = np.where(reaches < self.pvs.get_radius(),
+                                  np.minimum(reaches + 1, maxLines), maxLines)
+
+        wallStep = np.full(rays.size, maxLines)
+        flagStep = np.full(rays.size, maxLines)
+        nextStep = np.zeros(rays.size, dtype=np.intp)
+        active = np.flatnonzero(valid & (lineLimits > 0))
+        passSteps = np.arange(min(FIRST_PASS_LINES, lineLimits.max(initial=0)))
+        while active.size:
+            limits = lineLimits[active]
+            steps = nextStep[active, None] + passSteps
+            inRange = steps < limits[:, None]
+            interA = lineA[active, None] + hypotenuses[active, 0, None] * steps
+            interB = lineB[active, None] + hypotenuses[active, 1, None] * steps
+
+            # Blocks behind the intersections
+            blockA = (interA - 0.1) // blockSize + forward[active, None]
+            blockB = (interB - 0.1) // blockSize
+            if vertical:
+                blockX, blockY = blockA, blockB
+            else:
+                blockX, blockY = blockB, blockA
+            blocks = self.level.get_blocks(blockX, blockY)
+            walls = (blocks == WALL) & inRange
+
+            # First wall hit, flag counts only if it was passed before the wall
+            hit = walls.any(axis=1)
+            firstWall = np.where(hit, walls.argmax(axis=1), passSteps.size)
+            wallStep[active[hit]] = steps[hit, firstWall[hit]]
+            if self.detectFlag:
+                flags = (blocks == FLAG) & inRange & (passSteps[None, :] < firstWall[:, None])
+                flagHit = flags.any(axis=1) & (flagStep[active] == maxLines)
+                flagStep[active[flagHit]] = steps[flagHit, flags[flagHit].argmax(axis=1)]
+            self.cellsTraversed += int(np.where(hit, firstWall + 1, inRange.sum(axis=1)).sum())
+
+            # Lines after the last checked one that are closer to its block than
+            # the nearest wall or flag (in both directions) are empty
+            lastStep = steps[:, -1]
+            going = ~hit & (lastStep + 1 < limits)
+            radii = np.maximum(self.level.get_empty_radii(blockX[going, -1],
+                                                          blockY[going, -1]) - 1, 0)
+            goingSlopes = slopes[active[going]]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                skip = np.where(goingSlopes > 0, np.floor(radii / goingSlopes), radii)
+            nextStep[active[going]] = lastStep[going] + 1 + np.minimum(skip, radii).astype(np.intp)
+            active = active[going]
+            active = active[nextStep[active] < limits[going]]
+            if active.size:
+                passSteps = np.arange(min(2 * passSteps.size,
+                                          (lineLimits[active] - nextStep[active]).max()))
+
+        if vertical:
+            startX, startY, stepX, stepY = lineA, lineB, hypotenuses[:, 0], hypotenuses[:, 1]
+        else:
+            startX, startY, stepX, stepY = lineB, lineA, hypotenuses[:, 1], hypotenuses[:, 0]
+        hit = wallStep < maxLines
+        hitX = np.where(hit, startX + stepX * wallStep, np.nan)
+        hitY = np.where(hit, startY + stepY * wallStep, np.nan)
+        distances = np.hypot(hitX - fromX, hitY - fromY)
+        flagDistances = np.where(
+            flagStep < maxLines,
+            np.hypot(startX + stepX * flagStep - fromX, startY + stepY * flagStep - fromY),
+            np.nan
+        )
+        return distances, hitX, hitY, flagDistances
+
+    @staticmethod
+    def _combine_axes(vertical, horizontal, messUpCodes=None):
+        """
+        Choose from vertical and horizontal results of _cast_axis_batch() the same
+        way cast_rays() does and return the final tupple of arrays
+        (distances, intersections, flagDistances).
+
+        Parameters
+        ----------
+        vertical : tupple of arrays
+        horizontal : tupple of arrays
+        messUpCodes : array of ints (same meaning as messUpRays in cast_rays())
+        """
+        distanceVert, interVertX, interVertY, flagDistanceVert = vertical
+        distanceHor, interHorX, interHorY, flagDistanceHor = horizontal
+
+        # Choose the nearest intersection with a wall
+        useVert = np.isnan(distanceHor) | (distanceVert < distanceHor)
+        useHor = ~useVert
+        if messUpCodes is not None:
+            # Or mess it up - win screen animation
+            messUpCodes = np.asarray(messUpCodes)
+            useVert = np.where(messUpCodes == 0, useVert, messUpCodes == 2)
+            useHor = np.where(messUpCodes == 0, useHor, messUpCodes == 1)
+        distance = np.where(useVert, distanceVert,
+                            np.where(useHor, distanceHor, np.nan))
+
+        # Flag shouldn't be seen if intersection with a wall is closer
+        flagDistanceVert = np.where(distance < flagDistanceVert, np.nan, flagDistanceVert)
+        flagDistanceHor = np.where(distance < flagDistanceHor, np.nan, flagDistanceHor)
+
+        # Choose the nearest flag intersection (or mess it up)
+        flagDistance = np.fmin(flagDistanceVert, flagDistanceHor)
+        if messUpCodes is not None:
+            flagDistance = np.select(
+                [messUpCodes == 0, messUpCodes == 1, messUpCodes == 2],
+                [flagDistance, flagDistanceVert, flagDistanceHor],
+                np.nan
+            )
+
+        intersections = np.empty((distance.size, 2))
+        intersections[:, 0] = np.where(useVert, interVertX,
+                                       np.where(useHor, interHorX, np.nan))
+        intersections[:, 1] = np.where(useVert, interVertY,
+                                       np.where(useHor, interHorY, np.nan))
+
+        return distance, intersections, flagDistance
+
     #
     # Fisheye
     #
@@ -0,0 +1,556 @@
+"""
+Contains logic for drawing the 3d view of the level.
+"""
+
+from math import pi, radians, tan
+
+import numpy as np
+import pygame
+
+from textures import ColumnScaler, get_mip_levels, SHADE_BUCKETS
+
+
+#
+# Constants
+#
+
+BLOCK_SIZE = 64        # Walls will be blockSize x blockSize x blockSize units big
+PROJECTION_WIDTH = 12  # How big should the screen be inside the game world
+
+FLAG_HEIGHT_DIV = 5    # Flag will be this number times shorter than wall
+FLAG_SPRITE_WIDTH = BLOCK_SIZE // 2   # Flag drawn as a sprite is this big in units
+FLAG_SPRITE_HEIGHT = BLOCK_SIZE // 2
+
+CEIL_COLOR = (32, 32, 128)
+WALL_COLOR = (128, 128, 128)
+FLOOR_COLOR = (48, 48, 48)
+FLAG_COLOR = (128, 128, 0)
+
+RENDER_DISTANCE = 10 * BLOCK_SIZE  # The distance after which walls become absolutely dark
+                                  # and rays stop being cast
+
+
+#
+# Classes
+#
+
+class Renderer:
+    """
+    Draws floor, ceiling, walls, flag and sprites as seen by the player onto a
+    surface from the results of casting rays. Doesn't need a window, so it can draw onto any
+    surface.
+    """
+
+    def __init__(self, raycasting, windowSize, fovDegrees, texture=None, floorTexture=None,
+                 ceilingTexture=None):
+        """
+        Parameters
+        ----------
+        raycasting : Raycasting object (any backend)
+        windowSize : tupple of two ints
+        fovDegrees : int
+        texture : WallTexture or None (needed by rasterize_textured_walls())
+        floorTexture : WallTexture or None (flat floor if None, see
+                       rasterize_floor())
+        ceilingTexture : WallTexture or None (flat ceiling if None)
+        """
+        self.windowSize = windowSize
+        self.fovDegrees = fovDegrees
+        self.texture = texture
+        self.floorTexture = floorTexture
+        self.ceilingTexture = ceilingTexture
+
+        # Compute fov related stuff
+        totalRays = raycasting.get_total_rays()
+        self.totalRays = totalRays
+        self.rayVectors = raycasting.rayVectorArray
+        self.rayAngle = 2 * pi / totalRays  # Angle between two neighbouring rays
+        self.fovRays = raycasting.degrees_to_ray_number(self.fovDegrees)
+        self.pixelsPerRay = windowSize[0] // (totalRays // (360 // self.fovDegrees))
+
+        # Compute distance between player and the projection plane (also fov stuff)
+        self.distanceToProjection = int((PROJECTION_WIDTH) /
+                                        (tan(radians(self.fovDegrees / 2))))
+        
+        # Prepare fisheye correction
+        self.fisheyeCoefficients = raycasting.fisheye_coefficients(
+            self.fovDegrees,
+            self.fovRays
+        )
+
+        # Prepare tables for rasterizing columns. Height of a column is
+        # columnHeights[ray] * distanceToProjection / distance.
+        self.columnHeights = windowSize[1] * np.array(self.fisheyeCoefficients)
+        self.rowIndices = np.arange(windowSize[1])
+
+        # Prepare tables for casting floor and ceiling. Row y shows the floor (or
+        # ceiling) at the depth where a wall would end at this row, so that
+        # floor meets walls.
+        rowHeights = 2 * np.maximum(np.abs(self.rowIndices + 0.5 - windowSize[1] / 2), 0.5)
+        self.rowDepths = windowSize[1] * self.distanceToProjection / rowHeights
+        self.rowHeights = rowHeights  # Height of a wall ending at the row
+        self.mappedColors = {}  # Colors converted to pixel formats, see _map_colors()
+
+    def get_fov_rays(self):
+        """
+        Returns how many rays the fov spans.
+        """
+        return self.fovRays
+
+    def get_pixels_per_ray(self):
+        """
+        Returns how many pixels wide a column drawn for one ray is.
+        """
+        return self.pixelsPerRay
+
+    def draw_view(self, surface, distances, flagDistances, step=1):
+        """
+        Draw floor, ceiling and a column for every cast ray that hit a wall and/or
+        flag.
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+        distances : array of floats (one for every step-th ray of the fov)
+        flagDistances : array of floats
+        step : int
+        """
+        columns = self.rasterize_walls(surface, distances, step)
+        self.rasterize_flag(surface, columns, flagDistances, step)
+        self.blit_columns(surface, columns, step)
+
+    def rasterize_floor(self, surface, pos, leftRay, rayCount, step=1):
+        """
+        Returns an array of pixel values (see rasterize_walls()) with floor and
+        ceiling cast from the camera: every pixel shows the point of the floor
+        (or ceiling) seen through it, textured with floorTexture (or
+        ceilingTexture) and shaded according to distance. Whole rows of world
+        coordinates are computed at once from the precomputed depths of rows.
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+        pos : pygame.Vector2 (position of the camera)
+        leftRay : int (first ray of the fov)
+        rayCount : int (number of cast rays, every step-th ray of the fov)
+        step : int
+        """
+        visibleRays = self._count_visible_rays(rayCount, step)
+        colors = self._map_colors(surface)
+        columns = self._new_columns(colors, visibleRays)
+        halfHeight = self.windowSize[1] // 2
+
+        # Direction of every ray, scaled so that depth times it is the point seen
+        rays = (leftRay + np.arange(visibleRays) * step) % self.totalRays
+        fisheye = self.columnHeights[:visibleRays * step:step] / self.windowSize[1]
+        directions = self.rayVectors[rays] * fisheye[:, None]
+
+        for name, rows in (("floorTexture", slice(halfHeight, None)),
+                           ("ceilingTexture", slice(0, halfHeight))):
+            if not name in colors:
+                continue
+            shadedMips = colors[name]
+            size = shadedMips[0].shape[2]
+            depths = self.rowDepths[rows, None]
+            target = columns[rows]
+
+            # Points seen through every pixel (in blocks) and their shades
+            x = (pos.x / BLOCK_SIZE) + depths * (directions[None, :, 0] / BLOCK_SIZE)
+            y = (pos.y / BLOCK_SIZE) + depths * (directions[None, :, 1] / BLOCK_SIZE)
+            buckets = np.minimum(depths * (fisheye[None, :] * SHADE_BUCKETS / RENDER_DISTANCE),
+                                 SHADE_BUCKETS - 1).astype(np.intp)
+
+            # Rows farther away use smaller mip levels, rows of one level are
+            # next to each other
+            levels = get_mip_levels(size, len(shadedMips), self.rowHeights[rows])
+            bounds = [0, *(np.flatnonzero(np.diff(levels)) + 1), len(levels)]
+            for first, last in zip(bounds[:-1], bounds[1:]):
+                level = levels[first]
+                mipSize = size >> level
+
+                # Sizes are powers of two, so the mask wraps the coordinates
+                textureX = np.floor(x[first:last] * mipSize).astype(np.intp) & (mipSize - 1)
+                textureY = np.floor(y[first:last] * mipSize).astype(np.intp) & (mipSize - 1)
+                texels = (buckets[first:last] * mipSize + textureX) * mipSize + textureY
+                mip = shadedMips[level][0]
+                target[first:last] = mip.reshape(-1, *mip.shape[3:]).take(texels, axis=0)
+
+        return columns
+
+    def rasterize_walls(self, surface, distances, step=1, columns=None):
+        """
+        Returns an array of pixel values (in the format of the surface) of shape
+        (window height, number of rays) with the column of every ray: ceiling,
+        floor and wall if the ray hit one. Nothing is drawn yet, see
+        blit_columns().
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+        distances : array of floats (one for every step-th ray of the fov)
+        step : int
+        columns : numpy array or None (walls are drawn onto these columns, e.g.
+                  from rasterize_floor(), instead of flat floor and ceiling)
+        """
+        colors = self._map_colors(surface)
+        if columns is None:
+            columns = self._new_columns(colors, self._count_visible_rays(len(distances), step))
+
+        self._rasterize_spans(surface, columns, distances, step, 1.0, 1, WALL_COLOR)
+        return columns
+
+    def rasterize_textured_walls(self, surface, distances, sides, offsets, step=1,
+                                 columns=None):
+        """
+        Like rasterize_walls(), but walls are textured. Rows of the texture
+        shown by columns of every height are looked up in tables (see
+        textures.py) and pixels of all columns are gathered at once.
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+        distances : array of floats (one for every step-th ray of the fov)
+        sides : array of ints (see Raycasting.texture_coordinates())
+        offsets : array of floats (see Raycasting.texture_coordinates())
+        step : int
+        columns : numpy array or None (see rasterize_walls())
+        """
+        colors = self._map_colors(surface)
+        columnCache = colors["wallTexture"]
+        windowHeight = self.windowSize[1]
+        if columns is None:
+            columns = self._new_columns(colors, self._count_visible_rays(len(distances), step))
+        visibleRays = columns.shape[1]
+
+        distances = np.asarray(distances[:visibleRays], dtype=float)
+        hit, heights, tops, bottoms = self._column_extents(distances, step, 1.0, 1)
+        if not hit.any():
+            return columns
+
+        # Which column of which shaded mip level every ray shows (rays that
+        # didn't hit have zero height and cover no rows)
+        heights = np.trunc(heights).astype(np.intp)
+        mips = columnCache.get_mip_level(heights)
+        buckets = np.clip(np.where(hit, distances, 0) * SHADE_BUCKETS // RENDER_DISTANCE, 0,
+                          SHADE_BUCKETS - 1).astype(np.intp)
+        mipSizes = self.texture.get_size() >> mips
+        offsets = np.where(hit, np.asarray(offsets[:visibleRays], dtype=float), 0)
+        textureX = np.minimum(offsets * mipSizes, mipSizes - 1).astype(np.intp)
+        sides = np.where(hit, np.asarray(sides[:visibleRays]), 0)
+
+        # Only rows covered by some column have to be written
+        firstRow = max(0, tops[hit].min())
+        lastRow = min(windowHeight, bottoms[hit].max())
+        if firstRow >= lastRow:
+            return columns
+        pixels, mask = columnCache.get_pixels(firstRow, lastRow, windowHeight, mips, sides,
+                                              buckets, textureX, heights)
+        if pixels.ndim > 2:  # RGB values instead of mapped pixel values
+            mask = mask[:, :, None]
+        np.copyto(columns[firstRow:lastRow], pixels, where=mask)
+
+        return columns
+
+    def rasterize_flag(self, surface, columns, flagDistances, step=1):
+        """
+        Add the flag to the columns for every ray that passed through the flag.
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+        columns : numpy array (see rasterize_walls())
+        flagDistances : array of floats (one for every step-th ray of the fov)
+        step : int
+        """
+        self._rasterize_spans(surface, columns, flagDistances, step, 0.1, FLAG_HEIGHT_DIV,
+                              FLAG_COLOR)
+
+    def rasterize_sprites(self, surface, columns, distances, sprites, pos, leftRay, step=1,
+                          pvs=None):
+        """
+        Add sprites (see sprites.py) inside the fov to the columns. Sprites stand
+        on the floor and are drawn from the farthest to the nearest one. Parts of
+        sprites behind walls (farther than the distance of the ray of the column)
+        aren't drawn. Sprites the potentially visible set says can't be seen
+        aren't even projected.
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+        columns : numpy array (see rasterize_walls())
+        distances : array of floats (distances of walls, one for every step-th
+                    ray of the fov)
+        sprites : Sprites
+        pos : pygame.Vector2 (position of the camera)
+        leftRay : int (first ray of the fov)
+        step : int
+        pvs : PotentiallyVisibleSet or None (see pvs.py)
+        """
+        windowHeight = self.windowSize[1]
+        visibleRays = columns.shape[1]
+        columnAngle = self.rayAngle * step
+        fovAngle = visibleRays * columnAngle
+
+        ids, spriteDistances, angles = sprites.get_visible(
+            pos, leftRay * self.rayAngle, fovAngle, RENDER_DISTANCE, pvs
+        )
+        if not ids.size:
+            return
+
+        # Project sprites (with the same fisheye correction as walls). The ray of
+        # a column goes through the middle of the column.
+        sizes = sprites.get_sizes(ids)
+        depths = spriteDistances * np.cos(angles - (self.fovRays // 2) * self.rayAngle)
+        centers = angles / columnAngle + 0.5
+        halfWidths = np.arctan2(sizes[:, 0] / 2, spriteDistances) / columnAngle
+        firstColumns = np.clip(np.floor(centers - halfWidths), 0, visibleRays).astype(np.intp)
+        lastColumns = np.clip(np.ceil(centers + halfWidths), 0, visibleRays).astype(np.intp)
+        scale = windowHeight * self.distanceToProjection / np.maximum(depths, 0.1)
+        floors = np.minimum(windowHeight // 2 + scale / 2, 2 * windowHeight)
+        tops = np.clip(floors - scale * sizes[:, 1] / BLOCK_SIZE, 0, windowHeight).astype(np.intp)
+        bottoms = np.clip(floors, 0, windowHeight).astype(np.intp)
+
+        # Shade sprites according to distance
+        coefficients = np.minimum(spriteDistances / RENDER_DISTANCE, 1.0)[:, None]
+        shades = (1.0 - coefficients) * sprites.get_colors(ids) + coefficients * CEIL_COLOR
+        shades = self._map_rgb(surface, shades.astype(np.uint8))
+
+        # Walls hide sprites behind them
+        wallDistances = np.asarray(distances[:visibleRays], dtype=float)
+        wallDistances = np.where(np.isnan(wallDistances), np.inf, wallDistances)
+
+        for i in np.argsort(-spriteDistances):
+            first = firstColumns[i]
+            last = lastColumns[i]
+            if first >= last or tops[i] >= bottoms[i]:
+                continue
+            inFront = wallDistances[first:last] > spriteDistances[i]
+            block = columns[tops[i]:bottoms[i], first:last]
+            block[:, inFront] = shades[i]
+
+    def blit_columns(self, surface, columns, step=1):
+        """
+        Write the columns into the surface in one bulk operation, every column
+        pixelsPerRay * step pixels wide. Pixels to the right of the last column
+        get the color of floor and ceiling.
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+        columns : numpy array (see rasterize_walls())
+        step : int
+        """
+        windowWidth = self.windowSize[0]
+        columnWidth = self.pixelsPerRay * step
+        visibleRays = columns.shape[1]
+        fullRays = min(visibleRays, windowWidth // columnWidth)
+
+        if surface.get_bytesize() in (2, 4):
+            pixels = pygame.surfarray.pixels2d(surface)
+        else:
+            pixels = pygame.surfarray.pixels3d(surface)
+        rows = pixels.swapaxes(0, 1)  # Rows are contiguous in memory, columns aren't
+
+        # Every column is repeated columnWidth times. Writing every columnWidth-th
+        # pixel column at once is faster than broadcasting, the innermost loop of
+        # numpy then isn't only columnWidth long.
+        target = rows[:, :fullRays * columnWidth]
+        for offset in range(columnWidth):
+            target[:, offset::columnWidth] = columns[:, :fullRays]
+
+        # Column cut by the edge of the window or space without any columns
+        if fullRays < visibleRays:
+            rows[:, fullRays * columnWidth:] = columns[:, fullRays, None]
+        elif fullRays * columnWidth < windowWidth:
+            rows[:, fullRays * columnWidth:] = self._map_colors(surface)["background"][:, None]
+
+        del target, rows, pixels  # Unlock the surface
+
+    #
+    # Internal methods of the class
+    #
+
+    def _count_visible_rays(self, totalRays, step):
+        """
+        Returns how many of the first totalRays rays have their column (at least
+        partly) inside the window.
+        """
+        columnWidth = self.pixelsPerRay * step
+        return min(totalRays, -(-self.windowSize[0] // columnWidth))
+
+    def _rasterize_spans(self, surface, columns, distances, step, nearDistance, heightDiv,
+                         color):
+        """
+        Compute the vertical span and the shade of the column of every ray and
+        write them into the columns array. Rays with NaN distance are skipped.
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+        columns : numpy array (see rasterize_walls())
+        distances : array of floats (one for every step-th ray of the fov)
+        step : int
+        nearDistance : float (columns closer than this span the whole window)
+        heightDiv : int (columns will be this number times shorter)
+        color : tupple of three ints (shaded according to distance)
+        """
+        windowHeight = self.windowSize[1]
+        visibleRays = columns.shape[1]
+
+        distances = np.asarray(distances[:visibleRays], dtype=float)
+        hit, heights, tops, bottoms = self._column_extents(distances, step, nearDistance,
+                                                           heightDiv)
+        if not hit.any():
+            return
+        distances = np.where(hit, distances, RENDER_DISTANCE)
+
+        # Only rows covered by some column have to be written
+        firstRow = max(0, tops[hit].min())
+        lastRow = min(windowHeight, bottoms[hit].max())
+        if firstRow >= lastRow:
+            return
+        rows = self.rowIndices[firstRow:lastRow, None]
+        mask = (rows >= tops[None, :]) & (rows < bottoms[None, :])
+
+        # Shade columns according to distance
+        colors = self._map_rgb(surface, self._shade(color, distances))
+        if colors.ndim > 1:  # RGB values instead of mapped pixel values
+            mask = mask[:, :, None]
+        np.copyto(columns[firstRow:lastRow], colors[None, :], where=mask)
+
+    def _new_columns(self, colors, visibleRays):
+        """
+        Returns a new array of columns (see rasterize_walls()) with flat floor and
+        ceiling.
+
+        Parameters
+        ----------
+        colors : dictionary (see _map_colors())
+        visibleRays : int
+        """
+        background = colors["background"]
+        columns = np.empty((self.windowSize[1], visibleRays) + background.shape[1:],
+                           dtype=background.dtype)
+        columns[:] = background[:, None]
+        return columns
+
+    def _column_extents(self, distances, step, nearDistance, heightDiv):
+        """
+        Returns a tupple of arrays (hit, heights, tops, bottoms) with the height
+        (with fisheye correction) and the first and the last (excluding) row of
+        the column of every ray. Rays with NaN distance didn't hit and have zero
+        height.
+
+        Parameters
+        ----------
+        distances : array of floats (one for every step-th ray of the fov)
+        step : int
+        nearDistance : float (columns closer than this span the whole window)
+        heightDiv : int (columns will be this number times shorter)
+        """
+        windowHeight = self.windowSize[1]
+        hit = ~np.isnan(distances)
+        distances = np.where(hit, distances, RENDER_DISTANCE)
+
+        near = np.abs(distances) < nearDistance
+        scale = self.distanceToProjection / heightDiv / np.where(near, 1.0, distances)
+        heights = self.columnHeights[:distances.size * step:step] * np.where(near, 1.0, scale)
+        heights = np.where(hit, np.minimum(heights, 2 * windowHeight), 0.0)
+        tops = (windowHeight // 2 - np.floor(heights / 2)).astype(np.intp)
+        bottoms = tops + np.trunc(heights).astype(np.intp)
+        return hit, heights, tops, bottoms
+
+    def _map_colors(self, surface):
+        """
+        Returns a dictionary with the background (color of every row) and shades
+        of wall and flag converted to pixel values in the format of the surface
+        (and the scaler of wall texture columns and shaded floor and ceiling
+        textures if there are textures). Surfaces that pygame.surfarray.pixels2d()
+        doesn't support get RGB values. Results are cached for every pixel
+        format.
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+        """
+        key = (surface.get_bitsize(), surface.get_shifts(), surface.get_losses(),
+               surface.get_masks())
+        if not key in self.mappedColors:
+            background = np.empty((self.windowSize[1], 3), dtype=np.uint8)
+            background[:self.windowSize[1] // 2] = CEIL_COLOR
+            background[self.windowSize[1] // 2:] = FLOOR_COLOR
+            colors = {
+                "background": background
+            }
+
+            for name, rgb in colors.items():
+                colors[name] = self._map_rgb(surface, rgb)
+
+            # Shaded texture mip levels (those of walls scaled to heights of
+            # columns on demand)
+            if not self.texture is None:
+                colors["wallTexture"] = ColumnScaler(self._map_mips(surface, self.texture))
+            if not self.floorTexture is None:
+                colors["floorTexture"] = self._map_mips(surface, self.floorTexture)
+            if not self.ceilingTexture is None:
+                colors["ceilingTexture"] = self._map_mips(surface, self.ceilingTexture)
+
+            self.mappedColors[key] = colors
+        return self.mappedColors[key]
+
+    @classmethod
+    def _map_mips(cls, surface, texture):
+        """
+        Returns shaded mip levels of the texture (see
+        WallTexture.get_shaded_mips()) converted to pixel values in the format of
+        the surface.
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+        texture : WallTexture
+        """
+        shadedMips = []
+        for mip in texture.get_shaded_mips(CEIL_COLOR):
+            mapped = cls._map_rgb(surface, mip.reshape(-1, 3))
+            shape = mip.shape if mapped.ndim == 2 else mip.shape[:-1]
+            shadedMips.append(mapped.reshape(shape))
+        return shadedMips
+
+    @staticmethod
+    def _map_rgb(surface, rgb):
+        """
+        Returns RGB colors converted to pixel values in the format of the surface
+        (see _map_colors()).
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+        rgb : NumPy array of uint8 of shape (n, 3)
+        """
+        if not surface.get_bytesize() in (2, 4):
+            return rgb
+
+        shifts = surface.get_shifts()
+        losses = surface.get_losses()
+        dtype = np.uint32 if surface.get_bytesize() == 4 else np.uint16
+        mapped = np.full(rgb.shape[0], surface.get_masks()[3], dtype=np.uint32)
+        for channel in range(3):
+            mapped |= (rgb[:, channel].astype(np.uint32) >> losses[channel]) << shifts[channel]
+        return mapped.astype(dtype)
+
+    @staticmethod
+    def _shade(color, distances):
+        """
+        Returns an array of shape (n, 3) of uint8 containing the color blended
+        with the ceiling color according to every distance (the farther, the
+        darker), truncated to whole color levels like pygame.draw.rect() does.
+
+        Parameters
+        ----------
+        color : tupple of three ints
+        distances : array of floats
+        """
+        coefficients = np.clip(distances / RENDER_DISTANCE, 0.0, 1.0)
+        shades = np.outer(1.0 - coefficients, color) + np.outer(coefficients, CEIL_COLOR)
+        return shades.astype(np.uint8)
@@ -0,0 +1,70 @@
+"""
+Contains logic for dynamic resolution scaling.
+"""
+
+from collections import deque
+
+
+class ResolutionScaler:
+    """
+    Chooses how many rays of the fov should be cast in each frame based on how long
+    the recent frames took. Resolution is changed by casting only every step-th ray
+    of the fov (and drawing correspondingly wider columns), so the ray tables of
+    Raycasting don't have to be rebuilt.
+    """
+
+    def __init__(self, fovRays, targetFps, minRays=50, window=30):
+        """
+        Parameters
+        ----------
+        fovRays : int
+        targetFps : int
+        minRays : int (never cast fewer rays than this)
+        window : int (how many recent frames to take into account)
+        """
+        self.frameBudget = 1000 / targetFps  # In milliseconds
+        self.frameTimes = deque(maxlen=window)
+
+        # Allowed steps, finest resolution first. Only steps that divide the fov
+        # evenly, so that the columns cover the whole window.
+        self.steps = []
+        step = 1
+        while fovRays // step >= minRays:
+            if fovRays % step == 0:
+                self.steps.append(step)
+            step *= 2
+        if not self.steps:
+            self.steps.append(1)
+
+        self.stepIndex = 0  # Full resolution until frames miss the budget
+
+    def get_step(self):
+        """
+        Returns the current step (cast every step-th ray).
+        """
+        return self.steps[self.stepIndex]
+
+    def update(self, frameTime):
+        """
+        Record how long the last frame took to compute (without waiting for the
+        next frame) and change resolution if needed. Returns the new step.
+
+        Parameters
+        ----------
+        frameTime : float (milliseconds)
+        """
+        self.frameTimes.append(frameTime)
+        if len(self.frameTimes) < self.frameTimes.maxlen:
+            return self.get_step()
+
+        average = sum(self.frameTimes) / len(self.frameTimes)
+        if average > self.frameBudget and self.stepIndex < len(self.steps) - 1:
+            # Too slow, lower the resolution
+            self.stepIndex += 1
+            self.frameTimes.clear()
+        elif average < self.frameBudget * 0.4 and self.stepIndex > 0:
+            # Plenty of spare time (a finer step costs about twice as much)
+            self.stepIndex -= 1
+            self.frameTimes.clear()
+
+        return self.get_step()
@@ -0,0 +1,229 @@
+"""
+Contains sprites: objects in the level (the flag, items, markers, other players)
+drawn as billboards, flat pictures always facing the camera. Rays don't look for
+sprites, so sprites cost nothing while casting and drawing them costs only as much
+as there are sprites near the camera.
+"""
+
+from math import pi
+
+import numpy as np
+
+
+#
+# Constants
+#
+
+SPATIAL_CELL_BLOCKS = 8  # Cells of the spatial hash are this number of blocks wide and high
+
+
+#
+# Classes
+#
+
+class Sprites:
+    """
+    Keeps all sprites of a level. Every sprite has a position (of its center on
+    the floor, in units), a width and a height (in units) and a color.
+
+    Sprites are indexed by a spatial hash: the level is split into square cells
+    and every cell knows which sprites are inside. Looking sprites up around the
+    camera then only goes through nearby cells, no matter how many sprites the
+    level has.
+    """
+
+    def __init__(self, blockSize, cellBlocks=SPATIAL_CELL_BLOCKS):
+        """
+        Parameters
+        ----------
+        blockSize : int
+        cellBlocks : int (how many blocks wide and high are cells of the hash)
+        """
+        self.blockSize = blockSize
+        self.cellSize = blockSize * cellBlocks
+
+        # Properties of sprites indexed by sprite id
+        self.positions = np.zeros((0, 2))
+        self.sizes = np.zeros((0, 2))  # Width and height
+        self.colors = np.zeros((0, 3), dtype=np.uint8)
+
+        self.cells = {}        # (cellX, cellY) -> set of ids of sprites in the cell
+        self.spriteCells = {}  # Id of every existing sprite -> its cell
+        self.freeIds = []      # Ids of removed sprites, reused by add()
+        self.changed = False   # See pop_changed()
+
+    def add(self, pos, width, height, color):
+        """
+        Add a sprite. Returns its id.
+
+        Parameters
+        ----------
+        pos : pygame.Vector2 or tupple of two floats
+        width : float
+        height : float
+        color : tupple of three ints
+        """
+        if self.freeIds:
+            spriteId = self.freeIds.pop()
+        else:
+            spriteId = self.positions.shape[0]
+            self._grow(spriteId + 1)
+
+        self.positions[spriteId] = (pos[0], pos[1])
+        self.sizes[spriteId] = (width, height)
+        self.colors[spriteId] = color
+        self._insert(spriteId)
+        self.changed = True
+        return spriteId
+
+    def remove(self, spriteId):
+        """
+        Remove a sprite.
+
+        Parameters
+        ----------
+        spriteId : int
+        """
+        self._discard(spriteId)
+        self.freeIds.append(spriteId)
+        self.changed = True
+
+    def move(self, spriteId, pos):
+        """
+        Move a sprite to a new position.
+
+        Parameters
+        ----------
+        spriteId : int
+        pos : pygame.Vector2 or tupple of two floats
+        """
+        self._discard(spriteId)
+        self.positions[spriteId] = (pos[0], pos[1])
+        self._insert(spriteId)
+        self.changed = True
+
+    def get_count(self):
+        """
+        Returns how many sprites there are.
+        """
+        return len(self.spriteCells)
+
+    def pop_changed(self):
+        """
+        Returns True if sprites were added, removed or moved since the last call
+        of this method.
+        """
+        changed = self.changed
+        self.changed = False
+        return changed
+
+    def query(self, pos, radius):
+        """
+        Returns ids of sprites in the cells of the spatial hash overlapping the
+        square with the given center and half of width (so also some sprites
+        farther than radius) as a NumPy array.
+
+        Parameters
+        ----------
+        pos : pygame.Vector2
+        radius : float
+        """
+        firstX = int((pos.x - radius) // self.cellSize)
+        lastX = int((pos.x + radius) // self.cellSize)
+        firstY = int((pos.y - radius) // self.cellSize)
+        lastY = int((pos.y + radius) // self.cellSize)
+
+        found = []
+        if (lastX - firstX + 1) * (lastY - firstY + 1) <= len(self.cells):
+            for cellX in range(firstX, lastX + 1):
+                for cellY in range(firstY, lastY + 1):
+                    if (cellX, cellY) in self.cells:
+                        found.extend(self.cells[(cellX, cellY)])
+        else:
+            # Fewer cells have sprites than the square covers
+            for (cellX, cellY), ids in self.cells.items():
+                if firstX <= cellX <= lastX and firstY <= cellY <= lastY:
+                    found.extend(ids)
+        return np.array(found, dtype=np.intp)
+
+    def get_visible(self, pos, leftAngle, fovAngle, maxDistance, pvs=None):
+        """
+        Returns sprites at least partly inside the fov and not farther than
+        maxDistance from pos in a tupple of arrays (ids, distances, angles), where
+        angles are measured from the left edge of the fov (in radians). If a
+        potentially visible set is given, sprites in blocks that can't be seen
+        from the block of pos are left out.
+
+        Parameters
+        ----------
+        pos : pygame.Vector2
+        leftAngle : float (angle of the left edge of the fov in radians)
+        fovAngle : float (in radians)
+        maxDistance : float
+        pvs : PotentiallyVisibleSet or None (see pvs.py)
+        """
+        ids = self.query(pos, maxDistance)
+        if not pvs is None and ids.size:
+            blocks = self.positions[ids] // self.blockSize
+            ids = ids[pvs.are_visible(int(pos.x // self.blockSize), int(pos.y // self.blockSize),
+                                      blocks[:, 0], blocks[:, 1])]
+        relativeX = self.positions[ids, 0] - pos.x
+        relativeY = self.positions[ids, 1] - pos.y
+        distances = np.hypot(relativeX, relativeY)
+
+        # Angle from the middle of the fov in range <-pi, pi)
+        angles = np.arctan2(relativeY, relativeX) - leftAngle - fovAngle / 2
+        angles = (angles + pi) % (2 * pi) - pi
+        halfWidths = np.arctan2(self.sizes[ids, 0] / 2, distances)
+
+        visible = (np.abs(angles) - halfWidths < fovAngle / 2) & \
+                  (distances <= maxDistance) & (distances > 0)
+        return ids[visible], distances[visible], angles[visible] + fovAngle / 2
+
+    def get_sizes(self, ids):
+        """
+        Returns an array of shape (n, 2) with width and height of the sprites.
+        """
+        return self.sizes[ids]
+
+    def get_colors(self, ids):
+        """
+        Returns an array of shape (n, 3) with colors of the sprites.
+        """
+        return self.colors[ids]
+
+    #
+    # Internal methods of the class
+    #
+
+    def _grow(self, count):
+        """
+        Make the property arrays hold at least count sprites. Capacity is
+        doubled, so that adding many sprites takes linear time.
+        """
+        capacity = self.positions.shape[0]
+        if count <= capacity:
+            return
+        newCapacity = max(count, 2 * capacity)
+        self.positions = np.resize(self.positions, (newCapacity, 2))
+        self.sizes = np.resize(self.sizes, (newCapacity, 2))
+        self.colors = np.resize(self.colors, (newCapacity, 3))
+        self.freeIds.extend(range(newCapacity - 1, count - 1, -1))
+
+    def _insert(self, spriteId):
+        """
+        Put the sprite into the cell of its position.
+        """
+        cell = (int(self.positions[spriteId, 0] // self.cellSize),
+                int(self.positions[spriteId, 1] // self.cellSize))
+        self.cells.setdefault(cell, set()).add(spriteId)
+        self.spriteCells[spriteId] = cell
+
+    def _discard(self, spriteId):
+        """
+        Take the sprite out of its cell.
+        """
+        cell = self.spriteCells.pop(spriteId)
+        self.cells[cell].discard(spriteId)
+        if not self.cells[cell]:
+            del self.cells[cell]
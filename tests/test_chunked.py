@@ -0,0 +1,70 @@
+import numpy as np
+from pygame import Vector2
+
+from level import Level
+from chunked import ChunkedLevel, convert_level
+from backends import NumpyRaycasting, DDARaycasting, BACKEND_ENVIRONMENT_VARIABLE, create_raycasting
+
+
+CHUNK_SIZE = 8
+
+
+def write_level(path, blankRows):
+    """
+    Write a random 20 x 24 level with the given rows left blank.
+    """
+    rng = np.random.default_rng(0)
+    width, height = 20, 24
+    rows = []
+    for y in range(height):
+        if y in blankRows:
+            rows.append("")
+            continue
+        row = ["w" if rng.random() < 0.2 else "." for x in range(width)]
+        if y == 1:
+            row[1] = "p"
+        if y == height - 2:
+            row[width - 2] = "f"
+        rows.append(" ".join(row))
+    path.write_text("%d %d\n%s\n" % (width, height, "\n".join(rows)))
+
+
+def test_blank_line_at_band_boundary(tmp_path):
+    levelFile = tmp_path / "blank.lvl"
+    chunkFile = tmp_path / "blank.lvlc"
+    write_level(levelFile, blankRows={CHUNK_SIZE - 1, 2 * CHUNK_SIZE - 1, 10})
+    convert_level(str(levelFile), str(chunkFile), CHUNK_SIZE)
+
+    level = Level(str(levelFile))
+    chunked = ChunkedLevel(str(chunkFile))
+    try:
+        x, y = np.meshgrid(np.arange(-1, 21), np.arange(-1, 25), indexing="ij")
+        assert (chunked.get_blocks(x, y) == level.get_blocks(x, y)).all()
+        assert chunked.get_start_block() == level.get_start_block()
+        assert chunked.get_flag_block() == level.get_flag_block()
+
+        for backend in (NumpyRaycasting, DDARaycasting):
+            expected = backend(600, 64, level)
+            actual = backend(600, 64, chunked)
+            for pos in (Vector2(96, 96), Vector2(640, 800), Vector2(1100, 1400)):
+                for result, expectedResult in zip(actual.cast_fov(0, 599, pos),
+                                                  expected.cast_fov(0, 599, pos)):
+                    assert np.array_equal(result, expectedResult, equal_nan=True)
+    finally:
+        chunked.close()
+
+
+def test_parallel_backend_falls_back_for_chunked_level(tmp_path, monkeypatch):
+    levelFile = tmp_path / "level.lvl"
+    chunkFile = tmp_path / "level.lvlc"
+    write_level(levelFile, blankRows=set())
+    convert_level(str(levelFile), str(chunkFile), CHUNK_SIZE)
+    monkeypatch.delenv(BACKEND_ENVIRONMENT_VARIABLE, raising=False)
+
+    chunked = ChunkedLevel(str(chunkFile))
+    try:
+        raycasting = create_raycasting("parallel", 600, 64, chunked)
+        assert type(raycasting) is NumpyRaycasting
+        raycasting.cast_fov(0, 100, Vector2(96, 96))
+    finally:
+        chunked.close()
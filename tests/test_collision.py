@@ -0,0 +1,72 @@
+from pygame import Vector2
+
+from level import Level
+from collision import Collision, PLAYER_RADIUS
+
+
+BLOCK_SIZE = 64
+LEVEL = """7 6
+w w w w w w w
+w . . . . . w
+w . p . w . w
+w . . . . . .
+w . . f . . w
+w w w w w w w
+"""
+
+
+def create_collision(tmp_path):
+    levelFile = tmp_path / "collision.lvl"
+    levelFile.write_text(LEVEL)
+    return Collision(Level(str(levelFile)), BLOCK_SIZE)
+
+
+def test_slides_along_wall(tmp_path):
+    collision = create_collision(tmp_path)
+
+    # Diagonally into the top wall: stops in y, keeps moving in x
+    pos = collision.move(Vector2(160, 96), Vector2(20, -40))
+    assert pos.x == 180
+    assert abs(pos.y - (BLOCK_SIZE + PLAYER_RADIUS)) < 1e-3
+    assert not collision.is_blocked(pos)
+
+    # Diagonally into the left wall: stops in x, keeps moving in y
+    pos = collision.move(Vector2(96, 160), Vector2(-40, 20))
+    assert abs(pos.x - (BLOCK_SIZE + PLAYER_RADIUS)) < 1e-3
+    assert pos.y == 180
+
+
+def test_stops_in_corner(tmp_path):
+    collision = create_collision(tmp_path)
+    pos = collision.move(Vector2(96, 96), Vector2(-40, -40))
+    assert abs(pos.x - (BLOCK_SIZE + PLAYER_RADIUS)) < 1e-3
+    assert abs(pos.y - (BLOCK_SIZE + PLAYER_RADIUS)) < 1e-3
+    assert not collision.is_blocked(pos)
+
+    # The corner of a lone wall block stops a hitbox that only overlaps it
+    # by a few units
+    pos = collision.move(Vector2(4 * BLOCK_SIZE - PLAYER_RADIUS + 4, 100), Vector2(0, 60))
+    assert abs(pos.y - (2 * BLOCK_SIZE - PLAYER_RADIUS)) < 1e-3
+
+
+def test_no_tunnelling_at_high_speed(tmp_path):
+    collision = create_collision(tmp_path)
+
+    # Much further than a block in one step, the wall at (4, 2) is in the way
+    pos = collision.move(Vector2(160, 160), Vector2(1000, 0))
+    assert abs(pos.x - (4 * BLOCK_SIZE - PLAYER_RADIUS)) < 1e-3
+    pos = collision.move(Vector2(160, 96), Vector2(0, 1000))
+    assert abs(pos.y - (5 * BLOCK_SIZE - PLAYER_RADIUS)) < 1e-3
+    pos = collision.move(Vector2(352, 352), Vector2(-1000, -1000))
+    assert not collision.is_blocked(pos)
+    assert pos.x > BLOCK_SIZE and pos.y > BLOCK_SIZE
+
+
+def test_outside_of_level_is_not_solid(tmp_path):
+    collision = create_collision(tmp_path)
+
+    # Through the gap at (6, 3) and out of the level
+    pos = collision.move(Vector2(352, 224), Vector2(200, 0))
+    assert pos.x == 552
+    assert not collision.is_blocked(pos)
+    assert not collision.is_blocked(Vector2(-500, -500))
@@ -0,0 +1,31 @@
+import os
+
+import numpy as np
+
+import compiled
+from level import Level
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_load_level_matches_text_level(tmp_path):
+    levelFile = os.path.join(ROOT, "4.lvl")
+    expected = Level(levelFile)
+    for i in range(2):  # Compiled, then cached
+        level = compiled.load_level(levelFile, cacheDir=str(tmp_path))
+        assert np.array_equal(level.get_grid(), expected.get_grid())
+        assert np.array_equal(level.get_distance_field(), expected.get_distance_field())
+        assert level.get_start_block() == expected.get_start_block()
+        assert level.get_flag_block() == expected.get_flag_block()
+
+
+def test_load_level_recompiles_other_version(tmp_path, monkeypatch):
+    levelFile = os.path.join(ROOT, "4.lvl")
+    compiled.load_level(levelFile, cacheDir=str(tmp_path))
+
+    # A cached level of an older version must not be loaded by a newer one
+    monkeypatch.setattr(compiled, "VERSION", compiled.VERSION + 1)
+    level = compiled.load_level(levelFile, cacheDir=str(tmp_path))
+    assert np.array_equal(level.get_grid(), Level(levelFile).get_grid())
+    assert len(os.listdir(str(tmp_path))) == 2
@@ -0,0 +1,62 @@
+import numpy as np
+from pygame import Vector2
+
+from level import Level
+from raycasting import Raycasting
+from backends import NumpyRaycasting
+from effects import CataclysmEffect
+
+
+LEVEL = """9 7
+w w w w w w w w w
+w . . . . . . . w
+w . p . . . w . w
+w . . . f . . . w
+w . . . . . w . w
+w . . . . . . . w
+w w w w w w w w w
+"""
+
+
+def test_cataclysm_matches_messed_up_rays(tmp_path):
+    levelFile = tmp_path / "flag.lvl"
+    levelFile.write_text(LEVEL)
+    level = Level(str(levelFile))
+
+    for backend in (Raycasting, NumpyRaycasting):
+        raycasting = backend(600, 64, level)
+        effect = CataclysmEffect(600, 0.0, seed=0)
+        effect.codes[:] = np.random.default_rng(0).integers(0, 4, 600)
+
+        # The flag is seen across both vertical and horizontal grid lines by
+        # rays of every code
+        seen = set()
+        for pos in (Vector2(160, 160), Vector2(96, 224), Vector2(352, 96)):
+            for startRay in range(0, 600, 100):
+                endRay = (startRay + 120) % 600
+                rays = raycasting.ray_range(startRay, endRay)
+                expected = raycasting.cast_fov(startRay, endRay, pos, list(effect.codes))
+                actual = effect.apply(rays, *raycasting.cast_fov_axes(startRay, endRay, pos))
+                for result, expectedResult in zip(actual, expected):
+                    assert np.array_equal(result, expectedResult, equal_nan=True)
+                seen.update(effect.codes[rays][~np.isnan(expected[2])].tolist())
+        assert {0, 1, 2} <= seen
+
+
+def test_cataclysm_speed_does_not_depend_on_update_length():
+    for frames, updates in ((1.0, 2), (0.25, 8)):
+        effect = CataclysmEffect(100000, 0.0, seed=0)
+        effect.start()
+        effect.strength = 0.2
+        for i in range(updates):
+            effect.update(frames)
+
+        # Every frame each of the three codes is rolled with probability 0.2
+        untouched = np.mean(effect.codes == 0)
+        assert abs(untouched - 0.8 ** 6) < 0.01
+
+    effect = CataclysmEffect(600, 0.1, seed=0)
+    effect.start()
+    for i in range(4):
+        effect.update(0.25)
+    assert abs(effect.get_strength() - 0.1) < 1e-9
@@ -0,0 +1,40 @@
+import numpy as np
+from pygame import Vector2
+
+from level import Level
+from headless import HeadlessRenderer
+from renderer import CEIL_COLOR, FLAG_COLOR
+
+
+LEVEL = """9 5
+w w w w w w w w w
+w . . . . . . . w
+w p . . . f . . w
+w . . . . . . . w
+w w w w w w w w w
+"""
+
+
+def test_flag_is_drawn_as_sprite(tmp_path):
+    levelFile = tmp_path / "flag.lvl"
+    levelFile.write_text(LEVEL)
+    headless = HeadlessRenderer(Level(str(levelFile)), (400, 300), 600, 60)
+    try:
+        # Look along the x axis at the flag three blocks away
+        raycasting = headless.get_raycasting()
+        middleRay = int(np.argmax(raycasting.rayVectorArray[:, 0]))
+        frame, depth = headless.render(Vector2(160, 160), middleRay)
+
+        # The flag doesn't hide the wall behind it, its sprite stands on the
+        # floor (under the horizon) instead of floating around it
+        assert np.isclose(depth[200], 8 * 64 - 160, atol=1.0)
+        distance = 5 * 64 + 32 - 160
+        coefficient = distance / (10 * 64)
+        shade = ((1.0 - coefficient) * np.array(FLAG_COLOR) +
+                 coefficient * np.array(CEIL_COLOR)).astype(np.uint8)
+        rows, columns = np.nonzero((frame == shade).all(axis=2))
+        assert rows.size
+        assert rows.min() >= 150 - 1 and rows.max() > 150 + 10
+        assert abs(columns.mean() - 200) < 5
+    finally:
+        headless.close()
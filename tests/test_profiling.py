@@ -0,0 +1,21 @@
+import json
+
+from profiling import FrameProfiler
+
+
+def test_export_stage_without_traced_frames(tmp_path):
+    profiler = FrameProfiler(maxTraceFrames=1)
+    profiler.start_frame()
+    profiler.mark("cast")
+    profiler.end_frame()
+
+    # The trace is full, the new stage is only in the recent frames
+    profiler.start_frame()
+    profiler.mark("floor")
+    profiler.end_frame()
+
+    path = tmp_path / "trace.json"
+    profiler.export(str(path))
+    summary = json.loads(path.read_text())["summary"]
+    assert summary["cast"]["mean"] is not None
+    assert summary["floor"] == {"p50": None, "p95": None, "p99": None, "mean": None}
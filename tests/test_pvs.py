@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+from pygame import Vector2
+
+from level import Level, WALL
+from compiled import load_level
+from backends import NumpyRaycasting
+from pvs import PotentiallyVisibleSet, build_pvs, save_pvs, load_pvs_file
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def write_level(tmp_path, width=12, height=10):
+    """
+    Write a random level with 30 % of walls.
+    """
+    rng = np.random.default_rng(0)
+    rows = [["w" if rng.random() < 0.3 else "." for x in range(width)] for y in range(height)]
+    rows[0][0] = "p"
+    rows[-1][-1] = "f"
+    levelFile = tmp_path / "small.lvl"
+    levelFile.write_text("%d %d\n%s\n" % (width, height, "\n".join(map(" ".join, rows))))
+    return Level(str(levelFile))
+
+
+def seen_by_sampling(grid, x, y, radius, points=4, rays=1440, samples=8):
+    """
+    Returns the blocks (relative to x, y) seen from the block at x, y by dense
+    straight lines, up to the first wall (or the outside) including it.
+    """
+    width, height = grid.shape
+    coords = (np.arange(points) + 0.5) / points
+    pointsX, pointsY = np.meshgrid(x + coords, y + coords)
+    angles = np.arange(rays) * 2 * np.pi / rays
+    lengths = np.arange(radius * samples + 1) / samples
+    blocksX = np.floor(pointsX.reshape(-1, 1, 1) +
+                       np.cos(angles)[None, :, None] * lengths).astype(int).reshape(-1, lengths.size)
+    blocksY = np.floor(pointsY.reshape(-1, 1, 1) +
+                       np.sin(angles)[None, :, None] * lengths).astype(int).reshape(-1, lengths.size)
+    inside = (blocksX >= 0) & (blocksX < width) & (blocksY >= 0) & (blocksY < height)
+    solid = ~inside | ((grid[np.clip(blocksX, 0, width - 1),
+                             np.clip(blocksY, 0, height - 1)] & WALL) != 0)
+    before = (np.cumsum(solid, axis=1) - solid) == 0
+    near = (np.abs(blocksX - x) <= radius) & (np.abs(blocksY - y) <= radius)
+    return set(zip((blocksX - x)[before & near].tolist(), (blocksY - y)[before & near].tolist()))
+
+
+def test_are_visible_bit_order():
+    radius = 2
+    side = 2 * radius + 1
+    windows = np.zeros((3, 2, side * side), dtype=bool)
+    windows[1, 0, (radius + 2) * side + radius - 1] = True  # Block (3, -1) from (1, 0)
+    windows[1, 0, 0] = True                                  # Block (-1, -2)
+    pvs = PotentiallyVisibleSet(np.packbits(windows, axis=2), radius)
+
+    toX, toY = np.meshgrid(np.arange(-3, 6), np.arange(-4, 4), indexing="ij")
+    visible = pvs.are_visible(1, 0, toX, toY)
+    assert sorted(zip(toX[visible].tolist(), toY[visible].tolist())) == [(-1, -2), (3, -1)]
+    assert pvs.get_visible_blocks(1, 0)[radius + 2, radius - 1]
+    assert pvs.are_visible(-1, 0, toX, toY).all()  # Camera outside of the level
+
+
+def test_save_and_load(tmp_path):
+    pvs = build_pvs(write_level(tmp_path), radius=3, workers=1)
+    pvsFile = str(tmp_path / "small.pvs")
+    save_pvs(pvs, pvsFile)
+    loaded = load_pvs_file(pvsFile)
+    assert loaded.get_radius() == 3
+    assert np.array_equal(loaded.bits, pvs.bits)
+
+
+def test_pvs_is_conservative(tmp_path):
+    level = write_level(tmp_path)
+    radius = 5
+    pvs = build_pvs(level, radius, workers=1)
+    grid = level.get_grid()[1:-1, 1:-1]
+    width, height = grid.shape
+    for x in range(width):
+        for y in range(height):
+            if grid[x, y] & WALL:
+                continue
+            seen = seen_by_sampling(grid, x, y, radius)
+            toX, toY = np.array(sorted(seen)).T
+            assert pvs.are_visible(x, y, x + toX, y + toY).all()
+
+
+def test_pvs_limited_rays_match(tmp_path):
+    level = load_level(os.path.join(ROOT, "4.lvl"), cacheDir=str(tmp_path))
+    pvs = build_pvs(level, workers=1)
+    expected = NumpyRaycasting(600, 64, level)
+    actual = NumpyRaycasting(600, 64, level)
+    actual.set_pvs(pvs)
+
+    width, height = map(int, level.get_size())
+    rng = np.random.default_rng(0)
+    for i in range(30):
+        x, y = rng.random() * width, rng.random() * height
+        if level.is_wall_at(int(x), int(y)):
+            continue
+        pos = Vector2(x * 64, y * 64)
+        for result, expectedResult in zip(actual.cast_fov(0, 599, pos),
+                                          expected.cast_fov(0, 599, pos)):
+            assert np.array_equal(result, expectedResult, equal_nan=True)
+    assert actual.pop_traversal_counts()[1] < expected.pop_traversal_counts()[1]
@@ -0,0 +1,147 @@
+import glob
+import os
+
+import numpy as np
+from pygame import Vector2
+
+from level import Level
+from raycasting import Raycasting
+from backends import NumpyRaycasting, DDARaycasting, ParallelRaycasting
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEVELS = sorted(glob.glob(os.path.join(ROOT, "*.lvl")))
+TOTAL_RAYS = 600
+BLOCK_SIZE = 64
+TOLERANCE = 1e-6  # Largest tolerated difference from the reference in units
+
+
+def camera_positions(level, count, seed=0):
+    """
+    Returns random positions outside of walls, every other one within half a
+    unit of a block corner, so that many rays pass corners closely.
+    """
+    width, height = map(int, level.get_size())
+    rng = np.random.default_rng(seed)
+    positions = []
+    while len(positions) < count:
+        x, y = rng.random() * width, rng.random() * height
+        if len(positions) % 2:
+            x = round(x) + rng.uniform(-0.5, 0.5) / BLOCK_SIZE
+            y = round(y) + rng.uniform(-0.5, 0.5) / BLOCK_SIZE
+        if 0 <= x < width and 0 <= y < height and not level.is_wall_at(int(x), int(y)):
+            positions.append(Vector2(x * BLOCK_SIZE, y * BLOCK_SIZE))
+    return positions
+
+
+def cast_reference(raycasting, pos):
+    """
+    Returns results of the reference cast_rays() (see cast_fov()) for every ray
+    but the last one (a range can't contain all of them).
+    """
+    return Raycasting.cast_fov(raycasting, 0, TOTAL_RAYS - 2, pos)
+
+
+def create_backends(level):
+    """
+    Returns the backends to check against the reference. The parallel one casts
+    even a small number of rays on two workers.
+    """
+    return [NumpyRaycasting(TOTAL_RAYS, BLOCK_SIZE, level),
+            DDARaycasting(TOTAL_RAYS, BLOCK_SIZE, level),
+            ParallelRaycasting(TOTAL_RAYS, BLOCK_SIZE, level, workers=2, minParallelRays=1)]
+
+
+def assert_equal_results(actual, expected):
+    for result, expectedResult in zip(actual, expected):
+        assert np.allclose(result, expectedResult, rtol=0.0, atol=TOLERANCE, equal_nan=True)
+
+
+def test_cast_ray_dda_matches_reference():
+    for levelFile in LEVELS:
+        level = Level(levelFile)
+        raycasting = NumpyRaycasting(TOTAL_RAYS, BLOCK_SIZE, level)
+        for pos in camera_positions(level, 4):
+            results = [np.full(TOTAL_RAYS - 1, np.nan), np.full((TOTAL_RAYS - 1, 2), np.nan),
+                       np.full(TOTAL_RAYS - 1, np.nan)]
+            for ray in range(TOTAL_RAYS - 1):
+                for result, value in zip(results, raycasting.cast_ray_dda(ray, pos)):
+                    if not value is None:
+                        result[ray] = value
+            assert_equal_results(results, cast_reference(raycasting, pos))
+
+            # Single rays of the backend are cast the same way
+            for ray in range(0, TOTAL_RAYS - 1, 37):
+                distance = raycasting.distance_to_wall(ray, pos)
+                expected = Raycasting.distance_to_wall(raycasting, ray, pos)
+                assert (distance is None) == (expected is None)
+                assert distance is None or abs(distance - expected) <= TOLERANCE
+
+
+def test_cast_rays_batch_matches_reference():
+    for levelFile in LEVELS:
+        level = Level(levelFile)
+        raycasting = Raycasting(TOTAL_RAYS, BLOCK_SIZE, level)
+        rng = np.random.default_rng(0)
+        for pos in camera_positions(level, 2):
+            startRay = int(rng.integers(TOTAL_RAYS))
+            endRay = (startRay + 150) % TOTAL_RAYS
+            messUpRays = rng.integers(0, 4, TOTAL_RAYS).tolist()
+            for step in (1, 3):
+                assert_equal_results(raycasting.cast_rays_batch(startRay, endRay, pos, step=step),
+                                     raycasting.cast_fov(startRay, endRay, pos, step=step))
+            assert_equal_results(raycasting.cast_rays_batch(startRay, endRay, pos, messUpRays),
+                                 raycasting.cast_fov(startRay, endRay, pos, messUpRays))
+
+
+def test_backends_match_reference():
+    for levelFile in (os.path.join(ROOT, "4.lvl"), os.path.join(ROOT, "5.lvl")):
+        level = Level(levelFile)
+        reference = Raycasting(TOTAL_RAYS, BLOCK_SIZE, level)
+        positions = camera_positions(level, 4)
+        expected = [cast_reference(reference, pos) for pos in positions]
+        expectedAxes = [reference.cast_fov_axes(550, 49, pos, step=2) for pos in positions]
+        cameras = np.array([(pos.x, pos.y) for pos in positions])
+        middleRays = np.array([0, 150, 300, 450])
+        expectedViews = reference.cast_views(cameras, middleRays, 100, step=3)
+
+        for raycasting in create_backends(level):
+            try:
+                for pos, expectedResults, expectedAxesResults in zip(positions, expected,
+                                                                     expectedAxes):
+                    assert_equal_results(raycasting.cast_fov(0, TOTAL_RAYS - 2, pos),
+                                         expectedResults)
+                    for results, expectedResults in zip(
+                            raycasting.cast_fov_axes(550, 49, pos, step=2), expectedAxesResults):
+                        assert_equal_results(results, expectedResults)
+                assert_equal_results(raycasting.cast_views(cameras, middleRays, 100, step=3),
+                                     expectedViews)
+            finally:
+                raycasting.close()
+
+
+def test_cast_ray_dda_skips_empty_space(tmp_path):
+    # Open level, most rays cross many empty blocks
+    rows = [["."] * 30 for y in range(30)]
+    for x, y in ((5, 5), (20, 8), (12, 22), (25, 25), (3, 17)):
+        rows[y][x] = "w"
+    rows[15][15] = "p"
+    rows[10][12] = "f"
+    levelFile = tmp_path / "open.lvl"
+    levelFile.write_text("30 30\n%s\n" % "\n".join(map(" ".join, rows)))
+    level = Level(str(levelFile))
+
+    raycasting = NumpyRaycasting(TOTAL_RAYS, BLOCK_SIZE, level, renderDistance=20)
+    reference = Raycasting(TOTAL_RAYS, BLOCK_SIZE, level, renderDistance=20)
+    for pos in camera_positions(level, 4):
+        results = [np.full(TOTAL_RAYS - 1, np.nan), np.full((TOTAL_RAYS - 1, 2), np.nan),
+                   np.full(TOTAL_RAYS - 1, np.nan)]
+        for ray in range(TOTAL_RAYS - 1):
+            for result, value in zip(results, raycasting.cast_ray_dda(ray, pos)):
+                if not value is None:
+                    result[ray] = value
+        assert_equal_results(results, cast_reference(reference, pos))
+
+    # Far fewer lines are checked than the reference checks
+    blocks = raycasting.pop_traversal_counts()[1]
+    assert blocks < reference.pop_traversal_counts()[1] / 2
@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pygame
+from pygame import Vector2
+
+from level import Level
+from backends import NumpyRaycasting
+from renderer import (Renderer, BLOCK_SIZE, CEIL_COLOR, WALL_COLOR, FLOOR_COLOR, FLAG_COLOR,
+                      FLAG_HEIGHT_DIV, RENDER_DISTANCE)
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIZE = (800, 600)
+
+
+def draw_columns(renderer, surface, distances, flagDistances):
+    """
+    Draw the view with one pygame.draw.rect() per column like the game did
+    before the columns were rasterized with NumPy.
+    """
+    surface.fill(FLOOR_COLOR)
+    pygame.draw.rect(surface, CEIL_COLOR, pygame.Rect(0, 0, SIZE[0], SIZE[1] // 2))
+    for columnDistances, nearDistance, heightDiv, baseColor in (
+            (distances, 1.0, 1, WALL_COLOR), (flagDistances, 0.1, FLAG_HEIGHT_DIV, FLAG_COLOR)):
+        for i, distance in enumerate(columnDistances):
+            if np.isnan(distance):
+                continue
+            if -nearDistance < distance < nearDistance:
+                height = SIZE[1]
+            else:
+                height = SIZE[1] / distance * renderer.distanceToProjection / heightDiv
+            height *= renderer.fisheyeCoefficients[i]
+
+            colorCoeficient = min(distance / RENDER_DISTANCE, 1.0)
+            color = tuple(baseColor[c] * (1.0 - colorCoeficient) + CEIL_COLOR[c] * colorCoeficient
+                          for c in range(3))
+            column = pygame.Rect(i * renderer.pixelsPerRay, SIZE[1] // 2 - (height // 2),
+                                 renderer.pixelsPerRay, height)
+            pygame.draw.rect(surface, color, column)
+
+
+def test_columns_match_draw_rect():
+    level = Level(os.path.join(ROOT, "5.lvl"))
+    raycasting = NumpyRaycasting(600, BLOCK_SIZE, level)
+    renderer = Renderer(raycasting, SIZE, 60)
+    fovRays = int(renderer.get_fov_rays())
+
+    width, height = map(int, level.get_size())
+    rng = np.random.default_rng(0)
+    for depth in (32, 24, 16):
+        for i in range(10):
+            x, y = rng.random() * width, rng.random() * height
+            if level.is_wall_at(int(x), int(y)):
+                continue
+            leftRay = int(rng.integers(600))
+            distances, intersections, flagDistances = raycasting.cast_fov(
+                leftRay, (leftRay + fovRays - 1) % 600, Vector2(x * BLOCK_SIZE, y * BLOCK_SIZE))
+
+            expected = pygame.Surface(SIZE, depth=depth)
+            actual = pygame.Surface(SIZE, depth=depth)
+            draw_columns(renderer, expected, distances, flagDistances)
+            renderer.draw_view(actual, distances, flagDistances)
+            assert np.array_equal(pygame.surfarray.array3d(actual),
+                                  pygame.surfarray.array3d(expected))
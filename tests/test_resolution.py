@@ -0,0 +1,18 @@
+from resolution import ResolutionScaler
+
+
+def test_full_resolution_until_budget_is_missed():
+    scaler = ResolutionScaler(100, 50, minRays=10, window=5)
+    assert scaler.get_step() == 1
+
+    # Frames within the budget (20 ms) keep the full resolution
+    for i in range(20):
+        assert scaler.update(15.0) == 1
+
+    # Slow frames lower it one step at a time, fast ones raise it again
+    for i in range(5):
+        scaler.update(30.0)
+    assert scaler.get_step() == 2
+    for i in range(5):
+        scaler.update(5.0)
+    assert scaler.get_step() == 1
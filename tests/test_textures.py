@@ -0,0 +1,30 @@
+import numpy as np
+
+from textures import ColumnScaler
+
+
+def test_get_pixels_matches_nearest_neighbour():
+    size, buckets, windowHeight = 16, 3, 40
+    rng = np.random.default_rng(0)
+    shadedMips = [rng.integers(0, 1 << 32, (2, buckets, size >> mip, size >> mip),
+                               dtype=np.uint32) for mip in range(3)]
+    scaler = ColumnScaler(shadedMips)
+
+    heights = np.array([1, 5, 16, 33, 40, 57, 80])
+    for mip in range(3):
+        mips = np.full(heights.size, mip)
+        sides = rng.integers(0, 2, heights.size)
+        shades = rng.integers(0, buckets, heights.size)
+        x = rng.integers(0, size >> mip, heights.size)
+        pixels, mask = scaler.get_pixels(0, windowHeight, windowHeight, mips, sides, shades,
+                                         x, heights)
+
+        # Scale every column of the mip level on its own
+        for i, height in enumerate(heights):
+            column = shadedMips[mip][sides[i], shades[i], x[i]]
+            top = windowHeight // 2 - height // 2
+            for row in range(windowHeight):
+                offset = row - top
+                assert mask[row, i] == (0 <= offset < height)
+                if mask[row, i]:
+                    assert pixels[row, i] == column[offset * column.size // height]
@@ -0,0 +1,267 @@
+"""
+Contains textures of walls, floor and ceiling. Wall textures are scaled to the
+heights of columns with tables of which texture row every row of a column of
+every height shows, computed once for every window height, so drawing a
+textured wall costs about as much as drawing a flat shaded one.
+"""
+
+import numpy as np
+import pygame
+
+
+#
+# Constants
+#
+
+TEXTURE_SIZE = 64       # Textures are this number of pixels wide and high
+SHADE_BUCKETS = 32      # Number of shades of a texture between near and far
+SIDE_SHADE = 0.75       # Horizontal sides of walls are this number times darker
+
+BRICK_COLOR = (128, 128, 128)
+MORTAR_COLOR = (88, 88, 88)
+TILE_COLOR = (64, 64, 64)
+GROUT_COLOR = (40, 40, 40)
+
+
+#
+# Classes
+#
+
+class WallTexture:
+    """
+    A square texture with mip levels: copies of the texture two, four, eight...
+    times smaller, which are used for distant walls (and parts of floor), so
+    that they don't flicker. Pixels are RGB values indexed [x, y] (as in
+    pygame.surfarray).
+    """
+
+    def __init__(self, pixels):
+        """
+        Parameters
+        ----------
+        pixels : NumPy array of uint8 of shape (size, size, 3) (size has to be
+                 a power of two)
+        """
+        size = pixels.shape[0]
+        if pixels.shape[:2] != (size, size) or size & (size - 1):
+            raise Exception("Textures have to be square with a power of two side.")
+
+        # Every mip level averages 2x2 pixels of the previous one
+        self.mips = [pixels.astype(float)]
+        while self.mips[-1].shape[0] > 1:
+            previous = self.mips[-1]
+            self.mips.append((previous[0::2, 0::2] + previous[1::2, 0::2] +
+                              previous[0::2, 1::2] + previous[1::2, 1::2]) / 4)
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Loads a texture from an image file.
+
+        Parameters
+        ----------
+        path : string
+        """
+        return cls(pygame.surfarray.array3d(pygame.image.load(path)))
+
+    @classmethod
+    def bricks(cls, size=TEXTURE_SIZE, brickColor=BRICK_COLOR, mortarColor=MORTAR_COLOR,
+               seed=0):
+        """
+        Generates a texture of a brick wall.
+
+        Parameters
+        ----------
+        size : int
+        brickColor : tupple of three ints
+        mortarColor : tupple of three ints
+        seed : int (seed of the noise on bricks)
+        """
+        brickHeight = size // 4
+        brickWidth = size // 2
+        x = np.arange(size)[:, None]
+        y = np.arange(size)[None, :]
+
+        # Every other row of bricks is shifted by half of a brick
+        shiftedX = x + (y // brickHeight % 2) * (brickWidth // 2)
+        mortar = (y % brickHeight == 0) | (shiftedX % brickWidth == 0)
+
+        noise = np.random.default_rng(seed).uniform(0.85, 1.0, (size, size))
+        pixels = np.where(mortar[:, :, None], mortarColor,
+                          noise[:, :, None] * np.array(brickColor))
+        return cls(pixels.astype(np.uint8))
+
+    @classmethod
+    def tiles(cls, size=TEXTURE_SIZE, tileColor=TILE_COLOR, groutColor=GROUT_COLOR, seed=0):
+        """
+        Generates a texture of four square tiles, for floors and ceilings.
+
+        Parameters
+        ----------
+        size : int
+        tileColor : tupple of three ints
+        groutColor : tupple of three ints
+        seed : int (seed of the noise on tiles)
+        """
+        tileSize = size // 2
+        x = np.arange(size)[:, None]
+        y = np.arange(size)[None, :]
+        grout = (x % tileSize == 0) | (y % tileSize == 0)
+
+        noise = np.random.default_rng(seed).uniform(0.9, 1.0, (size, size))
+        pixels = np.where(grout[:, :, None], groutColor,
+                          noise[:, :, None] * np.array(tileColor))
+        return cls(pixels.astype(np.uint8))
+
+    def get_size(self):
+        """
+        Returns how many pixels wide and high the texture is.
+        """
+        return self.mips[0].shape[0]
+
+    def get_mip_count(self):
+        """
+        Returns how many mip levels there are (including the texture itself).
+        """
+        return len(self.mips)
+
+    def get_shaded_mips(self, fogColor, buckets=SHADE_BUCKETS, sideShade=SIDE_SHADE):
+        """
+        Returns a list with an array of shape (2, buckets, size, size, 3) of uint8
+        for every mip level. Index [side, bucket] is the mip level blended with
+        fogColor according to distance (bucket 0 is the nearest) and darkened on
+        horizontal sides of walls (side 1).
+
+        Parameters
+        ----------
+        fogColor : tupple of three ints
+        buckets : int
+        sideShade : float
+        """
+        coefficients = np.arange(buckets) / buckets
+        sides = np.array([1.0, sideShade])
+        shadedMips = []
+        for mip in self.mips:
+            shaded = mip[None, None] * sides[:, None, None, None, None]
+            shaded = shaded * (1.0 - coefficients)[None, :, None, None, None] + \
+                     np.multiply.outer(coefficients, fogColor)[None, :, None, None, :]
+            shadedMips.append(shaded.astype(np.uint8))
+        return shadedMips
+
+
+class ColumnScaler:
+    """
+    Scales columns of shaded texture mip levels (see
+    WallTexture.get_shaded_mips()) to the height they are drawn with. For every
+    mip level and every height a column can have in the window, a table tells
+    which row of the mip level every row of the window shows, so the pixels of
+    all columns of a frame are gathered at once (see get_pixels()). Tables are
+    computed once for every window height.
+    """
+
+    def __init__(self, shadedMips):
+        """
+        Parameters
+        ----------
+        shadedMips : list of arrays of shape (2, buckets, size, size) of pixel
+                     values (or (2, buckets, size, size, 3) of RGB values)
+        """
+        self.shadedMips = shadedMips
+        self.size = shadedMips[0].shape[2]
+        self.buckets = shadedMips[0].shape[1]
+        self.rowTables = {}  # Window height -> rows of mip levels, see _get_row_table()
+
+        # All mip levels in one array of pixels, indexed by the offset of the
+        # mip level plus the index into the flattened mip level
+        self.pixels = np.concatenate([mip.reshape(-1, *mip.shape[4:]) for mip in shadedMips])
+        self.mipOffsets = np.cumsum([0] + [np.prod(mip.shape[:4]) for mip in shadedMips[:-1]])
+
+    def get_mip_level(self, heights):
+        """
+        Returns the mip levels columns of the given heights should be taken from
+        (see get_mip_levels()).
+
+        Parameters
+        ----------
+        heights : array of ints
+        """
+        return get_mip_levels(self.size, len(self.shadedMips), heights)
+
+    def get_pixels(self, firstRow, lastRow, windowHeight, mips, sides, buckets, x, heights):
+        """
+        Returns a tupple (pixels, mask) of arrays of shape (lastRow - firstRow,
+        columns) with
+        the pixels of columns of shaded mip levels scaled to the heights and
+        centered in a window of the given height, and whether a column covers
+        the row at all (pixels of rows it doesn't cover are garbage).
+
+        Parameters
+        ----------
+        firstRow : int (first row of the window)
+        lastRow : int (last row of the window, excluding)
+        windowHeight : int
+        mips : array of ints (mip level of every column)
+        sides : array of ints
+        buckets : array of ints
+        x : array of ints (column of the mip level)
+        heights : array of ints (at most 2 * windowHeight)
+        """
+        # Rows of the window are contiguous in the table, so whole runs of
+        # rows are copied for every column (columns end up as rows)
+        rowTable = self._get_row_table(windowHeight)
+        tableRows = mips * rowTable.shape[1] + heights
+        mipRows = rowTable.reshape(-1, windowHeight)[tableRows, firstRow:lastRow]
+        mask = mipRows != np.iinfo(rowTable.dtype).max
+
+        # Index of the first pixel of every column in the array of all pixels
+        mipSizes = self.size >> mips
+        starts = self.mipOffsets[mips] + ((sides * self.buckets + buckets) * mipSizes + x) * mipSizes
+        pixels = self.pixels.take(starts[:, None] + mipRows, axis=0, mode="clip")
+        return pixels.swapaxes(0, 1), mask.T
+
+    #
+    # Internal methods of the class
+    #
+
+    def _get_row_table(self, windowHeight):
+        """
+        Returns an array of shape (mip levels, 2 * windowHeight + 1, windowHeight)
+        with the row of a mip level shown at every row of the window by a column
+        of every height (the largest value of the type if the column doesn't
+        cover the row).
+        """
+        if not windowHeight in self.rowTables:
+            dtype = np.min_scalar_type(self.size)
+            heights = np.arange(2 * windowHeight + 1)[:, None]
+            tops = windowHeight // 2 - heights // 2
+            offsets = np.arange(windowHeight)[None, :] - tops
+            covered = (offsets >= 0) & (offsets < heights)
+
+            # Every mip level is half as big as the previous one
+            rows = np.where(covered, offsets * self.size // np.maximum(heights, 1), 0)
+            table = np.empty((len(self.shadedMips),) + rows.shape, dtype=dtype)
+            for mip in range(len(self.shadedMips)):
+                table[mip] = np.where(covered, rows >> mip, np.iinfo(dtype).max)
+            self.rowTables[windowHeight] = table
+        return self.rowTables[windowHeight]
+
+
+#
+# Functions
+#
+
+def get_mip_levels(size, mipCount, heights):
+    """
+    Returns the mip levels of a texture of the given size that should be drawn
+    with the given heights (in pixels): the first ones that aren't bigger than
+    the height.
+
+    Parameters
+    ----------
+    size : int
+    mipCount : int
+    heights : array of floats
+    """
+    ratios = size / np.maximum(heights, 1)
+    levels = np.floor(np.log2(np.maximum(ratios, 1.0))).astype(np.intp)
+    return np.minimum(levels, mipCount - 1)